@@ -20,34 +20,44 @@
 
 import os
 import sys
+from importlib.util import find_spec
 from sys import platform as _platform
 
-# If QT_API is not set, use PyQt6 by default
-if "QT_API" not in os.environ:
-    try:
-        import PyQt6.QtCore
-    except ImportError:
-        pass
-
-from qtpy import QtWidgets
-from qt_material import apply_stylesheet
-
-try:
-    from pyshortcuts import make_shortcut
-except ImportError:
-    make_shortcut = None
+# If QT_API is not set, use PyQt6 by default. Qt itself is only imported with the GUI, so that the processing core
+# (dioptas.core) can be used without it.
+if "QT_API" not in os.environ and find_spec("PyQt6") is not None:
+    os.environ["QT_API"] = "pyqt6"
 
 __version__ = "0.7.1"
 
 from .paths import resources_path, calibrants_path, icons_path, data_path, style_path
-from .excepthook import excepthook
-from .controller.MainController import MainController
 
 
 theme_path = os.path.join(style_path, "dark_orange.xml")
 qss_path = os.path.join(style_path, "qt_material.css")
 
+
+def __getattr__(name):
+    # the GUI is imported on first use
+    if name == "MainController":
+        from .controller.MainController import MainController
+
+        return MainController
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
 def main():
+    from qtpy import QtWidgets
+    from qt_material import apply_stylesheet
+
+    try:
+        from pyshortcuts import make_shortcut
+    except ImportError:
+        make_shortcut = None
+
+    from .excepthook import excepthook
+    from .controller.MainController import MainController
+
     app = QtWidgets.QApplication([])
 
     apply_stylesheet(
@@ -60,7 +70,7 @@ def main():
     print("Dioptas {}".format(__version__))
 
     if len(sys.argv) == 1:  # normal start
-        controller = MainController()
+        controller = MainController(asynchronous_integration=True)
         controller.show_window()
         app.exec_()
     else:  # with command line arguments
@@ -83,7 +93,7 @@ def main():
             print(__version__)
 
         elif sys.argv[1].endswith(".json"):
-            controller = MainController(config_file=sys.argv[1])
+            controller = MainController(config_file=sys.argv[1], asynchronous_integration=True)
             controller.show_window()
             app.exec_()
     del app
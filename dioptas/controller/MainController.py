@@ -31,6 +31,7 @@ from qtpy import QtWidgets, QtCore
 
 from ..widgets.MainWidget import MainWidget
 from ..model.DioptasModel import DioptasModel
+from ..model.util.IntegrationWorker import IntegrationWorker
 from ..widgets.UtilityWidgets import save_file_dialog, open_file_dialog
 
 from . import CalibrationController
@@ -47,11 +48,14 @@ class MainController(object):
     Creates the main controller for Dioptas. Creates all the data objects and connects them with the other controllers
     """
 
-    def __init__(self, use_settings=True, settings_directory="default", config_file=None):
+    def __init__(self, use_settings=True, settings_directory="default", config_file=None,
+                 asynchronous_integration=False):
         """
         :param use_settings: whether to use previously auto saved state of dioptas
         :param settings_directory: directory where the settings are saved
         :param config_file: a json file path with configuration, currently only used for quick_actions
+        :param asynchronous_integration: whether changed images are integrated in a background thread, the image is
+                                         then shown immediately and the pattern as soon as it is integrated
         """
         self.use_settings = use_settings
         self.widget = MainWidget()
@@ -63,6 +67,9 @@ class MainController(object):
             self.settings_directory = settings_directory
 
         self.model = DioptasModel()
+        if asynchronous_integration:
+            self.gui_thread_dispatcher = GuiThreadDispatcher()
+            self.model.integration_worker = IntegrationWorker(self.gui_thread_dispatcher.dispatch)
 
         self.calibration_controller = CalibrationController(
             self.widget.calibration_widget, self.model
@@ -365,3 +372,22 @@ class MainController(object):
         threading.Thread(target=run_command).start()
 
         return command_str
+
+
+class GuiThreadDispatcher(QtCore.QObject):
+    """
+    Calls functions in the GUI thread. The functions are passed through a queued signal, so they can be dispatched
+    from any thread, e.g. the results of the IntegrationWorker.
+    """
+
+    function_dispatched = QtCore.Signal(object)
+
+    def __init__(self):
+        super(GuiThreadDispatcher, self).__init__()
+        self.function_dispatched.connect(self._call, QtCore.Qt.QueuedConnection)
+
+    def dispatch(self, fn):
+        self.function_dispatched.emit(fn)
+
+    def _call(self, fn):
+        fn()
@@ -90,6 +90,9 @@ class BatchController(object):
         self.widget.batch_widget.control_widget.integrate_btn.clicked.connect(
             self.integrate
         )
+        self.widget.batch_widget.control_widget.integrate_new_btn.clicked.connect(
+            self.integrate_new_frames
+        )
         self.widget.batch_widget.control_widget.waterfall_btn.clicked.connect(
             self.waterfall_mode
         )
@@ -814,6 +817,7 @@ class BatchController(object):
         else:
             self.widget.img_directory_txt.setText(os.path.dirname(filenames[0]))
             self.model.batch_model.reset_data()
+            self.update_append_proc_btn()
             self.load_raw_data(filenames)
             self.widget.batch_widget.mode_widget.view_f_btn.setChecked(True)
             self.change_view()
@@ -919,6 +923,24 @@ class BatchController(object):
         self.widget.calibration_lbl.setText(
             self.model.calibration_model.calibration_name
         )
+        self.update_append_proc_btn()
+
+    def update_append_proc_btn(self):
+        """
+        Enables appending the patterns of an update, if the data was loaded from or saved to a processed data file
+        """
+        proc_filename = self.model.batch_model.proc_filename
+        append_proc_btn = self.widget.batch_widget.control_widget.append_proc_btn
+        append_proc_btn.setEnabled(proc_filename is not None)
+        if proc_filename is None:
+            append_proc_btn.setChecked(False)
+            append_proc_btn.setToolTip(
+                "Update appends the new patterns to the loaded or saved processed data file"
+            )
+        else:
+            append_proc_btn.setToolTip(
+                f"Update appends the new patterns to {proc_filename}"
+            )
 
     def plot_batch(self, start=None, stop=None):
         """
@@ -1054,16 +1076,26 @@ class BatchController(object):
                     )
                     makeQImage(d).save(filename)
             elif ext == ".nxs":
-                self.model.batch_model.save_proc_data(filename)
+                if self.model.batch_model.proc_filename == filename:
+                    # only the patterns integrated since the last save are written
+                    self.model.batch_model.append_proc_data(filename)
+                else:
+                    self.model.batch_model.save_proc_data(filename)
+                self.update_append_proc_btn()
             elif ext == ".csv":
                 self.model.batch_model.save_as_csv(filename)
             else:
                 self.model.img_model.blockSignals(True)
                 img_data = self.model.batch_model.data
-                pattern_x = self.model.batch_model.binning
+                integration_unit = self.model.current_configuration.integration_unit
+                pattern_x = self.convert_x_value(
+                    self.model.batch_model.binning, "2th_deg", integration_unit
+                )
                 for y in range(img_data.shape[0]):
                     pattern_y = img_data[int(y)]
-                    self.model.pattern_model.set_pattern(pattern_x, pattern_y)
+                    self.model.pattern_model.set_pattern(
+                        pattern_x, pattern_y, unit=integration_unit
+                    )
                     self.model.current_configuration.save_pattern(
                         f"{name}_{y:03d}{ext}"
                     )
@@ -1453,7 +1485,7 @@ class BatchController(object):
                 return False
             progress_dialog.setValue(current_index)
             QtWidgets.QApplication.processEvents()
-            return ~progress_dialog.wasCanceled()
+            return not progress_dialog.wasCanceled()
 
         self.model.batch_model.integrate_raw_data(
             start,
@@ -1461,6 +1493,7 @@ class BatchController(object):
             step,
             self.widget.batch_widget.mode_widget.view_f_btn.isChecked(),
             callback_fn=callback_fn,
+            num_workers=self.widget.batch_widget.control_widget.workers_sb.value(),
         )
 
         progress_dialog.close()
@@ -1485,6 +1518,86 @@ class BatchController(object):
         self.change_view()
         self.widget.batch_widget.stack_plot_widget.img_view.auto_range()
 
+    def integrate_new_frames(self):
+        """
+        Integrate only the images, which were added to the files since the last integration (e.g. by a running
+        acquisition), and append them to the integrated data. The current view of the heat map is kept.
+        """
+        if not self.model.calibration_model.is_calibrated:
+            self.widget.show_error_msg(
+                "Can not integrate multiple images without calibration."
+            )
+            return
+        if self.model.batch_model.files is None:
+            self.widget.show_error_msg("No images loaded for integration")
+            return
+
+        # the number of new images is only known after counting them
+        progress_dialog = get_progress_dialog(
+            "Integrating new images.",
+            "Abort Integration",
+            0,
+            self.widget.batch_widget,
+        )
+
+        def callback_fn(current_index):
+            if progress_dialog.wasCanceled():
+                return False
+            progress_dialog.setLabelText(f"Integrated {current_index} new images.")
+            QtWidgets.QApplication.processEvents()
+            return not progress_dialog.wasCanceled()
+
+        files = None
+        if self.widget.batch_widget.control_widget.new_files_btn.isChecked():
+            files = self.model.batch_model.get_updated_filenames()
+        try:
+            num_new = self.model.batch_model.integrate_new_raw_data(
+                files=files,
+                callback_fn=callback_fn,
+                num_workers=self.widget.batch_widget.control_widget.workers_sb.value(),
+            )
+        except ValueError as e:
+            progress_dialog.close()
+            self.widget.show_error_msg(str(e))
+            return
+        progress_dialog.close()
+        if num_new == 0:
+            return
+
+        proc_filename = self.model.batch_model.proc_filename
+        if (
+            self.widget.batch_widget.control_widget.append_proc_btn.isChecked()
+            and proc_filename is not None
+        ):
+            try:
+                self.model.batch_model.append_proc_data(proc_filename)
+            except OSError as e:
+                self.widget.show_error_msg(
+                    f"The new patterns could not be appended to {proc_filename}: {e}"
+                )
+
+        files = self.model.batch_model.files
+        file_map = self.model.batch_model.file_map
+        images = [(file_map[i + 1] - file_map[i]) for i in range(len(files))]
+        self.widget.batch_widget.file_view_widget.set_raw_files(files, images)
+        self.show_metadata_info()
+
+        n_img = self.model.batch_model.n_img
+        n_img_all = self.model.batch_model.n_img_all
+        self.widget.batch_widget.position_widget.step_series_widget.pos_label.setText(
+            f"Frame({n_img}/{n_img_all}):"
+        )
+        self.widget.batch_widget.position_widget.step_raw_widget.pos_label.setText(
+            f"Frame({n_img}/{n_img_all}):"
+        )
+        self.set_navigation_raw((0, n_img_all - 1))
+        self.set_navigation_range((0, n_img - 1))
+        self.widget.batch_widget.position_widget.step_series_widget.stop_txt.setValue(
+            n_img - 1
+        )
+        if not self.widget.batch_widget.mode_widget.view_f_btn.isChecked():
+            self.plot_batch()
+
     def set_navigation_raw(self, raw_range=(0, 0)):
         self.widget.batch_widget.position_widget.step_raw_widget.start_txt.setRange(
             *raw_range
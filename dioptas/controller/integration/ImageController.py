@@ -31,6 +31,7 @@ from ...widgets.UtilityWidgets import open_file_dialog, open_files_dialog, save_
 from ...widgets.integration import IntegrationWidget
 from ...model.DioptasModel import DioptasModel
 from ...model.util.HelperModule import get_partial_index, get_partial_value
+from ...model.util.calc import trim_trailing_zeros
 
 from .EpicsController import EpicsController
 
@@ -302,6 +303,9 @@ class ImageController(object):
                                                           len(filenames))
         self._set_up_batch_processing()
 
+        # the images of consecutive files with the same shape are integrated together in blocks
+        block = []
+        block_settings = None
         for ind in range(len(filenames)):
             filename = str(filenames[ind])
             base_filename = os.path.basename(filename)
@@ -312,17 +316,76 @@ class ImageController(object):
             self.model.img_model.blockSignals(True)
             self.model.img_model.load(filename)
             self.model.img_model.blockSignals(False)
-
-            x, y = self.integrate_pattern()
-            self._save_pattern(base_filename, working_directory, x, y)
+            if block and self.model.img_model.img_shape != block[0][1].shape:
+                # the previous images are integrated with the settings taken for their own shape
+                self._integrate_and_save_block(block, working_directory, block_settings)
+                block = []
+            if not block:
+                block_settings = self._get_block_settings()
+
+            block.append((filename, self.model.img_model.raw_img_data))
+            if len(block) >= self.model.img_model.get_block_size():
+                self._integrate_and_save_block(block, working_directory, block_settings)
+                block = []
 
             QtWidgets.QApplication.processEvents()
             if progress_dialog.wasCanceled():
                 break
 
+        if block:
+            self._integrate_and_save_block(block, working_directory, block_settings)
         progress_dialog.close()
         self._tear_down_batch_processing()
 
+    def _get_block_settings(self):
+        """
+        Takes the integration settings, background and corrections for a block of images with the shape of the
+        currently loaded image.
+        :return: dictionary with the settings for _integrate_and_save_block or None if no unit is selected
+        """
+        settings = self._get_integration_settings()
+        if settings is None:
+            return None
+        mask, integration_unit, num_points = settings
+        img_model = self.model.img_model
+        return {
+            "img_shape": img_model.img_shape,
+            "filename": img_model.filename,
+            "mask": mask,
+            "unit": integration_unit,
+            "num_points": num_points,
+            "background": img_model.get_background_for_integration(),
+            "corrections": img_model.img_corrections.get_data(),
+            "factor": img_model.factor,
+        }
+
+    def _integrate_and_save_block(self, block, working_directory, settings):
+        """
+        Integrates the images of a block with a single sparse matrix product and saves their patterns. The image
+        model does not need to have an image of the block loaded.
+        :param block: list of (filename, raw image data)
+        :param working_directory: directory of the saved patterns
+        :param settings: settings taken for the block, see _get_block_settings
+        """
+        if settings is None:
+            return
+        calibration_model = self.model.calibration_model
+        with calibration_model.integrate_snapshot(settings["img_shape"], settings["filename"], reset_detector=True):
+            x, intensities = calibration_model.integrate_1d_stack(
+                np.array([img_data for _, img_data in block]),
+                num_points=settings["num_points"],
+                mask=settings["mask"],
+                unit=settings["unit"],
+                background=settings["background"],
+                corrections=settings["corrections"],
+                factor=settings["factor"],
+            )
+        for (filename, _), y in zip(block, intensities):
+            pattern_x, pattern_y = x, y
+            if np.sum(y) != 0:  # like integrate_1d, patterns which are completely 0 are not trimmed
+                pattern_x, pattern_y = trim_trailing_zeros(x, y)
+            self._save_pattern(os.path.basename(filename), working_directory, pattern_x, pattern_y)
+
     def _get_pattern_working_directory(self):
         if self.widget.pattern_autocreate_cb.isChecked():
             working_directory = self.model.working_directories['pattern']
@@ -424,13 +487,24 @@ class ImageController(object):
             return 'd_A'
 
     def integrate_pattern(self):
+        settings = self._get_integration_settings()
+        if settings is None:
+            return
+        mask, integration_unit, num_points = settings
+        return self.model.calibration_model.integrate_1d(mask=mask, unit=integration_unit, num_points=num_points)
+
+    def _get_integration_settings(self):
+        """
+        :return: mask, unit and number of points of the integration selected in the widget or None if no unit is
+                 selected
+        """
         if self.widget.img_mask_btn.isChecked():
             mask = self.model.mask_model.get_mask()
         else:
             mask = None
 
         if self.widget.img_roi_btn.isChecked():
-            roi_mask = self.widget.img_widget.roi.getRoiMask(self.model.img_data.shape)
+            roi_mask = self.widget.img_widget.roi.getRoiMask(self.model.img_model.img_shape)
         else:
             roi_mask = None
 
@@ -458,7 +532,7 @@ class ImageController(object):
             num_points = int(str(self.widget.bin_count_txt.text()))
         else:
             num_points = None
-        return self.model.calibration_model.integrate_1d(mask=mask, unit=integration_unit, num_points=num_points)
+        return mask, integration_unit, num_points
 
     def change_mask_mode(self):
         self.model.use_mask = self.widget.integration_image_widget.mask_btn.isChecked()
@@ -973,7 +1047,8 @@ class ImageController(object):
     def set_wavelength(self):
         wavelength, ok = QtWidgets.QInputDialog.getText(self.widget, 'Set Wavelength', 'Wavelength in Angstroms:')
         if ok:
-            self.model.calibration_model.pattern_geometry.wavelength = float(wavelength) * 1e-10
+            with self.model.calibration_model.integration_lock:
+                self.model.calibration_model.pattern_geometry.wavelength = float(wavelength) * 1e-10
             self.widget.wavelength_lbl.setText('{:.4f}'.format(self.model.calibration_model.wavelength * 1e10) + ' A')
             self.model.img_model.img_changed.emit()
 
@@ -18,6 +18,11 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import functools
+
+from qtpy import QtWidgets, QtCore
+
+from ...model.util.IntegrationEngineCache import integration_engine_cache
 
 # imports for type hinting in PyCharm -- DO NOT DELETE
 from ...widgets.integration import IntegrationWidget
@@ -60,6 +65,9 @@ class OptionsController(object):
         self.options_widget.cake_full_toggle_btn.toggled.connect(self.cake_full_toggled_btn_changed)
         self.options_widget.oned_azimuth_min_txt.editingFinished.connect(self.oned_azimuth_range_changed)
         self.options_widget.oned_azimuth_max_txt.editingFinished.connect(self.oned_azimuth_range_changed)
+        self.options_widget.tune_method_btn.clicked.connect(self.tune_method_btn_clicked)
+        self.options_widget.persistent_engines_cb.toggled.connect(self.persistent_engines_cb_toggled)
+        self.options_widget.clear_engines_btn.clicked.connect(self.clear_engines_btn_clicked)
 
     def correct_solid_angle_cb_clicked(self):
         self.model.current_configuration.correct_solid_angle = self.options_widget.correct_solid_angle_cb.isChecked()
@@ -75,6 +83,12 @@ class OptionsController(object):
         self.options_widget.bin_count_txt.setText("{:1.0f}".format(self.model.calibration_model.num_points))
         self.options_widget.bin_count_txt.blockSignals(False)
 
+        self.update_integration_method_lbl()
+
+        self.options_widget.persistent_engines_cb.blockSignals(True)
+        self.options_widget.persistent_engines_cb.setChecked(integration_engine_cache.persistent)
+        self.options_widget.persistent_engines_cb.blockSignals(False)
+
         self.options_widget.cake_azimuth_points_sb.blockSignals(True)
         self.options_widget.cake_azimuth_points_sb.setValue(self.model.current_configuration.cake_azimuth_points)
         self.options_widget.cake_azimuth_points_sb.blockSignals(False)
@@ -90,6 +104,58 @@ class OptionsController(object):
             self.disable_full_cake_range()
         self.options_widget.blockSignals(False)
 
+    def update_integration_method_lbl(self):
+        calibration_model = self.model.calibration_model
+        if calibration_model.supersampling_factor > 1 or calibration_model.num_points is None:
+            method = "csr"
+        else:
+            method = calibration_model.get_integration_method(calibration_model.num_points)
+        self.options_widget.integration_method_lbl.setText(method)
+
+    def tune_method_btn_clicked(self):
+        """
+        Tunes the integration method of the current configuration. With an integration worker the tuning runs in its
+        background thread, so that the GUI does not freeze while the methods are benchmarked.
+        """
+        configuration = self.model.current_configuration
+        QtWidgets.QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
+        self.options_widget.tune_method_btn.setEnabled(False)
+        if self.model.integration_worker is None:
+            self._integration_method_tuned(self._tune_integration_method(configuration))
+            return
+
+        def tune(is_cancelled):
+            return functools.partial(self._integration_method_tuned, self._tune_integration_method(configuration))
+
+        self.model.integration_worker.submit(('tune_integration_method', id(configuration)), tune)
+
+    @staticmethod
+    def _tune_integration_method(configuration):
+        """
+        :return: the error raised by the tuning or None
+        """
+        try:
+            configuration.tune_integration_method()
+        except Exception as e:
+            return e
+        return None
+
+    def _integration_method_tuned(self, error):
+        QtWidgets.QApplication.restoreOverrideCursor()
+        self.options_widget.tune_method_btn.setEnabled(True)
+        if isinstance(error, ValueError):
+            QtWidgets.QMessageBox.critical(self.integration_widget, "ERROR", str(error))
+            return
+        if error is not None:
+            raise error
+        self.update_integration_method_lbl()
+
+    def persistent_engines_cb_toggled(self, checked):
+        integration_engine_cache.persistent = checked
+
+    def clear_engines_btn_clicked(self):
+        integration_engine_cache.clear_disk()
+
     def cake_azimuth_range_changed(self):
         range_min = float(self.options_widget.cake_azimuth_min_txt.text())
         range_max = float(self.options_widget.cake_azimuth_max_txt.text())
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Command line interface for integrating images without the GUI (and without Qt), e.g. on cluster nodes:
+
+    dioptas-process --poni CeO2.poni --mask detector.mask --output patterns/ image_*.tif
+    dioptas-process --project experiment.dio --batch result.nxs --file-list files.txt
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+from .project import load_project_configuration, create_configuration
+
+logger = logging.getLogger(__name__)
+
+PATTERN_FILE_FORMATS = [".xy", ".chi", ".dat", ".fxye"]
+UNITS = ["2th_deg", "q_A^-1", "d_A"]
+
+
+def prepare_configuration(configuration, unit=None, num_points=None, radial_range=None):
+    """
+    Disables everything a configuration does automatically on image changes, so that images are only integrated
+    explicitly.
+    :param configuration: Configuration
+    :param unit: integration unit, None keeps the unit of the configuration
+    :param num_points: number of radial points, None keeps the number of the configuration
+    :param radial_range: (min, max) radial range in the integration unit, None keeps the range of the configuration
+    """
+    configuration.auto_integrate_pattern = False
+    configuration.auto_integrate_cake = False
+    configuration.auto_save_integrated_pattern = False
+    configuration.integration_worker = None
+    if unit is not None:
+        configuration.integration_unit = unit
+    if num_points is not None:
+        configuration.integration_rad_points = num_points
+    if radial_range is not None:
+        configuration.integration_radial_range = radial_range
+
+
+def tune_integration_method(configuration, filename):
+    """
+    Benchmarks the integration methods with the first frame of an image file and remembers the fastest one in the
+    settings directory, so that this and later runs (and the GUI) integrate images of the detector with it.
+    :param configuration: calibrated Configuration (see prepare_configuration)
+    :param filename: image file
+    :return: tuned method
+    """
+    if not configuration.calibration_model.is_calibrated:
+        raise ValueError("The configuration is not calibrated.")
+    configuration.img_model.load(filename)
+    method, _ = configuration.tune_integration_method()["pattern"]
+    return method
+
+
+def process_files(configuration, filenames, output_directory, file_formats=(".xy",), subtract_background=False,
+                  callback_fn=None):
+    """
+    Integrates all frames of the image files and saves each pattern into the output directory. Patterns of multi
+    frame files get the frame index as suffix ("_000", "_001", ...).
+    :param configuration: calibrated Configuration (see prepare_configuration)
+    :param filenames: list of image files
+    :param output_directory: directory of the saved patterns
+    :param file_formats: file endings of the saved patterns, see PATTERN_FILE_FORMATS
+    :param subtract_background: whether the background of the pattern model is subtracted before saving
+    :param callback_fn: function called with the filename of every saved pattern
+    :return: list of the saved filenames
+    """
+    if not configuration.calibration_model.is_calibrated:
+        raise ValueError("The configuration is not calibrated.")
+    os.makedirs(output_directory, exist_ok=True)
+    mask_shape = _get_mask_shape(configuration)
+
+    img_model = configuration.img_model
+    saved_filenames = []
+    for filename in filenames:
+        img_model.load(filename)
+        _check_mask_shape(mask_shape, img_model.img_shape, filename)
+
+        base_name = os.path.splitext(os.path.basename(filename))[0]
+        for frame in range(img_model.series_max):
+            img_model.load_series_img(frame + 1)
+            configuration.integrate_image_1d()
+            name = base_name if img_model.series_max == 1 else "{}_{:03d}".format(base_name, frame)
+            for file_format in file_formats:
+                output_filename = os.path.join(output_directory, name + file_format)
+                configuration.save_pattern(output_filename, subtract_background=subtract_background)
+                saved_filenames.append(output_filename)
+                if callback_fn is not None:
+                    callback_fn(output_filename)
+    return saved_filenames
+
+
+def process_batch(configuration, filenames, output_filename, callback_fn=None, num_workers=1, append=False):
+    """
+    Integrates all frames of the image files with the BatchModel of the configuration and saves them into a single
+    *.nxs (or *.csv) file, which can be opened in the batch view of Dioptas.
+    :param configuration: calibrated Configuration (see prepare_configuration)
+    :param filenames: list of image files
+    :param output_filename: *.nxs or *.csv file
+    :param callback_fn: function called with the number of integrated frames
+    :param num_workers: number of worker processes integrating the frames in parallel
+    :param append: only integrate the frames, which are not in the existing *.nxs output file yet (e.g. added by a
+                   running acquisition), and append them to it
+    :return: number of integrated frames
+    """
+    if not configuration.calibration_model.is_calibrated:
+        raise ValueError("The configuration is not calibrated.")
+    mask_shape = _get_mask_shape(configuration)
+
+    batch_model = configuration.batch_model
+    batch_model.reset_data()
+    batch_model.set_image_files(filenames)
+    if batch_model.files is None:
+        raise ValueError("Not all image files exist.")
+    if append and os.path.isfile(output_filename):
+        batch_model.load_proc_data(output_filename, load_configuration=False)
+    # the frames are only counted, so the first image is loaded for checking its shape
+    configuration.img_model.load(filenames[0])
+    _check_mask_shape(mask_shape, configuration.img_model.img_shape, filenames[0])
+
+    last_counter = []
+
+    def integrated(counter):
+        # the parallel integration reports the same number repeatedly while waiting for the workers
+        if callback_fn is not None and last_counter != [counter]:
+            last_counter[:] = [counter]
+            callback_fn(counter)
+        return True
+
+    if append:
+        num_integrated = batch_model.integrate_new_raw_data(filenames, callback_fn=integrated, num_workers=num_workers)
+        batch_model.append_proc_data(output_filename)
+        return num_integrated
+
+    batch_model.integrate_raw_data(
+        0, batch_model.n_img_all, 1, use_all=True, callback_fn=integrated, num_workers=num_workers
+    )
+    if os.path.splitext(output_filename)[1] == ".csv":
+        batch_model.save_as_csv(output_filename)
+    else:
+        batch_model.save_proc_data(output_filename)
+    return batch_model.n_img
+
+
+def _get_mask_shape(configuration):
+    if configuration.use_mask:
+        return tuple(configuration.mask_model.mask_dimension)
+    return None
+
+
+def _check_mask_shape(mask_shape, img_shape, filename):
+    # images with another shape reset the mask of the configuration
+    if mask_shape is not None and tuple(img_shape) != mask_shape:
+        raise ValueError(
+            "The image {} has the shape {}, the mask {}.".format(filename, tuple(img_shape), mask_shape)
+        )
+
+
+def read_file_list(filename):
+    """
+    :param filename: text file with one image file per line, empty lines and lines starting with # are ignored
+    :return: list of filenames
+    """
+    with open(filename) as f:
+        lines = [line.strip() for line in f]
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def create_argument_parser():
+    parser = argparse.ArgumentParser(
+        prog="dioptas-process",
+        description="Integrates X-ray diffraction images to patterns without the graphical user interface.",
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("-p", "--project", help="saved Dioptas project (*.dio) with calibration, mask and settings")
+    source.add_argument("--poni", help="calibration file (*.poni)")
+    parser.add_argument("-m", "--mask", help="mask file, used together with --poni")
+    parser.add_argument("-c", "--configuration", type=int,
+                        help="index of the configuration in the project, defaults to the selected one")
+    parser.add_argument("files", nargs="*", help="image files")
+    parser.add_argument("-l", "--file-list", action="append", default=[],
+                        help="text file with one image file per line, can be given multiple times")
+    parser.add_argument("-o", "--output", default=".", help="directory of the saved patterns (default: .)")
+    parser.add_argument("-f", "--format", action="append", choices=PATTERN_FILE_FORMATS,
+                        help="file format of the saved patterns, can be given multiple times (default: .xy)")
+    parser.add_argument("-b", "--batch",
+                        help="save all patterns into a single *.nxs (or *.csv) file instead of one file per pattern")
+    parser.add_argument("-u", "--unit", choices=UNITS, help="integration unit (default: unit of the project or 2th_deg)")
+    parser.add_argument("-n", "--num-points", type=int, help="number of radial points (default: automatic)")
+    parser.add_argument("-r", "--radial-range", type=float, nargs=2, metavar=("MIN", "MAX"),
+                        help="radial range of the integration in the integration unit (default: full detector)")
+    parser.add_argument("-s", "--sectors", type=int,
+                        help="number of azimuthal sectors, whose patterns are additionally saved in the batch file")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="number of processes integrating the frames in parallel, used together with --batch "
+                             "(default: 1)")
+    parser.add_argument("--append", action="store_true",
+                        help="only integrate the frames, which are not in the existing --batch *.nxs file yet (e.g. "
+                             "new files or frames of a running acquisition), and append them to it")
+    parser.add_argument("--tune-method", action="store_true",
+                        help="benchmark the integration methods with the first image and use the fastest one, the "
+                             "choice is remembered for the detector, image size and number of points")
+    parser.add_argument("--subtract-background", action="store_true",
+                        help="subtract the background pattern of the project from the saved patterns")
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not print the progress")
+    return parser
+
+
+def main(argv=None):
+    parser = create_argument_parser()
+    args = parser.parse_args(argv)
+
+    filenames = list(args.files)
+    for file_list in args.file_list:
+        filenames += read_file_list(file_list)
+    if not filenames:
+        parser.error("no image files given")
+    if args.mask is not None and args.poni is None:
+        parser.error("--mask can only be used together with --poni")
+
+    if args.project is not None:
+        configuration = load_project_configuration(args.project, args.configuration)
+    else:
+        configuration = create_configuration(args.poni, args.mask)
+    prepare_configuration(configuration, args.unit, args.num_points, args.radial_range)
+    if args.sectors is not None:
+        if args.batch is None:
+            parser.error("--sectors can only be used together with --batch")
+        configuration.set_integration_sectors(args.sectors)
+    if args.append and (args.batch is None or os.path.splitext(args.batch)[1] == ".csv"):
+        parser.error("--append can only be used together with a --batch *.nxs file")
+    if args.workers < 1:
+        parser.error("--workers needs to be at least 1")
+
+    def print_progress(message):
+        if not args.quiet:
+            print(message, file=sys.stderr)
+
+    try:
+        if args.tune_method:
+            method = tune_integration_method(configuration, filenames[0])
+            print_progress("integrating with the {} method".format(method))
+        if args.batch is not None:
+            num_integrated = process_batch(
+                configuration, filenames, args.batch,
+                callback_fn=lambda counter: print_progress("integrated {} frames".format(counter)),
+                num_workers=args.workers, append=args.append,
+            )
+            if args.append:
+                print_progress("appended {} frames to {}".format(num_integrated, args.batch))
+            else:
+                print_progress("saved {}".format(args.batch))
+        else:
+            process_files(
+                configuration, filenames, args.output, args.format or [".xy"], args.subtract_background,
+                callback_fn=lambda filename: print_progress("saved {}".format(filename)),
+            )
+    except (ValueError, OSError) as e:
+        print("dioptas-process: error: {}".format(e), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import h5py
+
+from ..model.Configuration import Configuration
+
+
+def load_project_configuration(filename, index=None):
+    """
+    Loads a configuration from a saved Dioptas project, without the overlays and phases of the project.
+    :param filename: path of the *.dio project file
+    :param index: index of the configuration in the project, defaults to the selected one
+    :return: Configuration
+    """
+    with h5py.File(filename, "r") as f:
+        configurations_group = f.get("configurations")
+        if index is None:
+            index = int(configurations_group.attrs["selected_configuration"])
+        if str(index) not in configurations_group:
+            raise ValueError("The project {} has no configuration {}.".format(filename, index))
+        configuration = Configuration()
+        configuration.load_from_hdf5(configurations_group[str(index)])
+    return configuration
+
+
+def create_configuration(poni_filename, mask_filename=None):
+    """
+    Creates a configuration from a calibration and optionally a mask file.
+    :param poni_filename: path of the *.poni calibration file
+    :param mask_filename: path of the mask file, the mask is used for the integration
+    :return: Configuration
+    """
+    configuration = Configuration()
+    configuration.calibration_model.load(poni_filename)
+    if mask_filename is not None:
+        mask_data = configuration.mask_model.read_mask_file(mask_filename)
+        configuration.mask_model.set_dimension(mask_data.shape)
+        configuration.mask_model.set_mask(mask_data)
+        configuration.mask_model.filename = mask_filename
+        configuration.use_mask = True
+    return configuration
@@ -2,19 +2,34 @@ import logging
 import os
 import re
 import pathlib
+from concurrent.futures import ThreadPoolExecutor
 
 import h5py
 import numpy as np
-from qtpy import QtCore
 from PIL import Image
 
 from xypattern.auto_background import SmoothBrucknerBackground
 from xypattern import Pattern
 
+from .util.BatchIntegrationPool import (
+    group_frames,
+    integrate_frame_blocks,
+    integrate_frames_in_parallel,
+)
+from .util.cache import PersistentFileIndex, file_stamp
+
 logger = logging.getLogger(__name__)
 
+# maximum number of threads reading the number of frames of the image files
+FRAME_COUNT_THREADS = 16
+
+frame_count_index = PersistentFileIndex(
+    os.path.join(os.path.expanduser("~"), ".Dioptas", "frame_count_index.json"),
+    max_entries=20000,
+)
+
 
-class BatchModel(QtCore.QObject):
+class BatchModel(object):
     """
     Class describe a model for batch integration
     """
@@ -25,6 +40,10 @@ class BatchModel(QtCore.QObject):
         self.data = None
         self.bkg = None
         self.binning = None
+        # patterns of the azimuthal sectors (n_img x n_sectors x n_points), see Configuration.integration_sector_edges
+        self.sector_data = None
+        self.sector_binning = None
+        self.sector_edges = None
         self.file_map = None
         self.files = None
         self.pos_map = None
@@ -37,11 +56,22 @@ class BatchModel(QtCore.QObject):
         self.used_mask = None
         self.used_mask_shape = None
         self.used_calibration = None
+        # integration methods of the patterns (see CalibrationModel.integrate_1d_stack)
+        self.used_method = "csr"
+        # processed data file the data was loaded from or saved to last, new patterns can be appended to it
+        self.proc_filename = None
+        # number of leading patterns, which did not change since they were loaded from or saved to proc_filename
+        self._num_unchanged_patterns = 0
+        # number of worker processes used by integrate_raw_data, 1 integrates in this process
+        self.num_workers = 1
 
     def reset_data(self):
         self.data = None
         self.bkg = None
         self.binning = None
+        self.sector_data = None
+        self.sector_binning = None
+        self.sector_edges = None
         self.file_map = None
         self.files = None
         self.pos_map = None
@@ -51,45 +81,73 @@ class BatchModel(QtCore.QObject):
         self.used_mask = None
         self.used_mask_shape = None
         self.used_calibration = None
+        self.used_method = "csr"
+        self.proc_filename = None
+        self._num_unchanged_patterns = 0
         self.raw_available = False
 
     def set_image_files(self, files):
         """
         Set internal variables with respect of given list of files.
 
-        Open each file and count number of images inside. Position of each image in the file
+        Count number of images inside each file (see count_frames). Position of each image in the file
         and total number of images are stored in internal variables.
 
         :param files: List of file names including path
         """
         if files is None:
             return
-        pos_map = []
-        file_map = [0]
-        image_counter = 0
-
-        self.configuration.img_model.blockSignals(True)
-
-        for i, file in enumerate(files):
-            # Assume tif file contains only one image
-            if file[-4:] == ".tif":
-                n_img = 1
-            else:
-                if not os.path.exists(file):
-                    return
-                self.configuration.img_model.load(file)
-                n_img = self.configuration.img_model.series_max
-            image_counter += n_img
-            pos_map += list(zip([i] * n_img, range(n_img)))
-            file_map.append(image_counter)
+        frame_counts = self.count_frames(files)
+        if frame_counts is None:
+            return
 
-        self.configuration.img_model.blockSignals(False)
+        file_map = np.concatenate(([0], np.cumsum(frame_counts))).astype(int)
+        file_indices = np.repeat(np.arange(len(files)), frame_counts)
+        positions = np.arange(file_map[-1]) - np.repeat(file_map[:-1], frame_counts)
 
         self.files = np.array(files)
-        self.n_img_all = image_counter
+        self.n_img_all = int(file_map[-1])
         self.raw_available = True
-        self.pos_map_all = np.array(pos_map)
-        self.file_map = np.array(file_map)
+        self.pos_map_all = np.column_stack((file_indices, positions))
+        self.file_map = file_map
+
+    def count_frames(self, files):
+        """
+        Counts the images of all files concurrently from their metadata only (see ImgModel.get_frame_count). The counts
+        are stored in frame_count_index together with size and modification time of the files, so unchanged files
+        are not opened again.
+
+        :param files: List of file names including path
+        :return: list with the number of images in each file, None if not all files exist
+        """
+        img_model = self.configuration.img_model
+
+        def count(filename):
+            stamp = file_stamp(filename)
+            if stamp is None:
+                return None, None
+            num_frames = frame_count_index.get(filename, stamp)
+            if num_frames is not None:
+                return num_frames, None
+            num_frames = img_model.get_frame_count(filename)
+            # files which are still written are not indexed
+            if file_stamp(filename) != stamp:
+                return num_frames, None
+            return num_frames, (filename, stamp, num_frames)
+
+        files = [str(file) for file in files]
+        if len(files) == 0:
+            return []
+        with ThreadPoolExecutor(min(FRAME_COUNT_THREADS, len(files))) as executor:
+            results = list(executor.map(count, files))
+
+        new_entries = [entry for _, entry in results if entry is not None]
+        if new_entries:
+            frame_count_index.put_many(new_entries)
+        frame_counts = [num_frames for num_frames, _ in results]
+        if None in frame_counts:
+            return None
+        return frame_counts
 
     def try_load_old_format(self, data_file):
         self.data = data_file["data"][()]
@@ -118,12 +176,18 @@ class BatchModel(QtCore.QObject):
         if "bkg" in data_file:
             self.data = data_file["bkg"][()]
 
-    def load_proc_data(self, filename):
+    def load_proc_data(self, filename, load_configuration=True):
         """
         Load diffraction patterns and metadata from h5 file
 
+        :param load_configuration: load the used calibration and mask into the configuration
         """
         with h5py.File(filename, "r") as data_file:
+            self.sector_data = None
+            self.sector_binning = None
+            self.sector_edges = None
+            self.proc_filename = None
+            self._num_unchanged_patterns = 0
             # ToDo To be removed
             if "processed/result" not in data_file:
                 self.try_load_old_format(data_file)
@@ -132,6 +196,8 @@ class BatchModel(QtCore.QObject):
             self.binning = data_file["processed/result/binning"][()]
             self.n_img = self.data.shape[0]
             self.n_img_all = self.data.shape[0]
+            self.proc_filename = filename
+            self._num_unchanged_patterns = self.n_img
 
             if "process" not in data_file["processed"]:
                 logger.info("No matching to raw data")
@@ -147,26 +213,36 @@ class BatchModel(QtCore.QObject):
                 )
             else:
                 self.used_calibration = str(data_file["processed/process/cal_file"][()])
-            if os.path.isfile(self.used_calibration):
+            if "int_method" in data_file["processed/process"]:
+                self.used_method = data_file["processed/process/int_method"][()]
+                if isinstance(self.used_method, bytes):
+                    self.used_method = self.used_method.decode("utf-8")
+            if load_configuration and os.path.isfile(self.used_calibration):
                 self.configuration.calibration_model.load(self.used_calibration)
 
-            if "mask" in data_file["processed/process/"]:
+            if load_configuration and "mask" in data_file["processed/process/"]:
                 mask = data_file["processed/process/mask"][()]
                 self.configuration.mask_model.set_dimension(mask.shape)
                 self.configuration.mask_model.set_mask(mask)
 
             if "mask_file" in data_file["processed/process/"]:
-                try:
-                    self.used_mask = str(data_file["processed/process/mask_file"][()])
-                    mask_data = np.array(Image.open(self.used_mask))
-                    self.configuration.mask_model.set_dimension(mask_data.shape)
-                    self.configuration.mask_model.load_mask(self.used_mask)
-                except FileNotFoundError:
-                    logger.info(f"Mask file {self.used_mask} is not found")
+                self.used_mask = str(data_file["processed/process/mask_file"][()])
+                if load_configuration:
+                    try:
+                        mask_data = np.array(Image.open(self.used_mask))
+                        self.configuration.mask_model.set_dimension(mask_data.shape)
+                        self.configuration.mask_model.load_mask(self.used_mask)
+                    except FileNotFoundError:
+                        logger.info(f"Mask file {self.used_mask} is not found")
 
             if "bkg" in data_file["processed/process/"]:
                 self.bkg = data_file["processed/process/bkg"][()]
 
+            if "sectors" in data_file["processed"]:
+                self.sector_data = data_file["processed/sectors/data"][()]
+                self.sector_binning = data_file["processed/sectors/binning"][()]
+                self.sector_edges = data_file["processed/sectors/sector_edges"][()]
+
     def save_proc_data(self, filename):
         """
         Save diffraction patterns to h5 file
@@ -195,21 +271,122 @@ class BatchModel(QtCore.QObject):
                 nxprocess["mask_file"] = str(self.used_mask)
                 nxprocess["mask_shape"] = self.used_mask_shape
 
-            nxprocess["int_method"] = "csr"
+            nxprocess["int_method"] = self.used_method
             nxprocess["int_unit"] = "2th_deg"
             nxprocess["num_points"] = self.binning.shape[0]
 
             if self.bkg is not None:
                 nxprocess.create_dataset("bkg", data=self.bkg)
 
-            nxdata.create_dataset("data", data=self.data)
-            tth = nxdata.create_dataset("binning", data=self.binning)
+            create_resizable_dataset(nxdata, "data", self.data)
+            tth = create_resizable_dataset(nxdata, "binning", self.binning)
             tth.attrs["unit"] = "deg"
             tth.attrs["long_name"] = "two_theta (degrees)"
 
-            nxprocess.create_dataset("pos_map", data=self.pos_map)
+            if self.sector_data is not None:
+                nxsectors = nxentry.create_group("sectors")
+                nxsectors.attrs["NX_class"] = "NXdata"
+                nxsectors.attrs["signal"] = "data"
+                nxsectors.attrs["axes"] = [".", ".", "binning"]
+                create_resizable_dataset(nxsectors, "data", self.sector_data)
+                sector_edges = nxsectors.create_dataset(
+                    "sector_edges", data=self.sector_edges
+                )
+                sector_edges.attrs["unit"] = "deg"
+                sector_edges.attrs["long_name"] = "azimuthal sector edges (degrees)"
+                tth = nxsectors.create_dataset("binning", data=self.sector_binning)
+                tth.attrs["unit"] = "deg"
+                tth.attrs["long_name"] = "two_theta (degrees)"
+
+            create_resizable_dataset(nxprocess, "pos_map", self.pos_map)
             nxprocess.create_dataset("file_map", data=self.file_map)
             nxprocess.create_dataset("files", data=self.files.astype("S"))
+        self.proc_filename = filename
+        self._num_unchanged_patterns = self.n_img
+
+    def append_proc_data(self, filename):
+        """
+        Append the patterns of the images integrated since the data was loaded from or saved to filename (see
+        integrate_new_raw_data) to the resizable datasets of the file. Only the new rows are written, file_map and
+        files are replaced. The data is completely written by save_proc_data, if it was changed otherwise since (e.g.
+        integrated again or normalized), was loaded from or saved to another file or if the file does not contain the
+        beginning of the data or was not saved with resizable datasets.
+
+        :return: number of appended patterns
+        """
+        if filename == self.proc_filename and os.path.isfile(filename):
+            with h5py.File(filename, mode="a") as f:
+                num_saved = self._get_num_appendable_patterns(f)
+                if num_saved is not None and num_saved == self._num_unchanged_patterns:
+                    self._append_to_proc_file(f, num_saved)
+                    self._num_unchanged_patterns = self.n_img
+                    return self.n_img - num_saved
+        self.save_proc_data(filename)
+        return self.n_img
+
+    def _get_num_appendable_patterns(self, f):
+        """
+        :param f: opened processed data file
+        :return: number of patterns saved in the file, None if the data can not be appended to it
+        """
+        names = ["processed/result/data", "processed/result/binning"]
+        names += ["processed/process/pos_map", "processed/process/files"]
+        if self.sector_data is not None:
+            names.append("processed/sectors/data")
+        elif "processed/sectors" in f:
+            return None
+        if not all(name in f for name in names):
+            return None
+        if any(None not in f[name].maxshape for name in names[:3]):
+            return None
+        if self.sector_data is not None and None not in f[names[4]].maxshape:
+            return None
+
+        num_saved = f["processed/result/data"].shape[0]
+        if (
+            num_saved > self.n_img
+            or f["processed/process/pos_map"].shape[0] != num_saved
+        ):
+            return None
+        saved_files = f["processed/process/files"][()].astype("U")
+        saved_frames = [
+            (str(saved_files[file_index]), int(pos))
+            for file_index, pos in f["processed/process/pos_map"][()]
+        ]
+        frames = [
+            (str(self.files[file_index]), int(pos))
+            for file_index, pos in self.pos_map[:num_saved]
+        ]
+        if saved_frames != frames:
+            return None
+        return num_saved
+
+    def _append_to_proc_file(self, f, num_saved):
+        nxdata = f["processed/result"]
+        # the columns of earlier patterns, which are added by resizing, are filled with zeros
+        nxdata["data"].resize(self.data.shape)
+        nxdata["data"][num_saved:] = self.data[num_saved:]
+        if nxdata["binning"].shape[0] != len(self.binning):
+            nxdata["binning"].resize(self.binning.shape)
+            nxdata["binning"][:] = self.binning
+
+        if self.sector_data is not None:
+            sector_data = f["processed/sectors/data"]
+            sector_data.resize(self.sector_data.shape)
+            sector_data[num_saved:] = self.sector_data[num_saved:]
+
+        nxprocess = f["processed/process"]
+        nxprocess["pos_map"].resize(self.pos_map.shape)
+        nxprocess["pos_map"][num_saved:] = self.pos_map[num_saved:]
+        for name in ("file_map", "files", "num_points", "int_method", "bkg"):
+            if name in nxprocess:
+                del nxprocess[name]
+        nxprocess["num_points"] = self.binning.shape[0]
+        nxprocess["int_method"] = self.used_method
+        nxprocess.create_dataset("file_map", data=self.file_map)
+        nxprocess.create_dataset("files", data=self.files.astype("S"))
+        if self.bkg is not None:
+            nxprocess.create_dataset("bkg", data=self.bkg)
 
     def save_as_csv(self, filename):
         """
@@ -230,7 +407,9 @@ class BatchModel(QtCore.QObject):
             fmt="%f",
         )
 
-    def integrate_raw_data(self, start, stop, step, use_all=False, callback_fn=None):
+    def integrate_raw_data(
+        self, start, stop, step, use_all=False, callback_fn=None, num_workers=None
+    ):
         """
         Integrate images from given file
 
@@ -241,47 +420,139 @@ class BatchModel(QtCore.QObject):
         :param use_all: Use all images. If False use only images, that were already integrated.
         :param callback_fn: callback function which is called each iteration with the current image number as parameter,
                             if it returns False the integration will be aborted.
+        :param num_workers: number of worker processes integrating the images in parallel (see
+                            integrate_frames_in_parallel), defaults to num_workers of the BatchModel
         """
-        intensity_data = []
-        binning_data = []
-        pos_map = []
-        image_counter = 0
-        current_file = ""
+        indices = list(range(start, stop, step))
+        pos_map = self.pos_map_all[indices] if use_all else self.pos_map[indices]
+        self._set_used_mask()
+        self._set_integrated_data(
+            *self._integrate_frames(pos_map, callback_fn, num_workers)
+        )
 
-        if self.configuration.use_mask:
-            if self.configuration.mask_model.filename != "":
-                self.used_mask = self.configuration.mask_model.filename
-            mask = self.configuration.mask_model.get_mask()
-            self.used_mask_shape = mask.shape
+    def integrate_new_raw_data(self, files=None, callback_fn=None, num_workers=None):
+        """
+        Integrate only the images, which were added since the last integration, either as new files in the file list
+        or as new images of growing files (e.g. hdf5 files written by a running acquisition). Their patterns are
+        appended to the data, the patterns of all previously integrated images are kept. Without integrated data all
+        images are integrated.
+
+        :param files: List of file names including path, None to count the images of the current files again
+        :param callback_fn: callback function which is called each iteration with the number of newly integrated
+                            images as parameter, if it returns False the integration will be aborted.
+        :param num_workers: number of worker processes, see integrate_raw_data
+        :return: number of newly integrated images
+        """
+        if files is None:
+            files = self.files
+        if self.data is None or self.pos_map is None or self.files is None:
+            self.set_image_files(files)
+            if not self.raw_available:
+                return 0
+            self.integrate_raw_data(
+                0, self.n_img_all, 1, True, callback_fn, num_workers
+            )
+            return self.n_img
+
+        sector_edges = self.configuration.integration_sector_edges
+        if (self.sector_edges is None) != (sector_edges is None) or (
+            sector_edges is not None
+            and not np.array_equal(self.sector_edges, sector_edges)
+        ):
+            raise ValueError(
+                "The azimuthal sectors changed since the last integration, all images need to be integrated again."
+            )
 
-        self.configuration.img_model.blockSignals(True)
-        for index in range(start, stop, step):
-            if use_all:
-                file_index, pos = self.pos_map_all[index]
-            else:
-                file_index, pos = self.pos_map[index]
-            if file_index != current_file:
-                current_file = file_index
-                self.configuration.calibration_model.img_model.load(
-                    self.files[file_index]
+        integrated_frames = [
+            (str(self.files[file_index]), int(pos)) for file_index, pos in self.pos_map
+        ]
+        self.set_image_files(files)
+        file_indices = {str(filename): ind for ind, filename in enumerate(self.files)}
+        for filename, _ in integrated_frames:
+            if filename not in file_indices:
+                raise ValueError(
+                    "The integrated file {} is not in the file list anymore.".format(
+                        filename
+                    )
                 )
+        self.pos_map = np.array(
+            [(file_indices[filename], pos) for filename, pos in integrated_frames],
+            dtype=int,
+        ).reshape(-1, 2)
+
+        integrated_frames = set(integrated_frames)
+        new_pos_map = np.array(
+            [
+                (file_index, pos)
+                for file_index, pos in self.pos_map_all
+                if (str(self.files[file_index]), int(pos)) not in integrated_frames
+            ],
+            dtype=int,
+        ).reshape(-1, 2)
+        if len(new_pos_map) == 0:
+            return 0
+
+        self._set_used_mask()
+        pos_map, binning, data, sector_binning, sector_data = self._integrate_frames(
+            new_pos_map, callback_fn, num_workers
+        )
+        self._append_integrated_data(pos_map, binning, data, sector_data)
+        return len(pos_map)
 
-            self.configuration.img_model.load_series_img(pos + 1)
-            self.configuration.mask_model.set_dimension(
-                self.configuration.img_model.img_data.shape
-            )
+    def _integrate_frames(self, pos_map, callback_fn=None, num_workers=None):
+        """
+        Integrate the images of pos_map in the batch binning (2θ).
 
-            binning, intensity = self.configuration.integrate_image_1d()
-            image_counter += 1
-            pos_map.append((file_index, pos))
-            intensity_data.append(intensity)
-            binning_data.append(binning)
+        :param pos_map: array with (file index, position in the file) of the images
+        :param callback_fn: see integrate_raw_data
+        :param num_workers: see integrate_raw_data
+        :return: pos_map of the integrated images, binning, data (n_img x n_points), sector binning, sector data
+                 (n_img x n_sectors x n_points) or None, None if no sectors are set
+        """
+        if num_workers is None:
+            num_workers = self.num_workers
+        if num_workers > 1 and len(pos_map) > 1:
+            return self._integrate_frames_in_parallel(pos_map, callback_fn, num_workers)
 
-            if callback_fn is not None:
-                if not callback_fn(image_counter):
-                    break
+        intensity_data = []
+        binning_data = []
+        sector_data = []
+        sector_binning = None
+        integrated_pos_map = []
+        current_file = None
+        aborted = False
 
-        self.configuration.img_model.blockSignals(False)
+        self.configuration.img_model.blockSignals(True)
+        try:
+            for file_index, positions in group_frames(pos_map):
+                blocks = integrate_frame_blocks(
+                    self.configuration,
+                    self.files[file_index],
+                    positions,
+                    current_file,
+                )
+                current_file = self.files[file_index]
+                for num_frames, binning, intensities, sectors in blocks:
+                    # the positions of a file are integrated in order
+                    block_positions = positions[:num_frames]
+                    positions = positions[num_frames:]
+                    integrated_pos_map.extend(
+                        (file_index, pos) for pos in block_positions
+                    )
+                    intensity_data.extend(intensities)
+                    binning_data.extend([binning] * num_frames)
+                    if sectors is not None:
+                        sector_binning = sectors[0]
+                        sector_data.extend(sectors[1])
+
+                    if callback_fn is not None:
+                        if not callback_fn(len(integrated_pos_map)):
+                            aborted = True
+                            break
+                if aborted:
+                    break
+        finally:
+            self.configuration.img_model.blockSignals(False)
 
         # deal with different x lengths due to trimmed zeros:
         binning_lengths = [len(binning) for binning in binning_data]
@@ -295,15 +566,87 @@ class BatchModel(QtCore.QObject):
                 np.zeros((binning_max_length - binning_lengths[ind], 1)),
             )
 
-        # finish and save everything
+        return (
+            integrated_pos_map,
+            binning,
+            intensity_data,
+            sector_binning,
+            sector_data if sector_data else None,
+        )
+
+    def _integrate_frames_in_parallel(self, pos_map, callback_fn, num_workers):
+        frames = [
+            (str(self.files[file_index]), int(pos)) for file_index, pos in pos_map
+        ]
 
+        self.configuration.img_model.blockSignals(True)
+        try:
+            num_integrated, binning, data, sector_binning, sector_data = (
+                integrate_frames_in_parallel(
+                    self.configuration, frames, num_workers, callback_fn
+                )
+            )
+        finally:
+            self.configuration.img_model.blockSignals(False)
+        return pos_map[:num_integrated], binning, data, sector_binning, sector_data
+
+    def _set_used_mask(self):
+        if self.configuration.use_mask:
+            if self.configuration.mask_model.filename != "":
+                self.used_mask = self.configuration.mask_model.filename
+            mask = self.configuration.mask_model.get_mask()
+            self.used_mask_shape = mask.shape
+
+    def _set_integrated_data(self, pos_map, binning, data, sector_binning, sector_data):
         if self.configuration.calibration_model.filename != "":
             self.used_calibration = self.configuration.calibration_model.filename
         self.pos_map = np.array(pos_map)
         self.binning = np.array(binning)
-        self.data = np.array(intensity_data)
+        self.data = np.array(data)
+        self.bkg = None
+        self._num_unchanged_patterns = 0
+        self.used_method = self.configuration.calibration_model.stack_integration_method
+        self.n_img = self.data.shape[0]
+
+        if sector_data is not None:
+            self.sector_data = np.array(sector_data)
+            self.sector_binning = np.array(sector_binning)
+            self.sector_edges = np.array(self.configuration.integration_sector_edges)
+        else:
+            self.sector_data = None
+            self.sector_binning = None
+            self.sector_edges = None
+
+    def _append_integrated_data(self, pos_map, binning, data, sector_data):
+        """
+        Append the patterns of newly integrated images. Patterns with trimmed zeros are padded to the longer binning.
+        """
+        num_points = min(len(self.binning), len(binning))
+        if not np.allclose(self.binning[:num_points], binning[:num_points]):
+            raise ValueError(
+                "The binning changed since the last integration, all images need to be integrated again."
+            )
+        num_points = max(len(self.binning), len(binning))
+        if len(binning) > len(self.binning):
+            self.binning = np.array(binning)
+        self.pos_map = np.vstack((self.pos_map, np.array(pos_map, dtype=int)))
+        self.data = np.vstack(
+            (pad_last_axis(self.data, num_points), pad_last_axis(data, num_points))
+        )
         self.bkg = None
         self.n_img = self.data.shape[0]
+        method = self.configuration.calibration_model.stack_integration_method
+        if method not in self.used_method.split(", "):
+            self.used_method = "{}, {}".format(self.used_method, method)
+
+        if sector_data is not None:
+            num_points = max(self.sector_data.shape[-1], np.shape(sector_data)[-1])
+            self.sector_data = np.concatenate(
+                (
+                    pad_last_axis(self.sector_data, num_points),
+                    pad_last_axis(sector_data, num_points),
+                )
+            )
 
     def extract_background(self, parameters, callback_fn=None):
         """
@@ -318,6 +661,7 @@ class BatchModel(QtCore.QObject):
                     break
             bkg[i] = auto_bkg.extract_background(Pattern(self.binning, y))
         self.bkg = bkg
+        self._num_unchanged_patterns = 0
 
     def normalize(self, range_ind=(10, 30)):
         if self.data is None:
@@ -325,6 +669,18 @@ class BatchModel(QtCore.QObject):
         average_intensities = np.mean(self.data[:, range_ind[0] : range_ind[1]], axis=1)
         factors = average_intensities[0] / average_intensities
         self.data = (self.data.T * factors).T
+        self._num_unchanged_patterns = 0
+
+    def get_sector_data(self, sector):
+        """
+        Get the patterns of one azimuthal sector of all integrated images
+
+        :param sector: Index of the sector
+        :return: binning, intensities (n_img x n_points) in the layout of data, or None if no sectors were integrated
+        """
+        if self.sector_data is None:
+            return None
+        return self.sector_binning, self.sector_data[:, sector]
 
     def get_image_info(self, index, use_all=False):
         """
@@ -356,6 +712,24 @@ class BatchModel(QtCore.QObject):
         filename, pos = self.get_image_info(index, use_all)
         self.configuration.calibration_model.img_model.load(filename, pos)
 
+    def get_updated_filenames(self):
+        """
+        Files of the batch followed by the files, which were added to their folder since (e.g. by a running
+        acquisition) and have the same file-ending. The processed data file is not included.
+        """
+        folder_path, _ = os.path.split(self.files[0])
+        suffix = pathlib.Path(self.files[0]).suffix
+        files = [str(f) for f in self.files]
+        known_files = set(os.path.normpath(f) for f in files)
+        if self.proc_filename is not None:
+            known_files.add(os.path.normpath(self.proc_filename))
+        new_files = []
+        for file in os.listdir(folder_path or "."):
+            filename = os.path.join(folder_path, file)
+            if file.endswith(suffix) and os.path.normpath(filename) not in known_files:
+                new_files.append(filename)
+        return files + sorted(new_files)
+
     def get_next_folder_filenames(self):
         """
         Loads all files from the next folder with similar file-endings.
@@ -385,6 +759,27 @@ class BatchModel(QtCore.QObject):
         return files[: self.n_img_all]
 
 
+def create_resizable_dataset(group, name, data):
+    """
+    Create a chunked dataset, which can be resized along all axes (e.g. to append patterns).
+    """
+    data = np.asarray(data)
+    return group.create_dataset(
+        name, data=data, maxshape=(None,) * data.ndim, chunks=True
+    )
+
+
+def pad_last_axis(array, length):
+    """
+    Pad the last axis of an array with zeros to the given length.
+    """
+    array = np.asarray(array)
+    if array.shape[-1] >= length:
+        return array
+    padding = [(0, 0)] * (array.ndim - 1) + [(0, length - array.shape[-1])]
+    return np.pad(array, padding)
+
+
 def iterate_folder(folder_path, step):
     pattern = re.compile(r"\d+")
     match_iterator = pattern.finditer(folder_path)
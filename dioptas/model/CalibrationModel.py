@@ -18,9 +18,12 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import contextlib
+import functools
 import logging
 import os
 import sys
+import threading
 import time
 from enum import Enum
 from copy import deepcopy
@@ -45,12 +48,43 @@ from .util.HelperModule import (
     rotate_matrix_m90,
     get_partial_index,
 )
-from .util.calc import supersample_image, trim_trailing_zeros
+from .util.calc import (
+    get_binning_unit,
+    get_sector_bins,
+    supersample_image,
+    trim_trailing_zeros,
+)
+from .util.IntegrationEngineCache import (
+    integration_engine_cache,
+    geometry_fingerprint,
+    mask_fingerprint,
+)
+from .util.IntegrationMethodTuner import (
+    CANDIDATE_METHODS,
+    benchmark_methods,
+    integration_method_tuner,
+)
+from .util.SparseIntegrator import SparseIntegrator
+from .util.cache import LRUCache
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 
+def _with_integration_lock(method):
+    """
+    Runs the method of the CalibrationModel with its integration_lock, so that geometry, detector and supersampling
+    do not change during an integration in the background thread of the IntegrationWorker.
+    """
+
+    @functools.wraps(method)
+    def locked_method(self, *args, **kwargs):
+        with self.integration_lock:
+            return method(self, *args, **kwargs)
+
+    return locked_method
+
+
 class CalibrationModel(object):
 
     def __init__(self, img_model=None):
@@ -75,6 +109,20 @@ class CalibrationModel(object):
         self.pattern_geometry_img_shape = None
         self.cake_geometry = None
         self.cake_geometry_img_shape = None
+        self.engine_cache = integration_engine_cache
+        self.method_tuner = integration_method_tuner
+        self._pattern_engine_key = None
+        self._cake_engine_key = None
+        self._integration_mask_cache = None
+        # (detector mask, fingerprint), reset together with the detector, see get_detector_mask_fingerprint
+        self._detector_mask_fingerprint = None
+        # integration method of the last integrate_1d_stack
+        self.stack_integration_method = "csr"
+        self._sparse_integrators = LRUCache(
+            max_items=4, size_fn=lambda cached: cached[0].nbytes
+        )
+        # (min, max) of the radial values of the detector pixels for geometry, image shape and unit
+        self._radial_extents = LRUCache(max_items=8)
         self.calibrant = Calibrant()
 
         self.orig_pixel1 = (
@@ -113,6 +161,13 @@ class CalibrationModel(object):
 
         self.peak_search_algorithm = None
 
+        # integrations and all changes of the geometry, detector and supersampling are done with this lock, the
+        # IntegrationWorker integrates in a background thread
+        self.integration_lock = threading.RLock()
+        self._cake_lock = threading.Lock()
+        # shape and filename of the image integrated in the current thread, see integrate_snapshot
+        self._snapshot = threading.local()
+
         self.img_model.img_changed.connect(self._check_detector_and_image_shape)
 
         self.detector_reset = Signal()
@@ -182,6 +237,7 @@ class CalibrationModel(object):
             self.points_index.pop(-1)
             return num_points
 
+    @_with_integration_lock
     def create_cake_geometry(self):
         self.cake_geometry = AzimuthalIntegrator(
             splineFile=self.distortion_spline_filename
@@ -201,6 +257,7 @@ class CalibrationModel(object):
 
         self.cake_geometry.detector = self.detector
         self.cake_geometry.wavelength = pyFAI_parameter["wavelength"]
+        self._cake_engine_key = None
 
     def setup_peak_search_algorithm(self, algorithm, mask=None):
         """
@@ -226,6 +283,7 @@ class CalibrationModel(object):
         else:
             return
 
+    @_with_integration_lock
     def search_peaks_on_ring(
         self, ring_index, delta_tth=0.1, min_mean_factor=1, upper_limit=55000, mask=None
     ):
@@ -259,7 +317,7 @@ class CalibrationModel(object):
         tth_calibrant = float(tth_calibrant_list[ring_index])
 
         # get the calculated two theta values for the whole image
-        tth_array = self.pattern_geometry.twoThetaArray(self.img_model.img_data.shape)
+        tth_array = self.pattern_geometry.twoThetaArray(self.img_model.img_shape)
 
         # create mask based on two_theta position
         ring_mask = abs(tth_array - tth_calibrant) <= delta_tth
@@ -311,6 +369,7 @@ class CalibrationModel(object):
         self.start_values = start_values
         self.polarization_factor = start_values["polarization_factor"]
 
+    @_with_integration_lock
     def set_pixel_size(self, pixel_size):
         """
         :param pixel_size: tuple with pixel_width and pixel height as element
@@ -322,9 +381,10 @@ class CalibrationModel(object):
         self.detector.pixel2 = self.orig_pixel2
         self.set_supersampling()
 
+    @_with_integration_lock
     def update_detector_shape(self):
-        self.detector.shape = self.img_model.img_data.shape
-        self.detector.max_shape = self.img_model.img_data.shape
+        self.detector.shape = self._img_shape
+        self.detector.max_shape = self._img_shape
 
     def set_fixed_values(self, fixed_values):
         """
@@ -335,6 +395,7 @@ class CalibrationModel(object):
         """
         self.fixed_values = fixed_values
 
+    @_with_integration_lock
     def calibrate(self):
         if len(self.points) == 0:
             raise NoPointsError("No starting points for calibration found.")
@@ -358,6 +419,7 @@ class CalibrationModel(object):
         # reset the integrator (not the geometric parameters)
         self.pattern_geometry.reset()
 
+    @_with_integration_lock
     def refine(self):
         if len(self.points) == 0:
             raise NoPointsError("No points for refinement found.")
@@ -385,12 +447,79 @@ class CalibrationModel(object):
         self.pattern_geometry.reset()
 
     def _check_detector_and_image_shape(self):
-        if self.detector.shape is not None:
-            if self.detector.shape != self.img_model.img_data.shape:
-                self.reset_detector()
-                self.detector_reset.emit()
-        else:
+        if self.detector.shape is not None and self.detector.shape == self._img_shape:
+            return
+        if (
+            self.detector.shape is not None
+            and getattr(self._snapshot, "img_shape", None) is not None
+            and not self._snapshot.reset_detector
+        ):
+            # the detector was already reset for a newer image, whose integration supersedes this one
+            raise ValueError(
+                "The image shape changed during the integration of a snapshot."
+            )
+        with self.integration_lock:
+            detector_shape = self.detector.shape
             self.reset_detector()
+        if detector_shape is not None:
+            self.detector_reset.emit()
+
+    @contextlib.contextmanager
+    def integrate_snapshot(self, img_shape, filename, reset_detector=False):
+        """
+        Integrations in the with block (in the current thread) integrate a snapshot of an image, which might not be
+        the current image of the img_model anymore (e.g. in the background thread of the IntegrationWorker, while the
+        next image is loaded). The shape and filename of the snapshot are used instead of the ones of the img_model.
+        The integration_lock is held in the with block.
+        :param img_shape: shape of the image the snapshot was taken from
+        :param filename: filename of the image
+        :param reset_detector: whether the detector is reset to the shape of the snapshot if it has another shape,
+                               otherwise a ValueError is raised, since the detector was reset for a newer image
+        """
+        with self.integration_lock:
+            self._snapshot.img_shape = tuple(img_shape)
+            self._snapshot.filename = filename
+            self._snapshot.reset_detector = reset_detector
+            try:
+                yield
+            finally:
+                self._snapshot.img_shape = None
+                self._snapshot.filename = None
+                self._snapshot.reset_detector = False
+
+    @property
+    def _img_shape(self):
+        """
+        :return: shape of the integrated image, see integrate_snapshot
+        """
+        img_shape = getattr(self._snapshot, "img_shape", None)
+        if img_shape is None:
+            return self.img_model.img_shape
+        return img_shape
+
+    @property
+    def _img_filename(self):
+        """
+        :return: filename of the integrated image, see integrate_snapshot
+        """
+        filename = getattr(self._snapshot, "filename", None)
+        if filename is None:
+            return self.img_model.filename
+        return filename
+
+    def get_cake(self):
+        """
+        :return: cake_img, cake_tth and cake_azi of the same cake integration, also while the IntegrationWorker
+                 integrates the next one
+        """
+        with self._cake_lock:
+            return self.cake_img, self.cake_tth, self.cake_azi
+
+    def _set_cake(self, cake_img, cake_tth, cake_azi):
+        with self._cake_lock:
+            self.cake_img = cake_img
+            self.cake_tth = cake_tth
+            self.cake_azi = cake_azi
 
     def _prepare_integration_mask(self, mask):
         if mask is None:
@@ -402,17 +531,223 @@ class CalibrationModel(object):
                 if mask.shape == self.detector.mask.shape:
                     return np.logical_or(self.detector.mask, mask)
 
-    def _prepare_integration_super_sampling(self, mask):
+    def _get_integration_mask(self, mask):
+        """
+        Combines the mask with the detector mask. The result is cached for read-only masks (e.g. the composite mask of
+        the MaskModel), which can not change without being replaced.
+        :param mask: mask for the integration or None
+        :return: integration mask, fingerprint of the integration mask, True if mask masks every pixel
+        """
+        detector_mask = self.detector.mask
+        cache = self._integration_mask_cache
+        if cache is not None and cache[0] is mask and cache[1] is detector_mask:
+            return cache[2:]
+
+        fully_masked = mask is not None and bool(np.all(mask))
+        integration_mask = self._prepare_integration_mask(mask)
+        if integration_mask is not None and not integration_mask.flags.writeable:
+            # pyFAI can not compute the checksum of read-only buffers
+            integration_mask = integration_mask.copy()
+        result = (integration_mask, mask_fingerprint(integration_mask), fully_masked)
+
+        if mask is None or not mask.flags.writeable:
+            self._integration_mask_cache = (mask, detector_mask) + result
+        return result
+
+    def get_detector_mask_fingerprint(self):
+        """
+        :return: fingerprint of the detector mask (see mask_fingerprint), only calculated once per detector mask
+        """
+        detector_mask = self.detector.mask
+        if detector_mask is None:
+            return None
+        cache = self._detector_mask_fingerprint
+        if cache is None or cache[0] is not detector_mask:
+            cache = (detector_mask, mask_fingerprint(detector_mask))
+            self._detector_mask_fingerprint = cache
+        return cache[1]
+
+    def _get_supersampled_shape(self):
+        factor = self.supersampling_factor
+        return (
+            self._img_shape[0] * factor,
+            self._img_shape[1] * factor,
+        )
+
+    def _get_sparse_integrator(
+        self, geometry, engine_key, mask, polarization_factor, integrate, region=None
+    ):
+        """
+        Gets the sparse integrator (the CSR matrix of pyFAI folded onto the original image pixels, see
+        SparseIntegrator) for the given integration settings. It is created once by integrating an empty image in
+        the supersampled geometry, which builds the matrix in pyFAI.
+        :param geometry: pattern_geometry or cake_geometry
+        :param engine_key: key of the integration engine (see IntegrationEngineCache.create_key)
+        :param mask: integration mask in the original image shape
+        :param polarization_factor: polarization factor for the integration
+        :param integrate: function(img_data, mask) integrating with the csr method of pyFAI in the geometry
+        :param region: (row_start, row_stop, column_start, column_stop), the integrator is cropped to this sub-array
+                       of the image (see SparseIntegrator.crop), the mask needs to mask everything outside of it
+        :return: SparseIntegrator, result of integrate (for the axes of the integration)
+        """
+        key = (
+            engine_key,
+            polarization_factor,
+            self.correct_solid_angle,
+            self.supersampling_factor,
+        )
+        if region is not None:
+            cached = self._sparse_integrators.get(key + (tuple(region),))
+            if cached is None:
+                sparse_integrator, result = self._get_sparse_integrator(
+                    geometry, engine_key, mask, polarization_factor, integrate
+                )
+                cached = (sparse_integrator.crop(region), result)
+                self._sparse_integrators.put(key + (tuple(region),), cached)
+            return cached
+
+        cached = self._sparse_integrators.get(key)
+        if cached is not None:
+            return cached
+
+        factor = self.supersampling_factor
+        shape = self._get_supersampled_shape()
+        supersampled_mask = None
+        if mask is not None:
+            supersampled_mask = supersample_image(mask, factor)
+
+        result = integrate(np.zeros(shape, dtype=np.float32), supersampled_mask)
+        engine = get_csr_engine(geometry, dimension=len(result) - 1)
+
+        normalization = np.ones(shape, dtype=np.float32)
+        if self.correct_solid_angle:
+            normalization *= geometry.solidAngleArray(shape, absolute=False)
+        if polarization_factor is not None:
+            normalization *= geometry.polarization(shape, polarization_factor)
+
+        sparse_integrator = SparseIntegrator(
+            engine, self._img_shape, factor, normalization
+        )
+        cached = (sparse_integrator, result)
+        self._sparse_integrators.put(key, cached)
+        return cached
+
+    def _crop_img_data(self, img_data, region):
+        """
+        :param img_data: image in the shape of the current image or already cropped to the region
+        :param region: (row_start, row_stop, column_start, column_stop) or None
+        :return: img_data cropped to the region
+        """
+        if region is None or tuple(img_data.shape[-2:]) != tuple(self._img_shape):
+            return img_data
+        return img_data[..., region[0] : region[1], region[2] : region[3]]
+
+    def _prepare_integration_img_data(self, img_data):
+        if self.supersampling_factor > 1:
+            return supersample_image(img_data, self.supersampling_factor)
+        return writable_for_pyfai(img_data)
+
+    def get_integration_method(self, num_points, azimuth_points=None):
+        """
+        :param num_points: number of radial points
+        :param azimuth_points: number of azimuthal points of a cake, None for a pattern
+        :return: method tuned for the detector, the image shape and the number of points (see
+                 tune_integration_method), 'csr' if it was not tuned
+        """
+        key = self.method_tuner.create_key(
+            self.detector, self._img_shape, num_points, azimuth_points
+        )
+        return self.method_tuner.get(key)
+
+    @_with_integration_lock
+    def tune_integration_method(
+        self,
+        num_points=None,
+        mask=None,
+        unit="2th_deg",
+        azimuth_points=None,
+        radial_range=None,
+        candidates=CANDIDATE_METHODS,
+        repeats=3,
+        tolerance=1e-2,
+    ):
+        """
+        Benchmarks the candidate integration methods of pyFAI on the current geometry and image and remembers the
+        fastest one, whose results agree with the ones of the first candidate, for the detector, image shape and number
+        of points (see benchmark_methods). Afterwards integrate_1d, integrate_1d_stack (batch processing) or
+        integrate_2d (for azimuth_points) use it, when no method is given, also in other sessions. The integrated
+        pattern and cake are not changed by the benchmark.
+        :param num_points: number of radial points, None for the automatic number of points
+        :param mask: mask for the integration
+        :param unit: unit of the integration
+        :param azimuth_points: number of azimuthal points to tune the cake integration, None to tune the pattern
+        :param radial_range: radial range of the integration in unit
+        :param candidates: integration methods to benchmark
+        :param repeats: number of timed integrations per method
+        :param tolerance: maximum relative root mean square deviation from the results of the first candidate
+        :return: fastest method, dictionary with the time per integration in s for each candidate (None for methods
+                 which failed or whose results deviate)
+        """
         if self.supersampling_factor > 1:
-            img_data = supersample_image(
-                self.img_model.img_data, self.supersampling_factor
+            raise ValueError(
+                "Supersampled images are always integrated with the csr method."
             )
-            if mask is not None:
-                mask = supersample_image(mask, self.supersampling_factor)
+
+        if azimuth_points is None:
+
+            def integrate(method):
+                return self.integrate_1d(
+                    num_points,
+                    mask,
+                    unit=unit,
+                    method=method,
+                    trim_zeros=False,
+                    radial_range=radial_range,
+                )
+
         else:
-            img_data = self.img_model.img_data
-        return img_data, mask
 
+            def integrate(method):
+                cake = self.integrate_2d(
+                    mask,
+                    unit=unit,
+                    method=method,
+                    rad_points=num_points,
+                    azimuth_points=azimuth_points,
+                    radial_range=radial_range,
+                )
+                return self.cake_tth, cake
+
+        # the benchmark integrations do not change the integrated pattern and cake, which might be displayed
+        pattern_state = (self.tth, self.int, self.num_points)
+        cake_state = self.get_cake()
+        try:
+            timings = benchmark_methods(integrate, candidates, repeats, tolerance)
+            tuned_num_points = self.num_points
+        finally:
+            self.tth, self.int, self.num_points = pattern_state
+            self._set_cake(*cake_state)
+        valid_timings = {
+            method: timing for method, timing in timings.items() if timing is not None
+        }
+        if len(valid_timings) == 0:
+            raise ValueError(
+                "None of the integration methods {} works.".format(candidates)
+            )
+        fastest_method = min(valid_timings, key=valid_timings.get)
+
+        key = self.method_tuner.create_key(
+            self.detector, self._img_shape, tuned_num_points, azimuth_points
+        )
+        self.method_tuner.put(key, fastest_method)
+        logger.info(
+            "Tuned integration method for {}: {} ({})".format(
+                key, fastest_method, timings
+            )
+        )
+        return fastest_method, timings
+
+    @_with_integration_lock
     def integrate_1d(
         self,
         num_points=None,
@@ -420,11 +755,16 @@ class CalibrationModel(object):
         polarization_factor=None,
         filename=None,
         unit="2th_deg",
-        method="csr",
+        method=None,
         azi_range=None,
         trim_zeros=True,
+        img_data=None,
+        radial_range=None,
+        region=None,
     ):
         """
+        With supersampling the image is integrated in its original resolution by the sparse integrator of the
+        supersampled geometry, always using the csr method.
         :param num_points: number of points for the integration
         :param mask: mask for the integration
         :param polarization_factor: polarization factor for the integration
@@ -432,76 +772,107 @@ class CalibrationModel(object):
         :param unit: unit for the integration, possible values are '2th_deg', 'q_A^-1', 'r_mm', 'r_m', 'd_A'
         :param method: method for the integration, possible values are 'csr', 'splitbbox', 'lut', 'nosplit_csr',
                           'full_csr', 'numpy', 'cython', 'BBox', 'splitPixel', 'lut_ocl', 'csr_ocl', 'csr_ocl_memsave',
-                            'csr_ocl_lut', 'csr_ocl_lut_memsave', 'csr_numpy', 'csr_numpy_memsave'
+                            'csr_ocl_lut', 'csr_ocl_lut_memsave', 'csr_numpy', 'csr_numpy_memsave'. None uses the
+                            method tuned for the detector, image shape and number of points (see
+                            tune_integration_method), which defaults to 'csr'
         :param azi_range: azimuthal range for the integration
         :param trim_zeros: if True, the trailing zeros in the integration will be trimmed
+        :param img_data: image to integrate instead of the current image of the img_model (e.g. a snapshot integrated
+                         in a background thread), it needs to have the shape of the current image
+        :param radial_range: radial range of the integration in the binning unit of unit (see get_binning_unit), only
+                             pixels within the range are part of the integration matrix
+        :param region: (row_start, row_stop, column_start, column_stop) of the image, which is integrated alone (e.g.
+                       the roi), the mask needs to mask everything outside of it. The integration matrix is cropped
+                       to the region and img_data can be given already cropped to it
         :return: tth, intensity
         """
-        if (
-            np.sum(mask)
-            == self.img_model.img_data.shape[0] * self.img_model.img_data.shape[1]
-        ):
-            # do not perform integration if the image is completely masked...
-            return self.tth, self.int
-
-        if self.pattern_geometry_img_shape != self.img_model.img_data.shape:
+        if img_data is None:
+            img_data = self.img_model.img_data
+        if self.pattern_geometry_img_shape != self._img_shape:
             # if cake geometry was used on differently shaped image before the azimuthal integrator needs to be reset
             self.pattern_geometry.reset()
-            self.pattern_geometry_img_shape = self.img_model.img_data.shape
+            self.pattern_geometry_img_shape = self._img_shape
 
         if polarization_factor is None:
             polarization_factor = self.polarization_factor
 
         self._check_detector_and_image_shape()
-        mask = self._prepare_integration_mask(mask)
-        img_data, mask = self._prepare_integration_super_sampling(mask)
+        mask, mask_checksum, fully_masked = self._get_integration_mask(mask)
+        if fully_masked:
+            # do not perform integration if the image is completely masked...
+            return self.tth, self.int
 
+        shape = self._get_supersampled_shape()
+        integration_unit = get_binning_unit(unit)
         if num_points is None:
-            num_points = self.calculate_number_of_pattern_points(img_data.shape, 2)
+            num_points = self._get_default_num_points(
+                shape, integration_unit, radial_range
+            )
 
         self.num_points = num_points
+        use_sparse_integrator = (
+            self.supersampling_factor > 1 or region is not None
+        ) and filename is None
+        if use_sparse_integrator:
+            method = "csr"
+        elif method is None:
+            method = self.get_integration_method(num_points)
+
+        engine_key = self.engine_cache.create_key(
+            self.pattern_geometry,
+            shape,
+            mask_checksum,
+            integration_unit,
+            num_points,
+            azimuth_range=azi_range,
+            radial_range=radial_range,
+            method=method,
+        )
+        self._pattern_engine_key = self.engine_cache.activate(
+            self.pattern_geometry, engine_key, self._pattern_engine_key
+        )
 
         t1 = time.time()
 
-        if unit == "d_A":
-            try:
-                self.tth, self.int = self.pattern_geometry.integrate1d(
-                    img_data,
-                    num_points,
-                    method=method,
-                    unit="2th_deg",
-                    azimuth_range=azi_range,
-                    mask=mask,
-                    polarization_factor=polarization_factor,
-                    correctSolidAngle=self.correct_solid_angle,
-                    filename=filename,
-                )
-            except NameError:
-                self.tth, self.int = self.pattern_geometry.integrate1d(
+        if use_sparse_integrator:
+
+            def integrate(img_data, integration_mask):
+                return self.pattern_geometry.integrate1d(
                     img_data,
                     num_points,
                     method="csr",
-                    unit="2th_deg",
+                    unit=integration_unit,
                     azimuth_range=azi_range,
-                    mask=mask,
+                    radial_range=radial_range,
+                    mask=integration_mask,
                     polarization_factor=polarization_factor,
                     correctSolidAngle=self.correct_solid_angle,
-                    filename=filename,
                 )
-            self.tth = (
-                self.pattern_geometry.wavelength
-                / (2 * np.sin(self.tth / 360 * np.pi))
-                * 1e10
+
+            sparse_integrator, result = self._get_sparse_integrator(
+                self.pattern_geometry,
+                engine_key,
+                mask,
+                polarization_factor,
+                integrate,
+                region,
+            )
+            self.tth = np.copy(result[0])
+            self.int = sparse_integrator.integrate(
+                self._crop_img_data(img_data, region)
             )
-            self.int = self.int
         else:
+            if mask is not None and self.supersampling_factor > 1:
+                mask = supersample_image(mask, self.supersampling_factor)
+            img_data = self._prepare_integration_img_data(img_data)
             try:
                 self.tth, self.int = self.pattern_geometry.integrate1d(
                     img_data,
                     num_points,
                     method=method,
-                    unit=unit,
+                    unit=integration_unit,
                     azimuth_range=azi_range,
+                    radial_range=radial_range,
                     mask=mask,
                     polarization_factor=polarization_factor,
                     correctSolidAngle=self.correct_solid_angle,
@@ -512,8 +883,9 @@ class CalibrationModel(object):
                     img_data,
                     num_points,
                     method="csr",
-                    unit=unit,
+                    unit=integration_unit,
                     azimuth_range=azi_range,
+                    radial_range=radial_range,
                     mask=mask,
                     polarization_factor=polarization_factor,
                     correctSolidAngle=self.correct_solid_angle,
@@ -521,65 +893,594 @@ class CalibrationModel(object):
                 )
         logger.info(
             "1d integration of {0}: {1}s.".format(
-                os.path.basename(self.img_model.filename), time.time() - t1
+                os.path.basename(self._img_filename), time.time() - t1
             )
         )
+        self.engine_cache.store(self.pattern_geometry, engine_key)
+        self._finish_pattern(unit, trim_zeros)
+        return self.tth, self.int
+
+    def _finish_pattern(self, unit, trim_zeros):
+        """
+        Converts the integrated pattern (self.tth, self.int) into d if necessary and trims trailing zeros.
+        """
+        if unit == "d_A":
+            self.tth = (
+                self.pattern_geometry.wavelength
+                / (2 * np.sin(self.tth / 360 * np.pi))
+                * 1e10
+            )
 
         if (
             np.sum(self.int) != 0 and trim_zeros
         ):  # only trim zeros if not everything is 0 (e.g. bkg-subtraction of the same image)
             self.tth, self.int = trim_trailing_zeros(self.tth, self.int)
 
-        return self.tth, self.int
-
+    @_with_integration_lock
     def integrate_2d(
         self,
         mask=None,
         polarization_factor=None,
         unit="2th_deg",
-        method="csr",
+        method=None,
         rad_points=None,
         azimuth_points=360,
         azimuth_range=None,
+        img_data=None,
+        radial_range=None,
+        region=None,
     ):
+        """
+        :param method: method for the integration, see integrate_1d
+        :param img_data: image to integrate instead of the current image of the img_model, see integrate_1d
+        :param radial_range: radial range of the cake in unit
+        :param region: sub-array of the image, which is integrated alone, see integrate_1d
+        """
+        if img_data is None:
+            img_data = self.img_model.img_data
         if polarization_factor is None:
             polarization_factor = self.polarization_factor
+        use_sparse_integrator = self.supersampling_factor > 1 or region is not None
+        if use_sparse_integrator:
+            method = "csr"
+        engine_key, mask, rad_points, integrate = self._prepare_cake_integration(
+            mask,
+            polarization_factor,
+            unit,
+            method,
+            rad_points,
+            azimuth_points,
+            azimuth_range,
+            radial_range,
+        )
+
+        t1 = time.time()
+        if use_sparse_integrator:
+            sparse_integrator, res = self._get_sparse_integrator(
+                self.cake_geometry,
+                engine_key,
+                mask,
+                polarization_factor,
+                integrate,
+                region,
+            )
+            cake = sparse_integrator.integrate(self._crop_img_data(img_data, region))
+            cake = cake.reshape(rad_points, azimuth_points).T
+            res = (cake, res[1], res[2])
+        else:
+            res = integrate(self._prepare_integration_img_data(img_data), mask)
+        logger.info(
+            "2d integration of {0}: {1}s.".format(
+                os.path.basename(self._img_filename), time.time() - t1
+            )
+        )
+        self.engine_cache.store(self.cake_geometry, engine_key)
+        self._set_cake(res[0], res[1], res[2])
+        return self.cake_img
 
-        if self.cake_geometry_img_shape != self.img_model.img_data.shape:
+    @_with_integration_lock
+    def integrate_1d_and_2d(
+        self,
+        mask=None,
+        polarization_factor=None,
+        unit="2th_deg",
+        num_points=None,
+        azimuth_points=360,
+        trim_zeros=True,
+        img_data=None,
+        radial_range=None,
+        region=None,
+    ):
+        """
+        Integrates the image into a cake and a pattern in a single pass. The pattern is derived from the summed signal
+        and normalization of all azimuthal bins of the cake, which is the same as the 1D integration over the full
+        azimuthal range with the radial bins of the cake. Only the matrix of the cake geometry is built.
+        :param mask: mask for the integration
+        :param polarization_factor: polarization factor for the integration
+        :param unit: unit of the pattern, '2th_deg' or 'd_A' (the cake is binned in 2θ)
+        :param num_points: number of radial bins of pattern and cake
+        :param azimuth_points: number of azimuthal bins of the cake
+        :param trim_zeros: whether trailing zeros of the pattern are trimmed
+        :param img_data: image to integrate instead of the current image of the img_model, see integrate_1d
+        :param radial_range: radial range of pattern and cake in 2θ
+        :param region: sub-array of the image, which is integrated alone, see integrate_1d
+        :return: x, y of the pattern
+        """
+        if get_binning_unit(unit) != "2th_deg":
+            raise ValueError("The pattern of a combined integration is binned in 2θ.")
+        if img_data is None:
+            img_data = self.img_model.img_data
+
+        if polarization_factor is None:
+            polarization_factor = self.polarization_factor
+        if self._get_integration_mask(mask)[2]:
+            # like in integrate_1d the pattern of a completely masked image is not integrated
+            self.integrate_2d(
+                mask,
+                polarization_factor,
+                rad_points=num_points,
+                azimuth_points=azimuth_points,
+                img_data=img_data,
+                radial_range=radial_range,
+                region=region,
+            )
+            return self.tth, self.int
+
+        engine_key, mask, num_points, integrate = self._prepare_cake_integration(
+            mask,
+            polarization_factor,
+            "2th_deg",
+            "csr",
+            num_points,
+            azimuth_points,
+            radial_range=radial_range,
+        )
+
+        t1 = time.time()
+        sparse_integrator, res = self._get_sparse_integrator(
+            self.cake_geometry,
+            engine_key,
+            mask,
+            polarization_factor,
+            integrate,
+            region,
+        )
+        cake, self.int = sparse_integrator.integrate_cake_and_pattern(
+            self._crop_img_data(img_data, region), azimuth_points
+        )
+        logger.info(
+            "1d and 2d integration of {0}: {1}s.".format(
+                os.path.basename(self._img_filename), time.time() - t1
+            )
+        )
+        self.engine_cache.store(self.cake_geometry, engine_key)
+        self._set_cake(cake.reshape(num_points, azimuth_points).T, res[1], res[2])
+
+        self.tth = np.copy(res[1])
+        self._finish_pattern(unit, trim_zeros)
+        return self.tth, self.int
+
+    @_with_integration_lock
+    def integrate_sectors(
+        self,
+        sector_edges,
+        num_points=None,
+        mask=None,
+        polarization_factor=None,
+        unit="2th_deg",
+        img_data=None,
+        radial_range=None,
+        region=None,
+    ):
+        """
+        Integrates the image into a pattern for each azimuthal sector with a single sparse matrix. The matrix is
+        created by summing the azimuthal bins of a cake, whose bins have the edges of all sectors as boundaries.
+        :param sector_edges: n_sectors + 1 increasing azimuthal sector edges in degrees (within -180° and 180°)
+        :param num_points: number of radial points of the patterns
+        :param mask: mask for the integration
+        :param polarization_factor: polarization factor for the integration
+        :param unit: unit of the patterns, possible values are '2th_deg', 'q_A^-1', 'd_A'
+        :param img_data: image to integrate instead of the current image of the img_model, see integrate_1d
+        :param radial_range: radial range in the binning unit of unit, see integrate_1d
+        :param region: sub-array of the image, which is integrated alone, see integrate_1d
+        :return: x (num_points), intensities (n_sectors x num_points)
+        """
+        if img_data is None:
+            img_data = self.img_model.img_data
+
+        t1 = time.time()
+        sector_integrator, x, num_points = self._get_sector_integrator(
+            sector_edges,
+            num_points,
+            mask,
+            polarization_factor,
+            unit,
+            radial_range,
+            region,
+        )
+        intensities = sector_integrator.integrate(self._crop_img_data(img_data, region))
+        intensities = intensities.reshape(len(sector_edges) - 1, num_points)
+        logger.info(
+            "integration of {0} sectors of {1}: {2}s.".format(
+                len(sector_edges) - 1,
+                os.path.basename(self._img_filename),
+                time.time() - t1,
+            )
+        )
+        return x, intensities
+
+    @_with_integration_lock
+    def integrate_sectors_stack(
+        self,
+        frames,
+        sector_edges,
+        num_points=None,
+        mask=None,
+        polarization_factor=None,
+        unit="2th_deg",
+        background=None,
+        corrections=None,
+        factor=1,
+        radial_range=None,
+        region=None,
+    ):
+        """
+        Integrates a stack of frames into a pattern for each azimuthal sector, with the sparse matrix of
+        integrate_sectors applied to blocks of frames (see integrate_1d_stack).
+        :param frames: 3d array (n_frames, rows, columns) with frames in the orientation of the img_model.img_data,
+                       they can be cropped to the region
+        :param sector_edges: n_sectors + 1 increasing azimuthal sector edges in degrees, see integrate_sectors
+        :param background: image (or value) subtracted from every frame
+        :param corrections: image every frame is divided by
+        :param factor: factor every frame is multiplied with
+        :return: x (num_points), intensities (n_frames x n_sectors x num_points)
+        """
+        t1 = time.time()
+        sector_integrator, x, num_points = self._get_sector_integrator(
+            sector_edges,
+            num_points,
+            mask,
+            polarization_factor,
+            unit,
+            radial_range,
+            region,
+        )
+        frames, background, corrections = self._crop_stack(
+            frames, background, corrections, region
+        )
+        intensities = sector_integrator.integrate_stack(
+            frames, background, corrections, factor
+        )
+        intensities = intensities.reshape(
+            len(frames), len(sector_edges) - 1, num_points
+        )
+        logger.info(
+            "integration of {0} sectors of {1} frames: {2}s.".format(
+                len(sector_edges) - 1, len(frames), time.time() - t1
+            )
+        )
+        return x, intensities
+
+    def _get_sector_integrator(
+        self,
+        sector_edges,
+        num_points,
+        mask,
+        polarization_factor,
+        unit,
+        radial_range,
+        region,
+    ):
+        """
+        Creates (or gets the cached) sparse integrator of the sectors. It is created by summing the azimuthal bins of
+        a cake, whose bins have the edges of all sectors as boundaries.
+        :return: sector integrator, x in unit, number of radial points
+        """
+        sector_edges = np.asarray(sector_edges, dtype=np.float64)
+        azimuth_points, sector_bins = get_sector_bins(sector_edges)
+        if polarization_factor is None:
+            polarization_factor = self.polarization_factor
+
+        engine_key, mask, num_points, integrate = self._prepare_cake_integration(
+            mask,
+            polarization_factor,
+            get_binning_unit(unit),
+            "csr",
+            num_points,
+            azimuth_points,
+            (sector_edges[0], sector_edges[-1]),
+            radial_range,
+        )
+
+        key = (
+            engine_key,
+            polarization_factor,
+            self.correct_solid_angle,
+            self.supersampling_factor,
+            tuple(sector_edges),
+            None if region is None else tuple(region),
+        )
+        cached = self._sparse_integrators.get(key)
+        if cached is None:
+            cake_integrator, res = self._get_sparse_integrator(
+                self.cake_geometry, engine_key, mask, polarization_factor, integrate
+            )
+            sector_integrator = cake_integrator.sum_azimuthal_bins(
+                azimuth_points, sector_bins
+            )
+            if region is not None:
+                sector_integrator = sector_integrator.crop(region)
+            cached = (sector_integrator, res)
+            self._sparse_integrators.put(key, cached)
+        sector_integrator, res = cached
+        self.engine_cache.store(self.cake_geometry, engine_key)
+
+        x = np.copy(res[1])
+        if unit == "d_A":
+            x = self.cake_geometry.wavelength / (2 * np.sin(x / 360 * np.pi)) * 1e10
+        return sector_integrator, x, num_points
+
+    def _prepare_cake_integration(
+        self,
+        mask,
+        polarization_factor,
+        unit,
+        method,
+        rad_points,
+        azimuth_points,
+        azimuth_range=None,
+        radial_range=None,
+    ):
+        """
+        Prepares the cake geometry and its integration engine for an integration.
+        :return: engine key, integration mask, number of radial points, function(img_data, mask) integrating with
+                 pyFAI
+        """
+        if self.cake_geometry_img_shape != self._img_shape:
             # if cake geometry was used on differently shaped image before the azimuthal integrator needs to be reset
             self.cake_geometry.reset()
-            self.cake_geometry_img_shape = self.img_model.img_data.shape
+            self.cake_geometry_img_shape = self._img_shape
 
         self._check_detector_and_image_shape()
-        mask = self._prepare_integration_mask(mask)
-        img_data, mask = self._prepare_integration_super_sampling(mask)
+        mask, mask_checksum, _ = self._get_integration_mask(mask)
 
+        shape = self._get_supersampled_shape()
         if rad_points is None:
-            rad_points = self.calculate_number_of_pattern_points(img_data.shape, 2)
+            rad_points = self._get_default_num_points(shape, unit, radial_range)
         self.num_points = rad_points
+        if method is None:
+            method = self.get_integration_method(rad_points, azimuth_points)
+
+        engine_key = self.engine_cache.create_key(
+            self.cake_geometry,
+            shape,
+            mask_checksum,
+            unit,
+            rad_points,
+            azimuth_range=azimuth_range,
+            radial_range=radial_range,
+            method=method,
+            azimuth_npt=azimuth_points,
+        )
+        self._cake_engine_key = self.engine_cache.activate(
+            self.cake_geometry, engine_key, self._cake_engine_key
+        )
+
+        def integrate(img_data, integration_mask):
+            return self.cake_geometry.integrate2d(
+                img_data,
+                rad_points,
+                azimuth_points,
+                azimuth_range=azimuth_range,
+                radial_range=radial_range,
+                method=method,
+                mask=integration_mask,
+                unit=unit,
+                polarization_factor=polarization_factor,
+                correctSolidAngle=self.correct_solid_angle,
+            )
+
+        return engine_key, mask, rad_points, integrate
+
+    @_with_integration_lock
+    def integrate_1d_stack(
+        self,
+        frames,
+        num_points=None,
+        mask=None,
+        polarization_factor=None,
+        unit="2th_deg",
+        azi_range=None,
+        background=None,
+        corrections=None,
+        factor=1,
+        radial_range=None,
+        region=None,
+        method=None,
+    ):
+        """
+        Integrates a stack of frames, which share the geometry, mask and corrections. With the csr method the CSR
+        integration matrix of pyFAI is applied to blocks of frames in a single sparse matrix product, the normalization
+        (solid angle and polarization) is only calculated once. Other methods integrate the frames one by one. The
+        used method is kept in stack_integration_method.
+        :param frames: 3d array (n_frames, rows, columns) with frames in the orientation of the img_model.img_data
+        :param num_points: number of points for the integration
+        :param mask: mask for the integration
+        :param polarization_factor: polarization factor for the integration
+        :param unit: unit for the integration, possible values are '2th_deg', 'q_A^-1', 'r_mm', 'r_m', 'd_A'
+        :param azi_range: azimuthal range for the integration
+        :param background: image (or value) subtracted from every frame
+        :param corrections: image every frame is divided by
+        :param factor: factor every frame is multiplied with
+        :param radial_range: radial range in the binning unit of unit, see integrate_1d
+        :param region: sub-array of the images, which is integrated alone, see integrate_1d. Frames, background and
+                       corrections can be given already cropped to it (e.g. read with a hyperslab from a file)
+        :param method: integration method, None uses the method tuned for the detector, image shape and number of
+                       points (see tune_integration_method). Supersampled images and regions are always integrated
+                       with the csr method
+        :return: x (num_points), intensities (n_frames x num_points)
+        """
+        frames = np.asarray(frames)
+        shapes = [tuple(self._img_shape)]
+        if region is not None:
+            shapes.append((region[1] - region[0], region[3] - region[2]))
+        if frames.ndim != 3 or frames.shape[1:] not in shapes:
+            raise ValueError(
+                "frames need to have the shape (n_frames, {}, {})".format(*shapes[-1])
+            )
+
+        if self.pattern_geometry_img_shape != self._img_shape:
+            self.pattern_geometry.reset()
+            self.pattern_geometry_img_shape = self._img_shape
+
+        if polarization_factor is None:
+            polarization_factor = self.polarization_factor
+
+        self._check_detector_and_image_shape()
+        mask, mask_checksum, _ = self._get_integration_mask(mask)
+        shape = self._get_supersampled_shape()
+        integration_unit = get_binning_unit(unit)
+
+        if num_points is None:
+            num_points = self._get_default_num_points(
+                shape, integration_unit, radial_range
+            )
+        self.num_points = num_points
+        if self.supersampling_factor > 1 or region is not None:
+            method = "csr"
+        elif method is None:
+            method = self.get_integration_method(num_points)
+        self.stack_integration_method = method
 
         t1 = time.time()
 
-        res = self.cake_geometry.integrate2d(
-            img_data,
-            rad_points,
-            azimuth_points,
-            azimuth_range=azimuth_range,
+        engine_key = self.engine_cache.create_key(
+            self.pattern_geometry,
+            shape,
+            mask_checksum,
+            integration_unit,
+            num_points,
+            azimuth_range=azi_range,
+            radial_range=radial_range,
             method=method,
-            mask=mask,
-            unit=unit,
-            polarization_factor=polarization_factor,
-            correctSolidAngle=self.correct_solid_angle,
         )
+        self._pattern_engine_key = self.engine_cache.activate(
+            self.pattern_geometry, engine_key, self._pattern_engine_key
+        )
+
+        if method != "csr":
+            x, intensities = self._integrate_frames_1d(
+                frames,
+                num_points,
+                mask,
+                polarization_factor,
+                integration_unit,
+                azi_range,
+                background,
+                corrections,
+                factor,
+                radial_range,
+                method,
+            )
+            self.engine_cache.store(self.pattern_geometry, engine_key)
+            return self._finish_stack(x, intensities, unit, t1)
+
+        def integrate(img_data, integration_mask):
+            return self.pattern_geometry.integrate1d(
+                img_data,
+                num_points,
+                method="csr",
+                unit=integration_unit,
+                azimuth_range=azi_range,
+                radial_range=radial_range,
+                mask=integration_mask,
+                polarization_factor=polarization_factor,
+                correctSolidAngle=self.correct_solid_angle,
+            )
+
+        sparse_integrator, result = self._get_sparse_integrator(
+            self.pattern_geometry,
+            engine_key,
+            mask,
+            polarization_factor,
+            integrate,
+            region,
+        )
+        self.engine_cache.store(self.pattern_geometry, engine_key)
+        x = np.copy(result[0])
+        frames, background, corrections = self._crop_stack(
+            frames, background, corrections, region
+        )
+        intensities = sparse_integrator.integrate_stack(
+            frames, background, corrections, factor
+        )
+        return self._finish_stack(x, intensities, unit, t1)
+
+    def _finish_stack(self, x, intensities, unit, t1):
         logger.info(
-            "2d integration of {0}: {1}s.".format(
-                os.path.basename(self.img_model.filename), time.time() - t1
+            "1d integration of {0} frames with {1}: {2}s.".format(
+                len(intensities), self.stack_integration_method, time.time() - t1
             )
         )
-        self.cake_img = res[0]
-        self.cake_tth = res[1]
-        self.cake_azi = res[2]
-        return self.cake_img
+        if unit == "d_A":
+            x = self.pattern_geometry.wavelength / (2 * np.sin(x / 360 * np.pi)) * 1e10
+        return x, intensities
+
+    def _integrate_frames_1d(
+        self,
+        frames,
+        num_points,
+        mask,
+        polarization_factor,
+        integration_unit,
+        azi_range,
+        background,
+        corrections,
+        factor,
+        radial_range,
+        method,
+    ):
+        """
+        Integrates the frames of a stack one by one with the method, see integrate_1d_stack.
+        :return: x (num_points), intensities (n_frames x num_points)
+        """
+        x = None
+        intensities = []
+        for frame in frames:
+            img_data = np.asarray(frame, dtype=np.float32)
+            if background is not None:
+                img_data = img_data - background
+            if corrections is not None:
+                img_data = img_data / corrections
+            img_data = img_data * factor
+            x, intensity = self.pattern_geometry.integrate1d(
+                img_data,
+                num_points,
+                method=method,
+                unit=integration_unit,
+                azimuth_range=azi_range,
+                radial_range=radial_range,
+                mask=mask,
+                polarization_factor=polarization_factor,
+                correctSolidAngle=self.correct_solid_angle,
+            )
+            intensities.append(intensity)
+        return np.copy(x), np.array(intensities, dtype=np.float32).reshape(
+            len(frames), -1
+        )
+
+    def _crop_stack(self, frames, background, corrections, region):
+        """
+        Crops frames, background and corrections of a stack integration to the region, if they are not cropped yet.
+        """
+        if region is None:
+            return frames, background, corrections
+        frames = self._crop_img_data(frames, region)
+        if background is not None and np.ndim(background) == 2:
+            background = self._crop_img_data(background, region)
+        if corrections is not None:
+            corrections = self._crop_img_data(corrections, region)
+        return frames, background, corrections
 
     def cake_integral(self, tth, bins=1):
         """
@@ -588,7 +1489,8 @@ class CalibrationModel(object):
         :param bins: number of bins for summing
         :return: cake_azimuth_pixel, intensity
         """
-        tth_partial_index = get_partial_index(self.cake_tth, tth)
+        cake_img, cake_tth, cake_azi = self.get_cake()
+        tth_partial_index = get_partial_index(cake_tth, tth)
         if tth_partial_index is None:
             return [], []
 
@@ -596,11 +1498,11 @@ class CalibrationModel(object):
         left = tth_center - 0.5 * bins
         right = tth_center + 0.5 * bins
 
-        y1 = abs(np.ceil(left) - left) * self.cake_img[:, int(np.floor(left))]
-        y2 = np.sum(self.cake_img[:, int(np.ceil(left)) : int(np.floor(right))], axis=1)
-        y3 = (right - np.floor(right)) * self.cake_img[:, int(np.floor(right))]
+        y1 = abs(np.ceil(left) - left) * cake_img[:, int(np.floor(left))]
+        y2 = np.sum(cake_img[:, int(np.ceil(left)) : int(np.floor(right))], axis=1)
+        y3 = (right - np.floor(right)) * cake_img[:, int(np.floor(right))]
 
-        x = np.array(range(len(self.cake_azi))) + 0.5
+        x = np.array(range(len(cake_azi))) + 0.5
         y = (y1 + y2 + y3) / bins
         return x, y
 
@@ -632,6 +1534,41 @@ class CalibrationModel(object):
 
         return pyFAI_parameter, fit2d_parameter
 
+    def _get_default_num_points(self, shape, unit, radial_range):
+        """
+        Number of points of an integration without a given number of points. For a radial range only the fraction of
+        the points of the full radial extent of the detector lying within the range is used.
+        :param shape: (supersampled) image shape
+        :param unit: binning unit of the integration
+        :param radial_range: radial range in unit or None
+        """
+        num_points = self.calculate_number_of_pattern_points(shape, 2)
+        if radial_range is None:
+            return num_points
+        min_radial, max_radial = self._get_radial_extent(shape, unit)
+        extent = max_radial - min_radial
+        if extent <= 0:
+            return num_points
+        overlap = min(max_radial, max(radial_range)) - max(
+            min_radial, min(radial_range)
+        )
+        fraction = max(overlap, 0) / extent
+        return max(int(np.ceil(num_points * min(fraction, 1))), 2)
+
+    def _get_radial_extent(self, shape, unit):
+        """
+        :param shape: (supersampled) image shape
+        :param unit: binning unit of the integration
+        :return: minimum and maximum radial value of the pixel centers in unit
+        """
+        key = (geometry_fingerprint(self.pattern_geometry), tuple(shape), unit)
+        radial_extent = self._radial_extents.get(key)
+        if radial_extent is None:
+            radial = self.pattern_geometry.array_from_unit(shape, "center", unit)
+            radial_extent = (float(np.min(radial)), float(np.max(radial)))
+            self._radial_extents.put(key, radial_extent)
+        return radial_extent
+
     def calculate_number_of_pattern_points(self, img_shape, max_dist_factor=1.5):
         # calculates the number of points for an integrated pattern, based on the distance of the beam center to the the
         # image corners. Maximum value is determined by the shape of the image.
@@ -652,6 +1589,7 @@ class CalibrationModel(object):
         max_dist = np.sqrt(side1**2 + side2**2)
         return int(max_dist * max_dist_factor)
 
+    @_with_integration_lock
     def load(self, poni_filename):
         """
         Loads a calibration file andsets all the calibration parameter.
@@ -705,6 +1643,7 @@ class CalibrationModel(object):
         self.calibration_name = get_base_name(filename)
         self.filename = filename
 
+    @_with_integration_lock
     def load_detector(self, name):
         self.detector_mode = DetectorModes.PREDEFINED
         names, classes = get_available_detectors()
@@ -712,6 +1651,7 @@ class CalibrationModel(object):
 
         self._load_detector(classes[detector_ind]())
 
+    @_with_integration_lock
     def load_detector_from_file(self, filename):
         self.detector_mode = DetectorModes.NEXUS
         self._load_detector(NexusDetector(filename))
@@ -722,6 +1662,7 @@ class CalibrationModel(object):
         """
         self.detector = detector
         self.detector.calc_mask()
+        self._detector_mask_fingerprint = None
         self.orig_pixel1 = self.detector.pixel1
         self.orig_pixel2 = self.detector.pixel2
 
@@ -733,11 +1674,13 @@ class CalibrationModel(object):
         self.set_supersampling()
         self._original_detector = None
 
+    @_with_integration_lock
     def reset_detector(self):
         self.detector_mode = DetectorModes.CUSTOM
         self.detector = Detector(
             pixel1=self.detector.pixel1, pixel2=self.detector.pixel2
         )
+        self._detector_mask_fingerprint = None
         self.update_detector_shape()
         self.pattern_geometry.detector = self.detector
         if self.cake_geometry:
@@ -756,6 +1699,7 @@ class CalibrationModel(object):
 
             return DefaultAiWriter(None, self.pattern_geometry).make_headers()
 
+    @_with_integration_lock
     def set_fit2d(self, fit2d_parameter):
         """
         Reads in a dictionary with fit2d parameters where the fields of the dictionary are:
@@ -783,6 +1727,7 @@ class CalibrationModel(object):
         self.is_calibrated = True
         self.set_supersampling()
 
+    @_with_integration_lock
     def set_pyFAI(self, pyFAI_parameter):
         """
         Reads in a dictionary with pyFAI parameters where the fields of dictionary are:
@@ -809,12 +1754,14 @@ class CalibrationModel(object):
         self.is_calibrated = True
         self.set_supersampling()
 
+    @_with_integration_lock
     def load_distortion(self, spline_filename):
         self.distortion_spline_filename = spline_filename
         self.pattern_geometry.set_splineFile(spline_filename)
         if self.cake_geometry:
             self.cake_geometry.set_splineFile(spline_filename)
 
+    @_with_integration_lock
     def reset_distortion_correction(self):
         self.distortion_spline_filename = None
         self.detector.set_splineFile(None)
@@ -822,6 +1769,7 @@ class CalibrationModel(object):
         if self.cake_geometry:
             self.cake_geometry.set_splineFile(None)
 
+    @_with_integration_lock
     def set_supersampling(self, factor=None):
         """
         Sets the supersampling to a specific factor. Whereby the factor determines in how many artificial pixel the
@@ -845,6 +1793,7 @@ class CalibrationModel(object):
             self.pattern_geometry.reset()
             self.supersampling_factor = factor
 
+    @_with_integration_lock
     def reset_supersampling(self):
         self.pattern_geometry.pixel1 = self.orig_pixel1
         self.pattern_geometry.pixel2 = self.orig_pixel2
@@ -893,7 +1842,7 @@ class CalibrationModel(object):
         return self.pattern_geometry.chi(x - 0.5, y - 0.5)[0]
 
     def get_two_theta_array(self):
-        return self.pattern_geometry.twoThetaArray(self.img_model.img_data.shape)[
+        return self.pattern_geometry.twoThetaArray(self.img_model.img_shape)[
             :: self.supersampling_factor, :: self.supersampling_factor
         ]
 
@@ -921,11 +1870,13 @@ class CalibrationModel(object):
 
     ##########################
     ## Detector rotation stuff
+    @_with_integration_lock
     def swap_detector_shape(self):
         self._swap_detector_shape()
         self._swap_pixel_size()
         self._swap_detector_module_size()
 
+    @_with_integration_lock
     def rotate_detector_m90(self):
         """
         Rotates the detector stuff by m90 degree. This includes swapping of shape, pixel size and module sizes, as well
@@ -937,6 +1888,7 @@ class CalibrationModel(object):
         self._reset_detector_mask()
         self._transform_pixel_corners(rotate_matrix_m90)
 
+    @_with_integration_lock
     def rotate_detector_p90(self):
         """ """
         self._save_original_detector_definition()
@@ -945,20 +1897,24 @@ class CalibrationModel(object):
         self._reset_detector_mask()
         self._transform_pixel_corners(rotate_matrix_p90)
 
+    @_with_integration_lock
     def flip_detector_horizontally(self):
         self._save_original_detector_definition()
         self._transform_pixel_corners(np.fliplr)
 
+    @_with_integration_lock
     def flip_detector_vertically(self):
         self._save_original_detector_definition()
         self._transform_pixel_corners(np.flipud)
 
+    @_with_integration_lock
     def reset_transformations(self):
         """Restores the detector to it's original state"""
         if self._original_detector is None:  # no transformations done so far
             return
 
         self.detector = deepcopy(self._original_detector)
+        self._detector_mask_fingerprint = None
         self.orig_pixel1, self.orig_pixel2 = self.detector.pixel1, self.detector.pixel2
         self.pattern_geometry.detector = self.detector
         if self.cake_geometry is not None:
@@ -966,6 +1922,7 @@ class CalibrationModel(object):
         self.set_supersampling()
         self._original_detector = None
 
+    @_with_integration_lock
     def load_transformations_string_list(self, transformations):
         """Transforms the detector parameters (shape, pixel size and distortion correction) based on a
         list of transformation actions.
@@ -1033,6 +1990,33 @@ class CalibrationModel(object):
     def _reset_detector_mask(self):
         """resets and recalculates the mask. Transformations to shape and module size have to be performed before."""
         self.detector._mask = False
+        self._detector_mask_fingerprint = None
+
+
+def get_csr_engine(geometry, dimension=1):
+    """
+    :param geometry: pyFAI AzimuthalIntegrator
+    :param dimension: 1 or 2
+    :return: the CSR integration engine of the geometry for the given dimension
+    """
+    for method, wrapper in geometry.engines.items():
+        if (
+            method.dimension == dimension
+            and method.algo_lower == "csr"
+            and wrapper.engine is not None
+        ):
+            return wrapper.engine
+    raise RuntimeError("No CSR integration engine available.")
+
+
+def writable_for_pyfai(img_data):
+    """
+    The cython integrators of pyFAI do not accept read-only float32 arrays (other dtypes are converted by pyFAI
+    anyway). The cached image data of the ImgModel is read-only, so it is copied in this case.
+    """
+    if img_data.dtype == np.float32 and not img_data.flags.writeable:
+        return np.array(img_data)
+    return img_data
 
 
 def poni_flipud(poni_dict: dict) -> dict:
@@ -19,6 +19,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import functools
 import numpy as np
 
 from copy import deepcopy
@@ -29,7 +30,14 @@ from xypattern.auto_background import SmoothBrucknerBackground
 from .util import Signal
 from .util.ImgCorrection import CbnCorrection, ObliqueAngleDetectorAbsorptionCorrection
 
-from .util.calc import convert_units
+from .util.calc import (
+    convert_units,
+    get_binning_unit,
+    create_sector_edges,
+    get_sector_bins,
+    trim_trailing_zero_columns,
+)
+from .util.IntegrationEngineCache import geometry_fingerprint
 from . import ImgModel, CalibrationModel, MaskModel, PatternModel, BatchModel
 from .MapModel2 import MapModel2
 from .CalibrationModel import DetectorModes
@@ -73,17 +81,30 @@ class Configuration(object):
         self._integration_rad_points = None
         self._integration_unit = "2th_deg"
         self._oned_azimuth_range = None
+        # radial range of all integrations in 2θ (degrees), None integrates the full radial extent of the detector
+        self._integration_radial_range = None
         self.trim_trailing_zeros = True
+        # last integrated pattern as (stamp, binning unit, x in the binning unit, y), see get_integrated_pattern
+        self._integrated_pattern = None
+        # stamps of the results of the last combined integration, which were not used yet, see _integrate_combined
+        self._unused_combined_results = {}
 
         self._cake_azimuth_points = 360
         self._cake_azimuth_range = None
 
+        # azimuthal sector edges (n_sectors + 1) for integrate_image_sectors, None disables the sector integration
+        self._integration_sector_edges = None
+
         self._auto_integrate_pattern = True
         self._auto_integrate_cake = False
 
         self.auto_save_integrated_pattern = False
         self.integrated_patterns_file_formats = [".xy"]
 
+        # IntegrationWorker integrating changed images in the background, None integrates them immediately
+        self.integration_worker = None
+        self._asynchronous_integration_pending = False
+
         self.cake_changed = Signal()
         self._connect_signals()
 
@@ -92,85 +113,505 @@ class Configuration(object):
         Connects the img_changed signal to responding functions.
         """
         self.img_model.img_changed.connect(self.update_mask_dimension)
-        self.img_model.img_changed.connect(self.integrate_image_1d)
+        self.img_model.img_changed.connect(self._integrate_changed_image)
+
+    @property
+    def _integration_lock(self):
+        """
+        Lock of the calibration model, held while integrating and while its geometry or supersampling is changed.
+        """
+        return self.calibration_model.integration_lock
+
+    def _integrate_changed_image(self):
+        """
+        Integrates the changed image to a pattern and/or a cake, depending on auto_integrate_pattern and
+        auto_integrate_cake. With an integration_worker the integration runs in the background and the results are
+        set when it is finished.
+        """
+        if self.integration_worker is not None:
+            self._submit_integration()
+            return
+        if self.auto_integrate_pattern:
+            self.integrate_image_1d()
+        if self.auto_integrate_cake:
+            self.integrate_image_2d()
+
+    def _submit_integration(self):
+        """
+        Submits the integration of the current image with the current settings to the integration_worker. Image, mask
+        and settings are taken now, so the job does not depend on changes made while it is waiting or running.
+        """
+        integrate_pattern = (
+            self.auto_integrate_pattern and self.calibration_model.is_calibrated
+        )
+        integrate_cake = self.auto_integrate_cake
+        if not (integrate_pattern or integrate_cake):
+            self._asynchronous_integration_pending = False
+            self.integration_worker.cancel(id(self))
+            return
+
+        calibration_model = self.calibration_model
+        img_shape = self.img_model.img_shape
+        filename = self.img_model.filename
+        region = self.integration_region
+        if region is None:
+            img_data = self.img_model.img_data
+        else:
+            img_data = self.img_model.get_img_data_region(region)
+        mask = self._get_integration_mask()
+        pattern_stamp = self._create_pattern_stamp()
+        binning_unit = get_binning_unit(self.integration_unit)
+        combined = self._combined_integration_possible()
+        rad_points = self._integration_rad_points
+        oned_azimuth_range = self._oned_azimuth_range
+        pattern_radial_range = self._get_radial_range(binning_unit)
+        cake_radial_range = self._get_radial_range("2th_deg")
+        cake_azimuth_points = self._cake_azimuth_points
+        cake_azimuth_range = self._cake_azimuth_range
+        trim_zeros = self.trim_trailing_zeros
+
+        def integrate(is_cancelled):
+            pattern = None
+            with calibration_model.integrate_snapshot(img_shape, filename):
+                if combined:
+                    pattern = calibration_model.integrate_1d_and_2d(
+                        mask=mask,
+                        num_points=rad_points,
+                        azimuth_points=cake_azimuth_points,
+                        trim_zeros=trim_zeros,
+                        img_data=img_data,
+                        radial_range=cake_radial_range,
+                        region=region,
+                    )
+                elif integrate_pattern:
+                    pattern = calibration_model.integrate_1d(
+                        azi_range=oned_azimuth_range,
+                        mask=mask,
+                        unit=binning_unit,
+                        num_points=rad_points,
+                        trim_zeros=trim_zeros,
+                        img_data=img_data,
+                        radial_range=pattern_radial_range,
+                        region=region,
+                    )
+            if integrate_cake and not combined and not is_cancelled():
+                with calibration_model.integrate_snapshot(img_shape, filename):
+                    calibration_model.integrate_2d(
+                        mask=mask,
+                        rad_points=rad_points,
+                        azimuth_points=cake_azimuth_points,
+                        azimuth_range=cake_azimuth_range,
+                        img_data=img_data,
+                        radial_range=cake_radial_range,
+                        region=region,
+                    )
+            return functools.partial(
+                self._set_integration_result,
+                pattern_stamp,
+                binning_unit,
+                pattern,
+                integrate_cake,
+            )
+
+        self._asynchronous_integration_pending = True
+        self.integration_worker.submit(id(self), integrate)
+
+    def _set_integration_result(self, stamp, binning_unit, pattern, cake_integrated):
+        """
+        Sets the results of an integration done by the integration_worker, called in the GUI thread.
+        """
+        self._asynchronous_integration_pending = False
+        if pattern is not None:
+            self._integrated_pattern = (stamp, binning_unit, pattern[0], pattern[1])
+            self._unused_combined_results = {}
+            if stamp != self._create_pattern_stamp() or binning_unit != get_binning_unit(self.integration_unit):
+                # something changed since the integration was submitted, the GUI thread should not integrate again
+                self._submit_integration()
+                return
+            self._set_integrated_pattern(*self.get_integrated_pattern())
+        if cake_integrated:
+            self.cake_changed.emit()
+
+    def _supersede_asynchronous_integration(self):
+        """
+        A pending integration of the integration_worker was submitted with the previous settings. It is submitted
+        again, so that its result does not overwrite the one of a synchronous integration with the current settings.
+        """
+        if self._asynchronous_integration_pending and self.integration_worker is not None:
+            self._submit_integration()
 
     def integrate_image_1d(self):
         """
         Integrates the image in the ImageModel to a Pattern. Will also automatically save the integrated pattern, if
         auto_save_integrated is True.
         """
+        self._supersede_asynchronous_integration()
         if self.calibration_model.is_calibrated:
-            if self.use_mask:
-                mask = self.mask_model.get_mask()
-            elif self.mask_model.roi is not None:
-                mask = self.mask_model.roi_mask
+            if self._combined_integration_possible():
+                self._integrate_combined("pattern")
+                x, y = self.get_integrated_pattern()
             else:
-                mask = None
+                x, y = self._integrate_pattern(self.integration_unit)
+            self._set_integrated_pattern(x, y)
+            return x, y
 
+    def get_integrated_pattern(self, unit=None):
+        """
+        Returns the integrated pattern of the current image in the given unit. If the last integration has the same
+        binning (2θ and d, see get_binning_unit) and nothing else changed since then, its result is only converted
+        into the unit, otherwise the image is integrated again. The pattern model is not changed.
+        :param unit: '2th_deg', 'q_A^-1' or 'd_A', defaults to the integration unit
+        :return: x, y or None if the configuration is not calibrated
+        """
+        if not self.calibration_model.is_calibrated:
+            return None
+        if unit is None:
+            unit = self.integration_unit
+
+        binning_unit = get_binning_unit(unit)
+        if self._integrated_pattern is not None:
+            stamp, last_binning_unit, x, y = self._integrated_pattern
+            if last_binning_unit == binning_unit and stamp == self._create_pattern_stamp():
+                return self._convert_integrated_x(x, binning_unit, unit), y
+        return self._integrate_pattern(unit)
+
+    def _integrate_pattern(self, unit):
+        """
+        Integrates the image in the binning unit of unit and keeps the result for get_integrated_pattern.
+        """
+        binning_unit = get_binning_unit(unit)
+        region = self.integration_region
+        with self._integration_lock:
             x, y = self.calibration_model.integrate_1d(
                 azi_range=self.oned_azimuth_range,
-                mask=mask,
-                unit=self.integration_unit,
+                mask=self._get_integration_mask(),
+                unit=binning_unit,
                 num_points=self.integration_rad_points,
                 trim_zeros=self.trim_trailing_zeros,
+                img_data=self._get_integration_img_data(region),
+                radial_range=self._get_radial_range(binning_unit),
+                region=region,
             )
+        self._integrated_pattern = (self._create_pattern_stamp(), binning_unit, x, y)
+        return self._convert_integrated_x(x, binning_unit, unit), y
 
-            self.pattern_model.set_pattern(
-                x, y, self.img_model.filename, unit=self.integration_unit
-            )  #
+    def _get_radial_range(self, unit):
+        """
+        :param unit: binning unit of an integration
+        :return: integration_radial_range in the unit as (min, max) or None
+        """
+        if self._integration_radial_range is None:
+            return None
+        radial_range = convert_units(
+            np.array(self._integration_radial_range),
+            self.calibration_model.wavelength,
+            "2th_deg",
+            unit,
+        )
+        return float(np.min(radial_range)), float(np.max(radial_range))
 
-            if self.auto_save_integrated_pattern:
-                self._auto_save_patterns()
+    def _convert_integrated_x(self, x, binning_unit, unit):
+        if unit == binning_unit:
+            return x
+        return convert_units(x, self.calibration_model.wavelength, binning_unit, unit)
 
-            return x, y
+    def _create_pattern_stamp(self):
+        """
+        :return: tuple describing everything an integrated pattern depends on besides its unit
+        """
+        calibration_model = self.calibration_model
+        azimuth_range = self.oned_azimuth_range
+        return (
+            self.img_model.filename,
+            self.img_model.img_data_version,
+            self.use_mask,
+            self.mask_model.mask_version,
+            self.integration_rad_points,
+            None if azimuth_range is None else tuple(azimuth_range),
+            self._integration_radial_range,
+            self.trim_trailing_zeros,
+            calibration_model.polarization_factor,
+            calibration_model.correct_solid_angle,
+            calibration_model.supersampling_factor,
+            geometry_fingerprint(calibration_model.pattern_geometry),
+            calibration_model.get_detector_mask_fingerprint(),
+        )
 
-    def integrate_image_2d(self):
+    def _combined_integration_possible(self):
         """
-        Integrates the image in the ImageModel to a Cake.
+        Pattern and cake can be integrated in a single pass, if both are integrated automatically and the pattern has
+        the radial bins of the cake (binned in 2θ over the full azimuthal range).
         """
+        return (
+            self.auto_integrate_pattern
+            and self.auto_integrate_cake
+            and self.calibration_model.is_calibrated
+            and get_binning_unit(self.integration_unit) == "2th_deg"
+            and self.oned_azimuth_range is None
+            and self.cake_azimuth_range is None
+        )
+
+    def _integrate_combined(self, result_name):
+        """
+        Integrates pattern and cake in a single pass (see CalibrationModel.integrate_1d_and_2d). When the last combined
+        integration was done with the same settings and its result for result_name was not used yet, nothing is
+        integrated, so the image is only integrated once when integrate_image_1d and integrate_image_2d are both called.
+        :param result_name: 'pattern' or 'cake', the result the caller is going to use
+        """
+        stamp = (self._create_pattern_stamp(), self._cake_azimuth_points)
+        if self._unused_combined_results.pop(result_name, None) == stamp:
+            return
+
+        region = self.integration_region
+        with self._integration_lock:
+            x, y = self.calibration_model.integrate_1d_and_2d(
+                mask=self._get_integration_mask(),
+                num_points=self._integration_rad_points,
+                azimuth_points=self._cake_azimuth_points,
+                trim_zeros=self.trim_trailing_zeros,
+                img_data=self._get_integration_img_data(region),
+                radial_range=self._get_radial_range("2th_deg"),
+                region=region,
+            )
+        self._integrated_pattern = (stamp[0], "2th_deg", x, y)
+        self._unused_combined_results = {"pattern": stamp, "cake": stamp}
+        del self._unused_combined_results[result_name]
+
+    def _set_integrated_pattern(self, x, y):
+        self.pattern_model.set_pattern(
+            x, y, self.img_model.filename, unit=self.integration_unit
+        )
+
+        if self.auto_save_integrated_pattern:
+            self._auto_save_patterns()
+
+    def _get_integration_mask(self):
         if self.use_mask:
-            mask = self.mask_model.get_mask()
+            return self.mask_model.get_mask()
         elif self.mask_model.roi is not None:
-            mask = self.mask_model.roi_mask
-        else:
-            mask = None
+            return self.mask_model.roi_mask
+        return None
 
-        self.calibration_model.integrate_2d(
-            mask=mask,
-            rad_points=self._integration_rad_points,
-            azimuth_points=self._cake_azimuth_points,
-            azimuth_range=self._cake_azimuth_range,
+    @property
+    def integration_region(self):
+        """
+        Sub-array of the image within the roi of the mask_model, everything outside of it is masked. Only this region
+        is composed and integrated, which is much faster for small rois of large images.
+        :return: (row_start, row_stop, column_start, column_stop) or None if no roi is set
+        """
+        roi = self.mask_model.roi
+        if roi is None:
+            return None
+        rows, columns = self.img_model.img_shape
+        x1, x2, y1, y2 = roi
+        region = (
+            min(max(int(x1), 0), rows),
+            min(max(int(x2), 0), rows),
+            min(max(int(y1), 0), columns),
+            min(max(int(y2), 0), columns),
         )
+        if region[0] >= region[1] or region[2] >= region[3]:
+            return None
+        return region
+
+    def _get_integration_img_data(self, region):
+        """
+        :param region: integration_region
+        :return: the region of the image (only the region is composed) or None to integrate the full current image
+        """
+        if region is None:
+            return None
+        return self.img_model.get_img_data_region(region)
+
+    def integrate_image_stack_1d(self, frames, unit=None):
+        """
+        Integrates a stack of frames with the current integration settings, mask, background, image corrections and
+        factor of the configuration. In contrast to integrate_image_1d the models are not changed and no signals are
+        emitted. If trim_trailing_zeros is set, the trailing points, which are zero in all patterns, are trimmed.
+        :param frames: 3d array (n_frames, rows, columns) in the orientation of the img_model.img_data (e.g. read with
+                       img_model.get_series_images), the frames can be cropped to the integration_region
+        :param unit: '2th_deg', 'q_A^-1' or 'd_A', defaults to the integration unit
+        :return: x (n_points), intensities (n_frames x n_points) or None if the configuration is not calibrated
+        """
+        if not self.calibration_model.is_calibrated:
+            return None
+        if unit is None:
+            unit = self.integration_unit
+
+        region = self.integration_region
+        with self._integration_lock:
+            x, intensities = self.calibration_model.integrate_1d_stack(
+                frames,
+                num_points=self.integration_rad_points,
+                mask=self._get_integration_mask(),
+                unit=unit,
+                azi_range=self.oned_azimuth_range,
+                background=self.img_model.get_background_for_integration(region),
+                corrections=self.img_model.img_corrections.get_data(region),
+                factor=self.img_model.factor,
+                radial_range=self._get_radial_range(get_binning_unit(unit)),
+                region=region,
+            )
+        if self.trim_trailing_zeros:
+            x, intensities = trim_trailing_zero_columns(x, intensities)
+        return x, intensities
+
+    def integrate_image_stack_sectors(self, frames, unit=None):
+        """
+        Integrates a stack of frames into a pattern for each azimuthal sector of integration_sector_edges, like
+        integrate_image_stack_1d.
+        :param frames: 3d array (n_frames, rows, columns), see integrate_image_stack_1d
+        :param unit: '2th_deg', 'q_A^-1' or 'd_A', defaults to the integration unit
+        :return: x (n_points), intensities (n_frames x n_sectors x n_points) or None if the configuration is not
+                 calibrated or no sectors are set
+        """
+        if not self.calibration_model.is_calibrated or self._integration_sector_edges is None:
+            return None
+        if unit is None:
+            unit = self.integration_unit
+
+        region = self.integration_region
+        with self._integration_lock:
+            return self.calibration_model.integrate_sectors_stack(
+                frames,
+                self._integration_sector_edges,
+                num_points=self.integration_rad_points,
+                mask=self._get_integration_mask(),
+                unit=unit,
+                background=self.img_model.get_background_for_integration(region),
+                corrections=self.img_model.img_corrections.get_data(region),
+                factor=self.img_model.factor,
+                radial_range=self._get_radial_range(get_binning_unit(unit)),
+                region=region,
+            )
+
+    def integrate_image_sectors(self, unit=None):
+        """
+        Integrates the image into a pattern for each azimuthal sector of integration_sector_edges with the current
+        integration settings and mask. In contrast to integrate_image_1d the models are not changed.
+        :param unit: '2th_deg', 'q_A^-1' or 'd_A', defaults to the integration unit
+        :return: x (n_points), intensities (n_sectors x n_points) or None if the configuration is not calibrated or
+                 no sectors are set
+        """
+        if not self.calibration_model.is_calibrated or self._integration_sector_edges is None:
+            return None
+        if unit is None:
+            unit = self.integration_unit
+
+        region = self.integration_region
+        with self._integration_lock:
+            return self.calibration_model.integrate_sectors(
+                self._integration_sector_edges,
+                num_points=self.integration_rad_points,
+                mask=self._get_integration_mask(),
+                unit=unit,
+                img_data=self._get_integration_img_data(region),
+                radial_range=self._get_radial_range(get_binning_unit(unit)),
+                region=region,
+            )
+
+    def tune_integration_method(self, **kwargs):
+        """
+        Benchmarks the integration methods of pyFAI with the current image, mask and integration settings and remembers
+        the fastest one for the pattern and for the cake, if it is integrated automatically and not together with the
+        pattern (see CalibrationModel.tune_integration_method). All later integrations with the same detector, image shape and
+        number of points use them, also the pattern integrations of batches (azimuthal sectors are always integrated
+        with csr).
+        :param kwargs: further arguments of CalibrationModel.tune_integration_method (candidates, repeats, tolerance)
+        :return: dictionary with the tuned method and the timings of all candidates for "pattern" and "cake"
+        """
+        binning_unit = get_binning_unit(self.integration_unit)
+        mask = self._get_integration_mask()
+        results = {}
+        with self._integration_lock:
+            results["pattern"] = self.calibration_model.tune_integration_method(
+                self.integration_rad_points,
+                mask,
+                unit=binning_unit,
+                radial_range=self._get_radial_range(binning_unit),
+                **kwargs
+            )
+            if self.auto_integrate_cake and not self._combined_integration_possible():
+                results["cake"] = self.calibration_model.tune_integration_method(
+                    self._integration_rad_points,
+                    mask,
+                    azimuth_points=self._cake_azimuth_points,
+                    radial_range=self._get_radial_range("2th_deg"),
+                    **kwargs
+                )
+        return results
+
+    def integrate_image_2d(self):
+        """
+        Integrates the image in the ImageModel to a Cake.
+        """
+        self._supersede_asynchronous_integration()
+        if self._combined_integration_possible():
+            self._integrate_combined("cake")
+        else:
+            region = self.integration_region
+            with self._integration_lock:
+                self.calibration_model.integrate_2d(
+                    mask=self._get_integration_mask(),
+                    rad_points=self._integration_rad_points,
+                    azimuth_points=self._cake_azimuth_points,
+                    azimuth_range=self._cake_azimuth_range,
+                    img_data=self._get_integration_img_data(region),
+                    radial_range=self._get_radial_range("2th_deg"),
+                    region=region,
+                )
 
         self.cake_changed.emit()
 
-    def save_pattern(self, filename=None, subtract_background=False):
+    def save_pattern(self, filename=None, subtract_background=False, unit=None):
         """
         Saves the current integrated pattern. The format depends on the file ending. Possible file formats:
             [*.xy, *.chi, *.dat, *.fxye]
         :param filename: where to save the file
         :param subtract_background: flat whether the pattern should be saved with or without subtracted background
+        :param unit: unit of the saved pattern, defaults to the integration unit. Units with the same binning as the
+                     integration unit (2θ and d) are converted, for other units the image is integrated again.
         """
         if filename is None:
             filename = self.img_model.filename
+        if unit is None:
+            unit = self.integration_unit
 
         if filename.endswith(".xy"):
-            self.pattern_model.save_pattern(
-                filename,
-                header=self._create_xy_header(),
-                subtract_background=subtract_background,
-            )
+            header = self._create_xy_header(unit)
         elif filename.endswith(".fxye"):
+            header = self._create_fxye_header(filename, unit)
+        else:
+            header = ""
+
+        if unit == self.integration_unit:
             self.pattern_model.save_pattern(
-                filename,
-                header=self._create_fxye_header(filename),
-                subtract_background=subtract_background,
+                filename, header=header, subtract_background=subtract_background
             )
         else:
-            self.pattern_model.save_pattern(
-                filename, subtract_background=subtract_background
+            self._get_pattern_in_unit(unit).save(
+                filename, header, subtract_background, unit
             )
 
+    def _get_pattern_in_unit(self, unit):
+        """
+        :return: copy of the current pattern (including its background settings) in the given unit
+        """
+        integration_unit = self.integration_unit
+        wavelength = self.calibration_model.wavelength
+        pattern = self.pattern_model.pattern.copy()
+        pattern.transform_x(
+            lambda x: convert_units(x, wavelength, integration_unit, unit)
+        )
+
+        if get_binning_unit(unit) != get_binning_unit(integration_unit):
+            integrated_pattern = self.get_integrated_pattern(unit)
+            if integrated_pattern is not None:
+                scaling, offset = pattern.scaling, pattern.offset
+                pattern.data = integrated_pattern
+                pattern.scaling, pattern.offset = scaling, offset
+        return pattern
+
     def save_background_pattern(self, filename=None):
         """
         Saves the current fit background as a pattern. The format depends on the file ending. Possible file formats:
@@ -190,24 +631,29 @@ class Configuration(object):
         else:
             self.pattern_model.save_pattern(filename)
 
-    def _create_xy_header(self) -> str:
+    def _create_xy_header(self, unit=None) -> str:
         """
         Creates the header for the xy file format (contains information about calibration parameters).
+        :param unit: unit of the x values, defaults to the integration unit
         :return: header string
         """
+        if unit is None:
+            unit = self._integration_unit
         header = self.calibration_model.create_file_header()
         header = header.replace("\r\n", "\n")
-        header = header + "\n#\n# " + self._integration_unit + "\t I"
+        header = header + "\n#\n# " + unit + "\t I"
         return header
 
-    def _create_fxye_header(self, filename) -> str:
+    def _create_fxye_header(self, filename, unit=None) -> str:
         """
         Creates the header for the fxye file format (used by GSAS and GSAS-II) containing the calibration information
+        :param unit: unit of the x values, defaults to the integration unit
         :return: header string
         """
+        if unit is None:
+            unit = self._integration_unit
         header = "Generated file " + filename + " using DIOPTAS\n"
         header = header + self.calibration_model.create_file_header()
-        unit = self._integration_unit
         lam = self.calibration_model.wavelength
         if unit == "q_A^-1":
             con = "CONQ"
@@ -258,7 +704,7 @@ class Configuration(object):
         """
         Updates the shape of the mask in the MaskModel to the shape of the image in the ImageModel.
         """
-        self.mask_model.set_dimension(self.img_model._img_data.shape)
+        self.mask_model.set_dimension(self.img_model.img_shape)
 
     @property
     def integration_rad_points(self) -> int:
@@ -291,6 +737,55 @@ class Configuration(object):
         if self.auto_integrate_cake:
             self.integrate_image_2d()
 
+    @property
+    def integration_radial_range(self):
+        """
+        Radial range of all integrations in the integration unit as (min, max), or None for the full radial extent of
+        the detector. Only pixels within the range are part of the integration matrices.
+        """
+        if self._integration_radial_range is None:
+            return None
+        return self._get_radial_range(self.integration_unit)
+
+    @integration_radial_range.setter
+    def integration_radial_range(self, new_value):
+        if new_value is None:
+            self._integration_radial_range = None
+        else:
+            tth_range = convert_units(
+                np.array(new_value, dtype=np.float64),
+                self.calibration_model.wavelength,
+                self.integration_unit,
+                "2th_deg",
+            )
+            self._integration_radial_range = (float(np.min(tth_range)), float(np.max(tth_range)))
+        if self.auto_integrate_pattern:
+            self.integrate_image_1d()
+        if self.auto_integrate_cake:
+            self.integrate_image_2d()
+
+    @property
+    def integration_sector_edges(self):
+        return self._integration_sector_edges
+
+    @integration_sector_edges.setter
+    def integration_sector_edges(self, new_value):
+        if new_value is not None:
+            new_value = np.asarray(new_value, dtype=np.float64)
+            get_sector_bins(new_value)  # raises a ValueError for invalid edges
+        self._integration_sector_edges = new_value
+
+    def set_integration_sectors(self, num_sectors, azimuth_range=(-180, 180)):
+        """
+        Divides the azimuthal range into equally wide sectors for integrate_image_sectors.
+        :param num_sectors: number of sectors, None or 0 disables the sector integration
+        :param azimuth_range: azimuthal range in degrees
+        """
+        if not num_sectors:
+            self.integration_sector_edges = None
+        else:
+            self.integration_sector_edges = create_sector_edges(num_sectors, azimuth_range)
+
     @property
     def oned_azimuth_range(self):
         return self._oned_azimuth_range
@@ -316,7 +811,10 @@ class Configuration(object):
             )
         )
 
-        self.integrate_image_1d()
+        # 2θ and d share the binning, the last integrated pattern then only needs to be converted
+        pattern = self.get_integrated_pattern(new_unit)
+        if pattern is not None:
+            self._set_integrated_pattern(*pattern)
 
     @property
     def correct_solid_angle(self):
@@ -340,14 +838,7 @@ class Configuration(object):
 
     @auto_integrate_cake.setter
     def auto_integrate_cake(self, new_value):
-        if self._auto_integrate_cake == new_value:
-            return
-
         self._auto_integrate_cake = new_value
-        if new_value:
-            self.img_model.img_changed.connect(self.integrate_image_2d)
-        else:
-            self.img_model.img_changed.disconnect(self.integrate_image_2d)
 
     @property
     def auto_integrate_pattern(self) -> bool:
@@ -355,18 +846,11 @@ class Configuration(object):
 
     @auto_integrate_pattern.setter
     def auto_integrate_pattern(self, new_value):
-        if self._auto_integrate_pattern == new_value:
-            return
-
         self._auto_integrate_pattern = new_value
-        if new_value:
-            self.img_model.img_changed.connect(self.integrate_image_1d)
-        else:
-            self.img_model.img_changed.disconnect(self.integrate_image_1d)
 
     @property
     def cake_img(self) -> np.ndarray:
-        return self.calibration_model.cake_img
+        return self.calibration_model.get_cake()[0]
 
     @property
     def roi(self):
@@ -422,6 +906,21 @@ class Configuration(object):
         else:
             general_information.attrs["cake_azimuth_range"] = self.cake_azimuth_range
 
+        if self._integration_radial_range is None:
+            general_information.attrs["integration_radial_range"] = "None"
+        else:
+            general_information.attrs["integration_radial_range"] = (
+                self._integration_radial_range
+            )
+
+        # sector parameters:
+        if self.integration_sector_edges is None:
+            general_information.attrs["integration_sector_edges"] = "None"
+        else:
+            general_information.attrs["integration_sector_edges"] = (
+                self.integration_sector_edges
+            )
+
         # mask parameters
         general_information.attrs["use_mask"] = self.use_mask
         general_information.attrs["transparent_mask"] = self.transparent_mask
@@ -459,15 +958,14 @@ class Configuration(object):
         image_group = f.create_group("image_model")
         image_group.attrs["auto_process"] = self.img_model.autoprocess
         image_group.attrs["factor"] = self.img_model.factor
+        image_group.attrs["corrected_dtype"] = str(self.img_model.corrected_dtype)
         image_group.attrs["has_background"] = self.img_model.has_background()
         image_group.attrs["background_filename"] = self.img_model.background_filename
         image_group.attrs["background_offset"] = self.img_model.background_offset
         image_group.attrs["background_scaling"] = self.img_model.background_scaling
         if self.img_model.has_background():
             background_data = self.img_model.untransformed_background_data
-            image_group.create_dataset(
-                "background_data", background_data.shape, "f", background_data
-            )
+            image_group.create_dataset("background_data", data=background_data)
 
         image_group.attrs["series_max"] = self.img_model.series_max
         image_group.attrs["series_pos"] = self.img_model.series_pos
@@ -504,10 +1002,7 @@ class Configuration(object):
         image_group.attrs["filename"] = self.img_model.filename
         current_raw_image = self.img_model.untransformed_raw_img_data
 
-        raw_image_data = image_group.create_dataset(
-            "raw_image_data", current_raw_image.shape, dtype="f"
-        )
-        raw_image_data[...] = current_raw_image
+        image_group.create_dataset("raw_image_data", data=current_raw_image)
 
         # image transformations
         transformations_group = image_group.create_group("image_transformations")
@@ -646,7 +1141,8 @@ class Configuration(object):
         for key, value in (
             f.get("calibration_model").get("pyfai_parameters").attrs.items()
         ):
-            pyfai_parameters[key] = value
+            # numpy scalars of the attributes give pyFAI geometries, which integrate slightly different
+            pyfai_parameters[key] = value.item() if isinstance(value, np.generic) else value
 
         try:
             self.calibration_model.set_pyFAI(pyfai_parameters)
@@ -660,9 +1156,10 @@ class Configuration(object):
             pass
 
         try:
-            self.correct_solid_angle = f.get("calibration_model").attrs[
-                "correct_solid_angle"
-            ]
+            # pyFAI treats numpy booleans different from True (as order of the solid angle correction)
+            self.correct_solid_angle = bool(
+                f.get("calibration_model").attrs["correct_solid_angle"]
+            )
         except KeyError:
             pass
 
@@ -702,6 +1199,8 @@ class Configuration(object):
         self.img_model.autoprocess = f.get("image_model").attrs["auto_process"]
         self.img_model.autoprocess_changed.emit()
         self.img_model.factor = f.get("image_model").attrs["factor"]
+        if "corrected_dtype" in f.get("image_model").attrs:
+            self.img_model.corrected_dtype = f.get("image_model").attrs["corrected_dtype"]
 
         try:
             self.img_model.series_max = f.get("image_model").attrs["series_max"]
@@ -795,6 +1294,25 @@ class Configuration(object):
         except KeyError as e:
             pass
 
+        try:
+            radial_range = f.get("general_information").attrs["integration_radial_range"]
+            if isinstance(radial_range, str) and radial_range == "None":
+                self._integration_radial_range = None
+            else:
+                self._integration_radial_range = tuple(float(v) for v in radial_range)
+        except KeyError as e:
+            pass
+
+        # sector parameters:
+        try:
+            sector_edges = f.get("general_information").attrs["integration_sector_edges"]
+            if isinstance(sector_edges, str) and sector_edges == "None":
+                self.integration_sector_edges = None
+            else:
+                self.integration_sector_edges = sector_edges
+        except KeyError as e:
+            pass
+
         # mask parameters
         self.use_mask = f.get("general_information").attrs["use_mask"]
         self.transparent_mask = f.get("general_information").attrs["transparent_mask"]
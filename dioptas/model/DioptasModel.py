@@ -51,9 +51,10 @@ class DioptasModel(object):
 
     def __init__(self):
         super(DioptasModel, self).__init__()
+        self._integration_worker = None
         self.configurations = []
         self.configuration_ind = 0
-        self.configurations.append(Configuration())
+        self.configurations.append(self._create_configuration())
 
         self._overlay_model = OverlayModel()
         self._phase_model = PhaseModel()
@@ -86,7 +87,7 @@ class DioptasModel(object):
         Adds a new configuration to the list of configurations. The new configuration will have the same working
         directories as the currently selected.
         """
-        self.configurations.append(Configuration(self.working_directories))
+        self.configurations.append(self._create_configuration(self.working_directories))
 
         if self.current_configuration.calibration_model.is_calibrated:
             dioptas_config_folder = os.path.join(os.path.expanduser("~"), ".Dioptas")
@@ -106,6 +107,25 @@ class DioptasModel(object):
         self.select_configuration(len(self.configurations) - 1)
         self.configuration_added.emit()
 
+    def _create_configuration(self, working_directories=None):
+        configuration = Configuration(working_directories)
+        configuration.integration_worker = self._integration_worker
+        return configuration
+
+    @property
+    def integration_worker(self):
+        """
+        IntegrationWorker integrating changed images of all configurations in the background, None (default) to
+        integrate them immediately.
+        """
+        return self._integration_worker
+
+    @integration_worker.setter
+    def integration_worker(self, new_worker):
+        self._integration_worker = new_worker
+        for configuration in self.configurations:
+            configuration.integration_worker = new_worker
+
     def remove_configuration(self):
         """
         Removes the currently selected configuration.
@@ -197,7 +217,7 @@ class DioptasModel(object):
         # load_configurations
         self.configurations = []
         for ind, configuration_group in f.get("configurations").items():
-            configuration = Configuration()
+            configuration = self._create_configuration()
             configuration.load_from_hdf5(configuration_group)
             self.configurations.append(configuration)
         self.configuration_ind = f.get("configurations").attrs["selected_configuration"]
@@ -355,7 +375,7 @@ class DioptasModel(object):
     @property
     def cake_data(self) -> np.ndarray:
         if not self.combine_cakes:
-            return self.calibration_model.cake_img
+            return self.calibration_model.get_cake()[0]
         else:
             return self._cake_data
 
@@ -370,12 +390,10 @@ class DioptasModel(object):
         combined_intensity = np.zeros(combined_azi.shape)
 
         for configuration in self.configurations:
+            cake_img, cake_tth, cake_azi = configuration.calibration_model.get_cake()
             cake_interp2d = RegularGridInterpolator(
-                (
-                    configuration.calibration_model.cake_tth,
-                    configuration.calibration_model.cake_azi,
-                ),
-                configuration.calibration_model.cake_img.T,
+                (cake_tth, cake_azi),
+                cake_img.T,
                 method="linear",
                 fill_value=0,
                 bounds_error=False,
@@ -402,8 +420,9 @@ class DioptasModel(object):
         min_tth = []
         max_tth = []
         for ind in range(len(self.configurations)):
-            min_tth.append(np.min(self.configurations[ind].calibration_model.cake_tth))
-            max_tth.append(np.max(self.configurations[ind].calibration_model.cake_tth))
+            cake_tth = self.configurations[ind].calibration_model.get_cake()[1]
+            min_tth.append(np.min(cake_tth))
+            max_tth.append(np.max(cake_tth))
         return np.min(min_tth), np.max(max_tth)
 
     def _get_cake_azi_range(self):
@@ -415,8 +434,9 @@ class DioptasModel(object):
         min_azi = []
         max_azi = []
         for ind in range(len(self.configurations)):
-            min_azi.append(np.min(self.configurations[ind].calibration_model.cake_azi))
-            max_azi.append(np.max(self.configurations[ind].calibration_model.cake_azi))
+            cake_azi = self.configurations[ind].calibration_model.get_cake()[2]
+            min_azi.append(np.min(cake_azi))
+            max_azi.append(np.max(cake_azi))
         return np.min(min_azi), np.max(max_azi)
 
     def _get_combined_cake_tth(self):
@@ -438,14 +458,14 @@ class DioptasModel(object):
     @property
     def cake_tth(self):
         if not self.combine_cakes:
-            return self.calibration_model.cake_tth
+            return self.calibration_model.get_cake()[1]
         else:
             return self._get_combined_cake_tth()
 
     @property
     def cake_azi(self):
         if not self.combine_cakes:
-            return self.calibration_model.cake_azi
+            return self.calibration_model.get_cake()[2]
         else:
             return self._get_combined_cake_azi()
 
@@ -504,7 +524,7 @@ class DioptasModel(object):
         working_directories = self.working_directories
         self.disconnect_models()
         self.delete_configurations()
-        self.configurations = [Configuration()]
+        self.configurations = [self._create_configuration()]
         self.configuration_ind = 0
         self.overlay_model.reset()
         self.phase_model.reset()
@@ -520,11 +540,13 @@ class DioptasModel(object):
         Deletes all configurations currently present in the model.
         """
         for configuration in self.configurations:
-            configuration.calibration_model.pattern_geometry.reset()
-            if configuration.calibration_model.cake_geometry is not None:
-                configuration.calibration_model.cake_geometry.reset()
-            del configuration.calibration_model.cake_geometry
-            del configuration.calibration_model.pattern_geometry
+            calibration_model = configuration.calibration_model
+            with calibration_model.integration_lock:
+                calibration_model.pattern_geometry.reset()
+                if calibration_model.cake_geometry is not None:
+                    calibration_model.cake_geometry.reset()
+                del calibration_model.cake_geometry
+                del calibration_model.pattern_geometry
             del configuration.img_model
             del configuration.mask_model
         del self.configurations
@@ -21,6 +21,7 @@
 import logging
 import os
 import copy
+from functools import partial
 
 import numpy as np
 from PIL import Image
@@ -31,19 +32,33 @@ import fabio
 from .util import Signal
 from dioptas.model.loader.spe import SpeFile
 from .util.NewFileWatcher import NewFileInDirectoryWatcher
+from .util.ImagePrefetcher import ImagePrefetcher
+from .util.cache import LRUCache
 from .util.HelperModule import rotate_matrix_p90, rotate_matrix_m90, FileNameIterator
 from .util.ImgCorrection import (
     ImgCorrectionManager,
     ImgCorrectionInterface,
     TransferFunctionCorrection,
 )
-from dioptas.model.loader.LambdaLoader import LambdaImage
+from dioptas.model.loader.LambdaLoader import LambdaImage, count_lambda_frames
 from dioptas.model.loader.KaraboLoader import KaraboFile
-from dioptas.model.loader.hdf5Loader import Hdf5Image
+from dioptas.model.loader.hdf5Loader import Hdf5Image, count_hdf5_frames
 from dioptas.model.loader.FabioLoader import FabioLoader
+from dioptas.model.loader.LoaderRegistry import (
+    LoaderRegistry,
+    HDF5_MAGIC,
+    HDF5_EXTENSIONS,
+    PIL_MAGIC,
+)
 
 logger = logging.getLogger(__name__)
 
+# possible dtypes of the corrected image data, the raw image data keeps the native dtype of the detector
+CORRECTED_DTYPES = [np.dtype(np.float32), np.dtype(np.float64)]
+# maximum number of images and bytes of the raw images in a block read by get_series_images
+MAX_FRAMES_PER_BLOCK = 16
+MAX_BLOCK_BYTES = 256 * 1024 ** 2
+
 
 class ImgModel(object):
     """
@@ -70,13 +85,15 @@ class ImgModel(object):
         self.series_max = 1
         self.selected_source = None
 
-        self._img_data = None
-        self._img_data_background_subtracted = None
-        self._img_data_absorption_corrected = None
-        self._img_data_background_subtracted_absorption_corrected = None
+        self._corrected_dtype = np.dtype(np.float32)
+        # composed image data (background subtracted, corrected and multiplied by factor), it is lazily recalculated
+        # on the first access of img_data after any of its inputs changed. The version is incremented on every change.
+        self._composed_img_data = None
+        self._img_data_version = 0
 
+        self._raw_img_data = None
         self.background_filename = ""
-        self._background_data = None
+        self._background = None
         self._background_scaling = 1
         self._background_offset = 0
 
@@ -111,6 +128,10 @@ class ImgModel(object):
             {"name": "sources", "default": None, "attribute": "sources"},
             # a function to select a source:
             {"name": "select_source", "default": None, "attribute": "_select_source"},
+            # currently selected source, only used for files with several sources
+            {"name": "selected_source", "default": None, "attribute": "selected_source"},
+            # loader object of the current file, keeps the file open for accessing further frames
+            {"name": "loader", "default": None, "attribute": "loader"},
         ]
 
         # set the loadable attributes to their defaults
@@ -118,6 +139,18 @@ class ImgModel(object):
 
         self._img_corrections = ImgCorrectionManager()
 
+        # the loaders are selected by file extension and magic bytes, further loaders can be added with
+        # dioptas.model.loader.LoaderRegistry.register_loader
+        self.loader_registry = LoaderRegistry()
+        self._register_loaders()
+
+        # read-ahead of the frames in the current series and of the next files in the current navigation direction
+        self.frame_prefetcher = ImagePrefetcher(num_prefetch=3, max_bytes=512 * 1024 ** 2)
+        self.file_prefetcher = ImagePrefetcher(num_prefetch=2, max_bytes=256 * 1024 ** 2, max_items=8)
+        self._file_stamp = None
+        # karabo runs are expensive to open, so the most recently used ones are kept open
+        self._karabo_files = LRUCache(max_items=2)
+
         # setting up autoprocess
         self._autoprocess = False
         # TODO: watching a directory should be open to any file type - an extension should  be added when a 
@@ -159,10 +192,16 @@ class ImgModel(object):
         """
         filename = str(filename)  # since it could also be QString
         logger.info("Loading {0}.".format(filename))
+
+        file_stamp = self._get_file_stamp(filename)
+        if filename != self.filename or file_stamp != self._file_stamp:
+            self.frame_prefetcher.clear()
         self.filename = filename
+        self._file_stamp = file_stamp
 
-        image_file_data = self.get_image_data(filename, pos)
+        image_file_data = self._get_file_data(filename, pos, file_stamp)
         self.set_loadable_attributes(image_file_data)
+        self.frame_prefetcher.reset_direction(pos + 1)
 
         self.file_name_iterator.update_filename(filename)
         self._directory_watcher.path = os.path.dirname(str(filename))
@@ -173,30 +212,125 @@ class ImgModel(object):
 
         self.img_changed.emit()
 
+    @staticmethod
+    def _get_file_stamp(filename):
+        """
+        :return: tuple of modification time and size of the file, None if the file can not be accessed
+        """
+        try:
+            stat = os.stat(filename)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def _get_file_data(self, filename, pos=0, file_stamp=None):
+        """
+        Gets the image file data through the file prefetch cache. Files without a valid stamp (e.g. not existing) are
+        never cached.
+        """
+        if file_stamp is None:
+            return self.get_image_data(filename, pos)
+        return self.file_prefetcher.get(
+            (filename, pos) + file_stamp, lambda: self.get_image_data(filename, pos)
+        )
+
+    def _prefetch_files(self, step, pos=None):
+        """
+        Schedules the background loading of the next files in the given direction.
+        :param step: file number increment of the last navigation, negative for backward navigation
+        :param pos: position of the number in the filename, see FileNameIterator
+        """
+        if not self.file_prefetcher.enabled:
+            return
+        try:
+            filenames = self.file_name_iterator.get_next_filenames(
+                self.file_prefetcher.num_prefetch, step, mode=self.file_iteration_mode, pos=pos
+            )
+        except (ValueError, OSError):  # e.g. current file is not in the timed file list anymore
+            return
+
+        items = []
+        for filename in filenames:
+            file_stamp = self._get_file_stamp(filename)
+            if file_stamp is None:
+                continue
+            items.append(((filename, 0) + file_stamp, partial(self.get_image_data, filename, 0)))
+        self.file_prefetcher.prefetch(items)
+
+    def _series_cache_key(self, ind):
+        return self.filename, self.selected_source, ind
+
+    def _get_series_img(self, ind):
+        """
+        Gets the image at index ind (starting at 0) of the current series through the frame prefetch cache.
+        """
+        return self.frame_prefetcher.get(self._series_cache_key(ind), partial(self.series_get_image, ind))
+
+    def _prefetch_series_imgs(self, pos):
+        """
+        Schedules the background loading of the next images in the current series. The direction and step size are
+        guessed from the previously loaded position.
+        :param pos: current position in the series, starting at 1
+        """
+        if self.series_get_image is None or not self.frame_prefetcher.enabled:
+            return
+        step = self.frame_prefetcher.update_direction(pos)
+        items = []
+        for i in range(1, self.frame_prefetcher.num_prefetch + 1):
+            next_pos = pos + i * step
+            if next_pos < 1 or next_pos > self.series_max:
+                break
+            items.append((self._series_cache_key(next_pos - 1), partial(self.series_get_image, next_pos - 1)))
+        self.frame_prefetcher.prefetch(items)
+
+    def _register_loaders(self):
+        """
+        Registers the builtin image loaders. The priorities keep the order in which the loaders were originally tried.
+        """
+        self.loader_registry.register(
+            "PIL",
+            self.load_PIL,
+            extensions=[".tif", ".tiff", ".png", ".jpg", ".jpeg", ".bmp", ".gif"],
+            magic=PIL_MAGIC,
+            priority=10,
+            count_fn=self.count_PIL,
+        )
+        self.loader_registry.register(
+            "spe", self.load_spe, extensions=[".spe"], priority=20, count_fn=self.count_spe
+        )
+        self.loader_registry.register("fabio", self.load_fabio, priority=30, count_fn=self.count_fabio)
+        self.loader_registry.register(
+            "lambda", self.load_lambda, extensions=HDF5_EXTENSIONS, magic=HDF5_MAGIC, priority=40,
+            count_fn=count_lambda_frames,
+        )
+        self.loader_registry.register(
+            "karabo", self.load_karabo, extensions=HDF5_EXTENSIONS, magic=HDF5_MAGIC, priority=50,
+            count_fn=self.count_karabo,
+        )
+        self.loader_registry.register(
+            "hdf5", self.load_hdf5, extensions=HDF5_EXTENSIONS, magic=HDF5_MAGIC, priority=60,
+            count_fn=count_hdf5_frames,
+        )
+
     def get_image_data(self, filename, pos=0):
         """
-        Tries to load the given file using different image loader libraries and returns a dictionary containing all
-        retrieved file data.
+        Loads the given file with the image loaders matching its extension and magic bytes and returns a dictionary
+        containing all retrieved file data.
         :param filename: string containing a path to an image file
         :param pos: position of image in the image file to be loaded
         :return: dictionary containing all retrieved file information. Look at "loadable data" for possible key names.
                  Present key names depend on applied image loader
         """
-        img_loaders = [
-            self.load_PIL,
-            self.load_spe,
-            self.load_fabio,
-            self.load_lambda,
-            self.load_karabo,
-            self.load_hdf5,
-        ]
+        return self.loader_registry.load(filename, pos)
 
-        for loader in img_loaders:
-            data = loader(filename, pos)
-            if data:
-                return data
-        else:
-            raise IOError("No handler found for given image with filename: " + filename)
+    def get_frame_count(self, filename):
+        """
+        Counts the images in the given file from its metadata (e.g. the shape of the hdf5 dataset or the number of
+        frames in the header), without loading any image or changing the model. Can be called from several threads.
+        :param filename: path to an image file
+        :return: number of images in the file
+        """
+        return self.loader_registry.count_frames(str(filename))
 
     def set_loadable_attributes(self, loaded_data):
         """
@@ -238,17 +372,42 @@ class ImgModel(object):
         except IOError:
             return None
 
-    def load_spe(self, filename, *args):
+    @staticmethod
+    def count_PIL(filename):
+        """
+        PIL only reads the header when opening a file, the loader always loads the first frame.
+        :return: 1 or None if PIL can not open the file
+        """
+        try:
+            with Image.open(filename) as im:
+                return 1 if np.prod(im.size) > 1 else None
+        except IOError:
+            return None
+
+    def load_spe(self, filename, frame_index=0):
         """
         Loads an image using the builtin spe library.
         :param filename: path to the image file to be loaded
-        :return: dictionary with image_data, None if unsuccessful
+        :param frame_index: frame index of the image file to be loaded inside of multi-frame file
+        :return: dictionary with img_data, series_max and series_get_image, None if unsuccessful
         """
-        if os.path.splitext(filename)[1].lower() == ".spe":
-            spe = SpeFile(filename)
-            return {"img_data": spe.img}
-        else:
+        if os.path.splitext(filename)[1].lower() != ".spe":
+            return None
+        spe = SpeFile(filename)
+        if frame_index >= spe.num_frames:
+            return None
+        return {
+            "img_data": spe.get_frame(frame_index),
+            "series_max": spe.num_frames,
+            "series_get_image": spe.get_frame,
+            "loader": spe,
+        }
+
+    @staticmethod
+    def count_spe(filename):
+        if os.path.splitext(filename)[1].lower() != ".spe":
             return None
+        return SpeFile(filename).num_frames
 
     def load_fabio(self, filename, frame_index=0):
         """
@@ -258,16 +417,29 @@ class ImgModel(object):
         :return: dictionary with image_data and image_data_fabio, None if unsuccessful
         """
         try:
-            self.loader = FabioLoader(filename)
+            loader = FabioLoader(filename)
             return {
-                "img_data_fabio": self.loader.fabio_image,
-                "img_data": self.loader.get_image(frame_index),
-                "series_max": self.loader.series_max,
-                "series_get_image": self.loader.get_image,
+                # indexed multi-frame files are opened by fabio only when needed (see save)
+                "img_data_fabio": loader.fabio_image if loader.frame_index is None else None,
+                "img_data": loader.get_image(frame_index),
+                "series_max": loader.series_max,
+                "series_get_image": loader.get_image,
+                "loader": loader,
             }
         except (IOError, fabio.fabioutils.NotGoodReader):
             return None
 
+    @staticmethod
+    def count_fabio(filename):
+        """
+        Multi-frame EDF files are counted with their (cached) frame offset index, all other files with the number of
+        frames fabio reads from the header.
+        """
+        try:
+            return FabioLoader(filename).series_max
+        except (IOError, fabio.fabioutils.NotGoodReader):
+            return None
+
     def load_lambda(self, filename, frame_index=0):
         """
         loads an image made by a lambda detector using the builtin lambda library.
@@ -286,6 +458,7 @@ class ImgModel(object):
             "img_data": lambda_im.get_image(frame_index),
             "series_max": lambda_im.series_max,
             "series_get_image": lambda_im.get_image,
+            "loader": lambda_im,
         }
 
     def load_karabo(self, filename, frame_index=0):
@@ -296,9 +469,8 @@ class ImgModel(object):
         :return: dictionary with img_data of the first train_id, series_start, series_max and series_get_image,
                  None if unsuccessful
         """
-        try:
-            karabo_file = KaraboFile(filename)
-        except IOError:
+        karabo_file = self._open_karabo_file(filename)
+        if karabo_file is None:
             return None
         if frame_index >= karabo_file.series_max:
             return None
@@ -306,8 +478,30 @@ class ImgModel(object):
             "img_data": karabo_file.get_image(frame_index),
             "series_max": karabo_file.series_max,
             "series_get_image": karabo_file.get_image,
+            "loader": karabo_file,
         }
 
+    def count_karabo(self, filename):
+        karabo_file = self._open_karabo_file(filename)
+        if karabo_file is None:
+            return None
+        return karabo_file.series_max
+
+    def _open_karabo_file(self, filename):
+        """
+        Opens a karabo run file, recently opened files are reused as long as they are not modified.
+        :return: KaraboFile or None if the file can not be opened
+        """
+        key = (os.path.abspath(filename), self._get_file_stamp(filename))
+        karabo_file = self._karabo_files.get(key)
+        if karabo_file is None:
+            try:
+                karabo_file = KaraboFile(filename)
+            except IOError:
+                return None
+            self._karabo_files.put(key, karabo_file)
+        return karabo_file
+
     def load_hdf5(self, filename, frame_index=0):
         """
         Loads an ESRF hdf5 file
@@ -318,8 +512,6 @@ class ImgModel(object):
         """
 
         hdf5_image = Hdf5Image(filename)
-        self.loader = hdf5_image
-        self.selected_source = hdf5_image.image_sources[0]
 
         return {
             "img_data": hdf5_image.get_image(frame_index),
@@ -327,6 +519,8 @@ class ImgModel(object):
             "series_get_image": hdf5_image.get_image,
             "sources": hdf5_image.image_sources,
             "select_source": hdf5_image.select_source,
+            "selected_source": hdf5_image.image_sources[0],
+            "loader": hdf5_image,
         }
 
     def select_source(self, source):
@@ -336,9 +530,12 @@ class ImgModel(object):
         """
         self._select_source(source)
         self.selected_source = source
+        # the cached file data refers to the previously selected source of the (shared) loader
+        self.file_prefetcher.discard(lambda key: key[0] == self.filename)
         self.series_max = self.loader.series_max
         self.series_pos = min(self.series_pos, self.series_max)
-        self._img_data = self.series_get_image(self.series_pos - 1)
+        self.frame_prefetcher.reset_direction(self.series_pos)
+        self._img_data = self._get_series_img(self.series_pos - 1)
 
         self._perform_img_transformations()
         self._calculate_img_data()
@@ -350,8 +547,11 @@ class ImgModel(object):
         Saves the current file as another image file, the raw data is used for saving.
         :param filename: name of the saved file, extensions defines the format, please see fabio library for reference
         """
+        fabio_image = self._img_data_fabio
+        if fabio_image is None and isinstance(self.loader, FabioLoader):
+            fabio_image = self.loader.fabio_image
         try:
-            self._img_data_fabio.save(filename)
+            fabio_image.save(filename)
         except AttributeError:
             im_array = np.int32(np.copy(np.flipud(self._img_data)))
             im = Image.fromarray(im_array)
@@ -404,7 +604,8 @@ class ImgModel(object):
             # additions are possible
             self._img_data = self._img_data.astype(np.uint32)
 
-        self._img_data += img_data
+        # not in place, the current image data might be shared with the prefetch cache
+        self._img_data = self._img_data + img_data
 
         self._calculate_img_data()
         self.img_changed.emit()
@@ -485,12 +686,82 @@ class ImgModel(object):
             return
 
         self.series_pos = pos
-        self._img_data = self.series_get_image(pos - 1)
+        self._img_data = self._get_series_img(pos - 1)
 
         self._perform_img_transformations()
         self._calculate_img_data()
 
         self.img_changed.emit()
+        self._prefetch_series_imgs(pos)
+
+    def get_series_images(self, start, stop, region=None):
+        """
+        Reads a block of consecutive images of the current series in one go, with the get_images function of the
+        loader if it has one. The image transformations are performed, but the background, image corrections and
+        factor are not applied (see Configuration.integrate_image_stack_1d). The state of the model is not changed.
+        :param start: position of the first image, starting at 0
+        :param stop: position after the last image
+        :param region: (row_start, row_stop, column_start, column_stop) in the orientation of img_data, only this
+                       sub-array of the images is returned
+        :return: 3d array (n_images, rows, columns)
+        """
+        start = max(start, 0)
+        stop = min(stop, self.series_max)
+        if self.series_get_image is None:
+            images = self._img_data[np.newaxis, :, :][start:stop]
+        else:
+            if isinstance(self.loader, Hdf5Image) and not self.img_transformations:
+                # only the region is read from the file
+                return self.loader.get_images(start, stop, region)
+            if isinstance(self.loader, (Hdf5Image, LambdaImage, KaraboFile)):
+                images = self.loader.get_images(start, stop)
+            else:
+                images = np.array([self.series_get_image(ind) for ind in range(start, stop)])
+            if self.img_transformations:
+                images = np.array([self._transform_img(image) for image in images])
+
+        if region is not None:
+            images = images[:, region[0] : region[1], region[2] : region[3]]
+        return images
+
+    def get_series_blocks(self, positions=None):
+        """
+        Splits positions of the current series into blocks of consecutive positions, which can be read with
+        get_series_images. A block has at most MAX_FRAMES_PER_BLOCK images and MAX_BLOCK_BYTES of raw image data.
+        :param positions: increasing positions starting at 0, defaults to all positions of the series
+        :return: list of (start, stop)
+        """
+        if positions is None:
+            positions = range(self.series_max)
+        block_size = self.get_block_size()
+
+        blocks = []
+        for pos in positions:
+            if blocks and blocks[-1][1] == pos and pos - blocks[-1][0] < block_size:
+                blocks[-1][1] = pos + 1
+            else:
+                blocks.append([pos, pos + 1])
+        return [tuple(block) for block in blocks]
+
+    def get_block_size(self):
+        """
+        :return: number of images with the shape and dtype of the current image, which are read and integrated
+                 together in a block (at most MAX_FRAMES_PER_BLOCK images and MAX_BLOCK_BYTES of raw image data)
+        """
+        block_size = MAX_BLOCK_BYTES // max(self._img_data.nbytes, 1)
+        return max(1, min(MAX_FRAMES_PER_BLOCK, block_size))
+
+    def get_background_for_integration(self, region=None):
+        """
+        :param region: (row_start, row_stop, column_start, column_stop) to only get a sub-array of the background
+        :return: scaled and offset background, which is subtracted from the image, or None if no background is set
+        """
+        if not self.has_background():
+            return None
+        background_data = self._background_data
+        if region is not None:
+            background_data = background_data[region[0] : region[1], region[2] : region[3]]
+        return self._background_scaling * background_data + self._background_offset
 
     def load_next_file(self, step=1, pos=None):
         """
@@ -503,6 +774,7 @@ class ImgModel(object):
         )
         if next_file_name is not None:
             self.load(next_file_name)
+            self._prefetch_files(step, pos)
 
     def load_previous_file(self, step=1, pos=None):
         """
@@ -515,6 +787,7 @@ class ImgModel(object):
         )
         if previous_file_name is not None:
             self.load(previous_file_name)
+            self._prefetch_files(-step, pos)
 
     def load_next_folder(self, mec_mode=False):
         """
@@ -555,10 +828,34 @@ class ImgModel(object):
             self.file_name_iterator.create_timed_file_list = True
             self.file_name_iterator.update_filename(self.filename)
 
+    @property
+    def _img_data(self):
+        """The raw image data with all image transformations applied."""
+        return self._raw_img_data
+
+    @_img_data.setter
+    def _img_data(self, new_data):
+        self._raw_img_data = new_data
+        self._invalidate_img_data()
+
+    @property
+    def _background_data(self):
+        """The background image data with all image transformations applied."""
+        return self._background
+
+    @_background_data.setter
+    def _background_data(self, new_data):
+        self._background = new_data
+        self._invalidate_img_data()
+
+    def _invalidate_img_data(self):
+        self._composed_img_data = None
+        self._img_data_version += 1
+
     def _calculate_img_data(self):
         """
-        Calculates compound img_data based on the state of the object. This function is used internally to not compute
-        those img arrays every time somebody requests the image data by get_img_data() and img_data.
+        Checks that background and image corrections are compatible with the current image and invalidates the
+        composed img_data. The composed image is then recalculated only once on the next access of img_data.
         """
 
         # check that all data has the same dimensions
@@ -571,25 +868,76 @@ class ImgModel(object):
                 self.transfer_correction.reset()
                 self.corrections_removed.emit()
 
-        # calculate the current _img_data
-        if self._background_data is not None and not self._img_corrections.has_items():
-            self._img_data_background_subtracted = self._img_data - (
-                self._background_scaling * self._background_data
-                + self._background_offset
-            )
-        elif self._background_data is None and self._img_corrections.has_items():
-            self._img_data_absorption_corrected = (
-                self._img_data / self._img_corrections.get_data()
+        self._invalidate_img_data()
+
+    def _compose_img_data(self, region=None):
+        """
+        Composes the image data from the raw (transformed) image, the background, the image corrections and the
+        factor. Without any of them the raw data is used in its native dtype, otherwise the composed image is
+        calculated in corrected_dtype. After the first step all further steps are performed in place.
+        :param region: (row_start, row_stop, column_start, column_stop) to only compose a sub-array of the image
+        :return: read-only view of the composed image
+        """
+        img_data = self._img_data
+        if img_data is None:
+            return None
+        background_data = self._background_data
+        if region is not None:
+            region_slice = (slice(region[0], region[1]), slice(region[2], region[3]))
+            img_data = img_data[region_slice]
+            if background_data is not None:
+                background_data = background_data[region_slice]
+
+        if (
+            background_data is None
+            and not self._img_corrections.has_items()
+            and self._factor == 1
+        ):
+            img_data = img_data.view()
+            img_data.flags.writeable = False
+            return img_data
+
+        dtype = self._corrected_dtype
+        img_data = img_data.astype(dtype)
+
+        if background_data is not None:
+            background = background_data.astype(dtype, copy=False)
+            img_data -= (
+                dtype.type(self._background_scaling) * background
+                + dtype.type(self._background_offset)
             )
 
-        elif self._background_data is not None and self._img_corrections.has_items():
-            self._img_data_background_subtracted_absorption_corrected = (
-                self._img_data
-                - (
-                    self._background_scaling * self._background_data
-                    + self._background_offset
+        if self._img_corrections.has_items():
+            img_data /= self._img_corrections.get_data(region)
+
+        if self._factor != 1:
+            img_data *= self._factor
+
+        img_data.flags.writeable = False
+        return img_data
+
+    @property
+    def corrected_dtype(self):
+        """
+        dtype of the composed img_data, if a background, image corrections or a factor are applied. The raw image
+        data always keeps the dtype of the detector.
+        """
+        return self._corrected_dtype
+
+    @corrected_dtype.setter
+    def corrected_dtype(self, new_dtype):
+        new_dtype = np.dtype(new_dtype)
+        if new_dtype not in CORRECTED_DTYPES:
+            raise ValueError(
+                "corrected_dtype needs to be one of {}".format(
+                    [str(dtype) for dtype in CORRECTED_DTYPES]
                 )
-            ) / self._img_corrections.get_data()
+            )
+        if new_dtype == self._corrected_dtype:
+            return
+        self._corrected_dtype = new_dtype
+        self._invalidate_img_data()
+        self.img_changed.emit()
 
     @property
     def img_data(self):
@@ -598,25 +946,36 @@ class ImgModel(object):
             The image based on the current state of the ImgData object. It will apply all image correction as well as
             background subtraction. in case you want the raw data without corrections, please use the
             raw_img_data property.
+            The returned array is cached and read-only, it is only recalculated when one of its inputs changes.
         """
-        # if self._img_data is None:
-        #     return None
+        if self._composed_img_data is None:
+            self._composed_img_data = self._compose_img_data()
+        return self._composed_img_data
 
-        if self._background_data is None and not self._img_corrections.has_items():
-            return self._img_data * self.factor
-
-        elif (
-            self._background_data is not None and not self._img_corrections.has_items()
-        ):
-            return self._img_data_background_subtracted * self.factor
+    def get_img_data_region(self, region):
+        """
+        Returns a sub-array of img_data. If img_data was not composed yet, only the sub-array is composed (background
+        subtraction, image corrections and factor), which is much faster for small regions of large images.
+        :param region: (row_start, row_stop, column_start, column_stop)
+        :return: read-only sub-array of the image
+        """
+        if self._composed_img_data is not None:
+            return self._composed_img_data[region[0] : region[1], region[2] : region[3]]
+        return self._compose_img_data(region)
 
-        elif self._background_data is None and self._img_corrections.has_items():
-            return self._img_data_absorption_corrected * self.factor
+    @property
+    def img_shape(self):
+        """
+        :return: shape of the image data, without calculating the composed image
+        """
+        return self._img_data.shape
 
-        elif self._background_data is not None and self._img_corrections.has_items():
-            return (
-                self._img_data_background_subtracted_absorption_corrected * self.factor
-            )
+    @property
+    def img_data_version(self):
+        """
+        :return: counter which is incremented every time the image data or any of its inputs changes
+        """
+        return self._img_data_version
 
     @property
     def raw_img_data(self):
@@ -731,8 +1090,15 @@ class ImgModel(object):
         """
         Performs all saved image transformation on original image.
         """
+        self._img_data = self._transform_img(self._img_data)
+
+    def _transform_img(self, img_data):
+        """
+        Performs all saved image transformations on an image in the orientation of the file.
+        """
         for transformation in self.img_transformations:
-            self._img_data = transformation(self._img_data)
+            img_data = transformation(img_data)
+        return img_data
 
     def _perform_background_transformations(self):
         """
@@ -882,6 +1248,7 @@ class ImgModel(object):
     @factor.setter
     def factor(self, new_value):
         self._factor = new_value
+        self._invalidate_img_data()
         self.img_changed.emit()
 
     def blockSignals(self, block=True):
@@ -25,7 +25,7 @@ from xypattern import Pattern
 from .BatchModel import BatchModel
 
 
-class MapModel(BatchModel):
+class MapModel(BatchModel, QtCore.QObject):
     """
     Model for 2D maps from multiple pattern.
     """
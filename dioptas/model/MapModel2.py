@@ -120,12 +120,15 @@ class MapModel2:
             self.configuration.img_model.img_changed.blocked = False
 
     def _integrate(self):
+        img_model = self.configuration.img_model
         for file_ind, filepath in enumerate(self.filepaths):
-            self.configuration.img_model.load(filepath)
+            img_model.load(filepath)
 
-            for frame_ind in range(self.configuration.img_model.series_max):
-                self.configuration.img_model.load_series_img(frame_ind + 1)
-                x, y = self.configuration.integrate_image_1d()
+            # consecutive frames are read and integrated in blocks
+            region = self.configuration.integration_region
+            for start, stop in img_model.get_series_blocks():
+                frames = img_model.get_series_images(start, stop, region)
+                x, intensities = self.configuration.integrate_image_stack_1d(frames)
 
                 if file_ind == 0:
                     self.pattern_x = x
@@ -135,12 +138,13 @@ class MapModel2:
                             "The integrated patterns have different length, this is not supported"
                         )
 
-                self.point_infos.append(MapPointInfo(filepath, frame_ind))
-                self.pattern_intensities.append(y)
+                for frame_ind, y in zip(range(start, stop), intensities):
+                    self.point_infos.append(MapPointInfo(filepath, frame_ind))
+                    self.pattern_intensities.append(y)
 
-                self.point_integrated.emit(
-                    file_ind + (frame_ind + 1) / self.configuration.img_model.series_max
-                )
+                    self.point_integrated.emit(
+                        file_ind + (frame_ind + 1) / img_model.series_max
+                    )
         self.pattern_intensities = np.array(self.pattern_intensities)
 
     def _reset(self):
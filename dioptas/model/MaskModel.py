@@ -24,24 +24,67 @@ import fabio
 import numpy as np
 import skimage.draw
 from PIL import Image
-from qtpy import QtCore
 from math import sqrt, atan2, cos, sin
 
 from .util.cosmics import cosmicsimage
+from .util.IntegrationEngineCache import mask_fingerprint
 
 
 class MaskModel(object):
     def __init__(self, mask_dimension=(2048, 2048)):
+        self._mask_version = 0
+        self._composite_mask = None
+        self._composite_fingerprint = None
+        self._roi_mask = None
+        self._roi = None
+
         self.mask_dimension = mask_dimension
         self.reset_dimension()
         self.filename = ''
         self.mode = True
-        self.roi = None
 
         self._mask_data = np.zeros(self.mask_dimension, dtype=bool)
         self._undo_deque = deque(maxlen=50)
         self._redo_deque = deque(maxlen=50)
 
+    @property
+    def _mask_data(self):
+        return self._mask_array
+
+    @_mask_data.setter
+    def _mask_data(self, new_data):
+        self._mask_array = new_data
+        self._mask_changed()
+
+    def _mask_changed(self):
+        """
+        Invalidates the cached composite mask. Called on every edit of the mask data or the roi.
+        """
+        self._mask_version += 1
+        self._composite_mask = None
+        self._composite_fingerprint = None
+        self._roi_mask = None
+
+    @property
+    def mask_version(self):
+        """
+        Counter, which is increased by every edit of the mask through the MaskModel and by changes of the roi.
+        """
+        return self._mask_version
+
+    @property
+    def roi(self):
+        return self._roi
+
+    @roi.setter
+    def roi(self, new_roi):
+        if new_roi is None and self._roi is None:
+            return
+        if new_roi is not None and self._roi is not None and np.array_equal(new_roi, self._roi):
+            return
+        self._roi = new_roi
+        self._mask_changed()
+
     def set_dimension(self, mask_dimension):
         if not np.array_equal(mask_dimension, self.mask_dimension):
             self.mask_dimension = mask_dimension
@@ -52,28 +95,50 @@ class MaskModel(object):
             self._mask_data = np.zeros(self.mask_dimension, dtype=bool)
             self._undo_deque = deque(maxlen=50)
             self._redo_deque = deque(maxlen=50)
+        else:
+            self._mask_changed()
 
     @property
     def roi_mask(self):
-        if self.roi is not None:
-            roi_mask = np.ones(self.mask_dimension)
+        """
+        Read-only boolean mask of everything outside of the roi, cached until the roi or the mask dimension changes.
+        """
+        if self.roi is None:
+            return None
+
+        if self._roi_mask is None:
+            roi_mask = np.ones(self.mask_dimension, dtype=bool)
             x1, x2, y1, y2 = self.roi
             if x1 < 0:
                 x1 = 0
             if y1 < 0:
                 y1 = 0
-            roi_mask[int(x1):int(x2), int(y1):int(y2)] = 0
-
-            return roi_mask
-
-        else:
-            return None
+            roi_mask[int(x1):int(x2), int(y1):int(y2)] = False
+            roi_mask.flags.writeable = False
+            self._roi_mask = roi_mask
+        return self._roi_mask
 
     def get_mask(self):
-        if self.roi is None:
-            return self._mask_data
-        elif self.roi is not None:
-            return np.logical_or(self._mask_data, self.roi_mask)
+        """
+        Returns the composite of the mask and the roi mask. The result is read-only and cached until the next edit,
+        i.e. the same array is returned as long as the mask_version does not change.
+        """
+        if self._composite_mask is None:
+            if self.roi is None:
+                composite_mask = self._mask_data.view()
+            else:
+                composite_mask = np.logical_or(self._mask_data, self.roi_mask)
+            composite_mask.flags.writeable = False
+            self._composite_mask = composite_mask
+        return self._composite_mask
+
+    def get_mask_fingerprint(self):
+        """
+        :return: checksum of the composite mask (see get_mask), only calculated once per mask_version
+        """
+        if self._composite_fingerprint is None:
+            self._composite_fingerprint = mask_fingerprint(self.get_mask())
+        return self._composite_fingerprint
 
     def get_img(self):
         return self._mask_data
@@ -83,9 +148,11 @@ class MaskModel(object):
         Saves the current mask data into a deque, which can be popped later
         to provide an undo/redo feature.
         When performing a new action the old redo steps will be cleared..._
+        Every action calls this before editing the mask data, hence the cached composite mask is invalidated here.
         """
         self._undo_deque.append(np.copy(self._mask_data))
         self._redo_deque.clear()
+        self._mask_changed()
 
     def undo(self):
         try:
@@ -331,7 +398,8 @@ class MaskModel(object):
         b_p_bc = mid_bc_y - slope_p_bc * mid_bc_x
         x0 = (b_p_bc - b_p_ab) / (slope_p_ab - slope_p_bc)
         y0 = slope_p_ab * x0 + b_p_ab
-        self.center_for_arc = QtCore.QPointF(x0, y0)
+        # the center has the point type of the given points (e.g. QPointF)
+        self.center_for_arc = type(a)(x0, y0)
         return self.center_for_arc
 
     @staticmethod
@@ -364,5 +432,5 @@ class MaskModel(object):
         for phi in phi_range:
             xn = p0.x() + (r - width) * cos(phi)
             yn = p0.y() + (r - width) * sin(phi)
-            p.append(QtCore.QPointF(xn, yn))
+            p.append(type(p0)(xn, yn))
         return p
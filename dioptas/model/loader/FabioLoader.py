@@ -18,18 +18,232 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import bz2
+import gzip
+import os
+import re
+import zlib
+
+import numpy as np
 import fabio
 
+from ..util.cache import PersistentFileIndex
+
+EDF_DATA_TYPES = {
+    "UNSIGNEDBYTE": "u1", "SIGNEDBYTE": "i1",
+    "UNSIGNEDSHORT": "u2", "SIGNEDSHORT": "i2",
+    "UNSIGNEDINTEGER": "u4", "SIGNEDINTEGER": "i4",
+    "UNSIGNEDLONG": "u4", "SIGNEDLONG": "i4",
+    "UNSIGNED64": "u8", "SIGNED64": "i8",
+    "FLOATVALUE": "f4", "FLOAT": "f4", "FLOATIEEE32": "f4",
+    "DOUBLEVALUE": "f8", "DOUBLEIEEE64": "f8",
+}
+EDF_COMPRESSIONS = {
+    "NONE": None, "NO_COMPRESSION": None,
+    "GZIP": "gzip", "GZ": "gzip",
+    "Z": "zlib", "ZLIB": "zlib",
+    "BZ": "bz2", "BZ2": "bz2",
+}
+EDF_HEADER_BLOCK_SIZE = 512
+EDF_MAX_HEADER_SIZE = 64 * 1024
+
+frame_index_cache = PersistentFileIndex(
+    os.path.join(os.path.expanduser("~"), ".Dioptas", "edf_frame_index.json"), max_entries=100
+)
+
 
 class FabioLoader:
     def __init__(self, filename):
         """
-        Loads an Hdf5 image produced by ESRF
-        :param filename: path to the hdf5 file to be loaded
+        Loads an image using the fabio library. Frames of multi-frame EDF files are read through a frame offset index
+        instead, which is cached on disk.
+        :param filename: path to the image file to be loaded
         """
+        self.filename = filename
+        self._fabio_image = None
 
-        self.fabio_image = fabio.open(filename)
-        self.series_max = self.fabio_image.nframes
+        self.frame_index = None
+        if os.path.splitext(filename)[1].lower() == ".edf":
+            self.frame_index = get_edf_frame_index(filename)
+
+        if self.frame_index is not None:
+            self.series_max = len(self.frame_index.offsets)
+        else:
+            self.series_max = self.fabio_image.nframes
+
+    @property
+    def fabio_image(self):
+        if self._fabio_image is None:
+            self._fabio_image = fabio.open(self.filename)
+        return self._fabio_image
 
     def get_image(self, ind=0):
+        if self.frame_index is not None:
+            return self.frame_index.read_frame(ind)[::-1]
         return self.fabio_image.get_frame(ind).data[::-1]
+
+
+class EdfFrameIndex(object):
+    """
+    Positions of all frames in a multi-frame EDF file. Uncompressed frames are memory mapped, compressed frames are
+    read with a single seek, so every frame can be accessed in constant time.
+    """
+
+    def __init__(self, filename, dtype, shape, compression, offsets, sizes):
+        """
+        :param filename: path of the EDF file
+        :param dtype: numpy dtype string of the frames (including byte order)
+        :param shape: shape of the frames (Dim_2, Dim_1)
+        :param compression: None, "gzip", "zlib" or "bz2"
+        :param offsets: list of the byte offsets of the binary data of each frame
+        :param sizes: list of the binary sizes of each frame
+        """
+        self.filename = filename
+        self.dtype = np.dtype(dtype)
+        self.shape = tuple(shape)
+        self.compression = compression
+        self.offsets = offsets
+        self.sizes = sizes
+
+    def read_frame(self, ind):
+        """
+        :param ind: index of the frame starting at 0
+        :return: 2d array in file orientation
+        """
+        offset = self.offsets[ind]
+        if self.compression is None:
+            data = np.memmap(self.filename, dtype=self.dtype, mode="r", offset=offset, shape=self.shape)
+        else:
+            with open(self.filename, "rb") as f:
+                f.seek(offset)
+                blob = f.read(self.sizes[ind])
+            if self.compression == "gzip":
+                blob = gzip.decompress(blob)
+            elif self.compression == "zlib":
+                blob = zlib.decompress(blob)
+            else:
+                blob = bz2.decompress(blob)
+            data = np.frombuffer(blob, dtype=self.dtype, count=int(np.prod(self.shape))).reshape(self.shape)
+
+        if not self.dtype.isnative:
+            data = data.astype(self.dtype.newbyteorder("="))
+        return data
+
+    def to_dict(self):
+        return {
+            "dtype": self.dtype.str,
+            "shape": list(self.shape),
+            "compression": self.compression,
+            "offsets": self.offsets,
+            "sizes": self.sizes,
+        }
+
+
+def get_edf_frame_index(filename):
+    """
+    Gets the frame index of an EDF file from the on-disk cache or by scanning its headers.
+    :param filename: path of the EDF file
+    :return: EdfFrameIndex or None if the file has only one frame or can not be indexed (it should then be read with
+             fabio)
+    """
+    index = frame_index_cache.get(filename)
+    if index is None:
+        index = scan_edf_frames(filename)
+        if index is None:
+            return None
+        frame_index_cache.put(filename, index)
+    return EdfFrameIndex(filename, **index)
+
+
+def scan_edf_frames(filename):
+    """
+    Reads only the headers of all frames in an EDF file and seeks over the binary data. Only files with more than one
+    frame, which all have the same data type, shape and compression are indexed.
+    :param filename: path of the EDF file
+    :return: dictionary with the frame index or None
+    """
+    offsets, sizes, frame_format = [], [], None
+    file_size = os.path.getsize(filename)
+    with open(filename, "rb") as f:
+        pos = 0
+        while pos < file_size:
+            header, data_offset = _read_edf_header(f, pos)
+            if header is None:
+                break
+            parsed = _parse_edf_header(header)
+            if parsed is None:
+                return None
+            current_format, size = parsed
+            if frame_format is None:
+                frame_format = current_format
+            elif current_format != frame_format:
+                return None
+            if data_offset + size > file_size:
+                return None
+            offsets.append(data_offset)
+            sizes.append(size)
+            pos = data_offset + size
+
+    if len(offsets) < 2:
+        return None
+    dtype, shape, compression = frame_format
+    return {"dtype": dtype, "shape": list(shape), "compression": compression, "offsets": offsets, "sizes": sizes}
+
+
+_edf_header_end = re.compile(rb"}\r?\n")
+
+
+def _read_edf_header(f, pos):
+    """
+    :return: tuple of (header string, offset of the binary data) or (None, None) if there is no further header
+    """
+    f.seek(pos)
+    header = b""
+    while len(header) < EDF_MAX_HEADER_SIZE:
+        block = f.read(EDF_HEADER_BLOCK_SIZE)
+        if not block:
+            return None, None
+        header += block
+        start = len(header) - len(header.lstrip())
+        if start == len(header):
+            continue
+        if header[start:start + 1] != b"{":
+            return None, None
+        match = _edf_header_end.search(header, start)
+        if match is not None:
+            return header[start + 1:match.start()].decode("ascii", errors="ignore"), pos + match.end()
+    return None, None
+
+
+def _parse_edf_header(header):
+    """
+    :return: tuple of ((dtype string, shape, compression), binary size) or None if the frame is not supported
+    """
+    values = {}
+    for item in header.split(";"):
+        if "=" in item:
+            key, value = item.split("=", 1)
+            values[key.strip().upper()] = value.strip()
+
+    try:
+        shape = (int(values["DIM_2"]), int(values["DIM_1"]))
+        if int(values.get("DIM_3", 1)) != 1:
+            return None
+        dtype = np.dtype(EDF_DATA_TYPES[values.get("DATATYPE", "").upper()])
+        compression = EDF_COMPRESSIONS[values.get("COMPRESSION", "NONE").upper()]
+    except (KeyError, ValueError):
+        return None
+
+    byte_order = values.get("BYTEORDER", "LowByteFirst").upper()
+    dtype = dtype.newbyteorder(">" if byte_order == "HIGHBYTEFIRST" else "<")
+
+    nbytes = shape[0] * shape[1] * dtype.itemsize
+    try:
+        size = int(values["SIZE"])
+    except (KeyError, ValueError):
+        if compression is not None:
+            return None
+        size = nbytes
+    if compression is None and size < nbytes:
+        return None
+    return (dtype.str, shape, compression), size
@@ -19,7 +19,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 try:
-    from extra_data import H5File
+    from extra_data import H5File, by_index
     from extra_data.exceptions import FileStructureError
     extra_data_installed = True
 except ImportError:
@@ -27,6 +27,8 @@ except ImportError:
 
 __all__ = ['KaraboFile', 'extra_data_installed']
 
+IMAGE_KEY = 'data.image.pixels'
+
 
 class KaraboFile:
     def __init__(self, filename, source_ind=0):
@@ -36,11 +38,30 @@ class KaraboFile:
             self.f = H5File(filename)
         except FileStructureError:
             raise IOError('This hdf5 file is not a generated by karabo')
+        self.filename = filename
         self.series_max = len(self.f.train_ids)
         self.sources = [s for s in self.f.instrument_sources if "daqOutput" in s]
+        self._selections = {}
         self.current_source = self.sources[source_ind]
 
+    def _get_selection(self):
+        """The selection of the image data is only created once per source."""
+        if self.current_source not in self._selections:
+            self._selections[self.current_source] = self.f.select(self.current_source, IMAGE_KEY)
+        return self._selections[self.current_source]
+
     def get_image(self, ind):
-        sel = self.f.select(self.current_source, 'data.image.pixels')
-        tid, data = sel.train_from_index(ind)
-        return data[self.current_source]['data.image.pixels'][::-1]
+        tid, data = self._get_selection().train_from_index(ind)
+        return data[self.current_source][IMAGE_KEY][::-1]
+
+    def get_images(self, start, stop):
+        """
+        Reads the images of a block of consecutive trains with a single call.
+        :param start: index of the first train
+        :param stop: index after the last train
+        :return: 3d array with the images (flipped upside down, as get_image)
+        """
+        start = max(start, 0)
+        stop = min(stop, self.series_max)
+        trains = self._get_selection().select_trains(by_index[start:stop])
+        return trains[self.current_source, IMAGE_KEY].ndarray()[:, ::-1]
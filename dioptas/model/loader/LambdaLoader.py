@@ -22,6 +22,10 @@ import numpy as np
 import h5py
 import re
 
+DETECTOR_IDENTIFIERS = [["/entry/instrument/detector/description", "Lambda"],
+                        ["/entry/instrument/detector/description", b"Lambda"]]
+DATA_PATH = "entry/instrument/detector/data"
+
 
 def first(array):
     """  get first element if the only
@@ -46,12 +50,10 @@ class LambdaImage:
         :param filename: path to the image file to be loaded
         :return: dictionary with image_data, img_data_lambda and series_max, None if unsuccessful
         """
-        detector_identifiers = [["/entry/instrument/detector/description", "Lambda"],
-                                ["/entry/instrument/detector/description", b"Lambda"]]
         filenumber_list = [1, 2, 3]
         regex_in = r"(.+_m)\d((_part\d+|).nxs)"
         regex_out = r"\g<1>{}\g<2>"
-        data_path = "entry/instrument/detector/data"
+        data_path = DATA_PATH
         module_positions_path = "/entry/instrument/detector/translation/distance"
 
         if not filename:
@@ -62,13 +64,7 @@ class LambdaImage:
         except OSError:
             raise IOError("not a loadable hdf5 file")
 
-        for identifier in detector_identifiers:
-            try:
-                if first(nx_file[identifier[0]]) == identifier[1]:
-                    break
-            except KeyError:
-                pass
-        else:
+        if not is_lambda_file(nx_file):
             raise IOError("not a lambda image")
 
         # the image data is spread over multiple files, so we compile a list of them here
@@ -97,20 +93,91 @@ class LambdaImage:
         np.subtract(self._module_pos, self._module_pos[0][1], self._module_pos, where=[0, 1, 0])
         self.series_max = lambda_files[0][data_path].shape[0]
 
-    def get_image(self, image_nr):
+        self._calculate_stitching_geometry()
+
+    def _calculate_stitching_geometry(self):
+        """
+        Calculates the shape and dtype of the stitched image and the position of each module within it. This is only
+        done once, since the geometry does not change within a series.
+        """
+        tmp = self.shapes + self._module_pos[:, :2][:, ::-1]
+        self.shape = (int(np.max(tmp[:, 0])), int(np.max(tmp[:, 1])))
+        self.dtype = np.result_type(*[module.dtype for module in self.full_img_data])
+
+        self._module_slices = []
+        covered = np.zeros(self.shape, dtype=bool)
+        for module_pos, module_shape in zip(self._module_pos, self.shapes):
+            module_slice = np.s_[module_pos[1]:module_pos[1] + module_shape[0],
+                                 module_pos[0]:module_pos[0] + module_shape[1]]
+            self._module_slices.append(module_slice)
+            covered[module_slice] = True
+        self._gap_mask = None if np.all(covered) else ~covered
+
+    def get_image(self, image_nr, out=None):
         """
         Gets the data for the given image nr and stitches the tiles together
         :param image_nr: position from which to take the image from the image set
+        :param out: optional C-contiguous array with the stitched shape and dtype (see shape and dtype attributes),
+                    which is reused for the stitched image
         :return: image_data
         """
+        image = self._prepare_output(self.shape, out)
+        for module_data, module_slice in zip(self.full_img_data, self._module_slices):
+            module_data.read_direct(image, np.s_[image_nr], module_slice)
+        return image[::-1]
 
-        tmp = self.shapes + self._module_pos[:, :2][:, ::-1]
-        shape = (np.max(tmp[:, 0]), np.max(tmp[:, 1]))
-        image = np.zeros(shape)
+    def get_images(self, start, stop, out=None):
+        """
+        Stitches a block of consecutive images, each module is read with a single call directly into the stitched
+        array.
+        :param start: index of the first image
+        :param stop: index after the last image
+        :param out: optional C-contiguous array with the shape (stop - start,) + shape and the stitched dtype
+        :return: 3d array with the stitched images
+        """
+        start = max(start, 0)
+        stop = min(stop, self.series_max)
+        images = self._prepare_output((max(stop - start, 0),) + self.shape, out)
+        if stop > start:
+            for module_data, module_slice in zip(self.full_img_data, self._module_slices):
+                module_data.read_direct(images, np.s_[start:stop], (slice(None),) + module_slice)
+        return images[:, ::-1]
+
+    def _prepare_output(self, shape, out):
+        if out is None:
+            return np.zeros(shape, dtype=self.dtype)
+        if out.shape != shape or out.dtype != self.dtype or not out.flags.c_contiguous:
+            raise ValueError("out needs to be a C-contiguous array with shape {} and dtype {}".format(shape, self.dtype))
+        if self._gap_mask is not None:
+            out[..., self._gap_mask] = 0
+        return out
+
+
+def is_lambda_file(nx_file):
+    """
+    :param nx_file: opened h5py.File
+    :return: True if the file was written by a Lambda detector
+    """
+    for identifier in DETECTOR_IDENTIFIERS:
+        try:
+            if first(nx_file[identifier[0]]) == identifier[1]:
+                return True
+        except KeyError:
+            pass
+    return False
 
-        for modulenr, moduleImageData in enumerate(self.full_img_data):
-            image[self._module_pos[modulenr, 1]:self._module_pos[modulenr, 1] + self.shapes[modulenr][0],
-            self._module_pos[modulenr, 0]:self._module_pos[modulenr, 0] + self.shapes[modulenr][1]] = moduleImageData[
-                image_nr]
 
-        return image[::-1]
+def count_lambda_frames(filename):
+    """
+    Reads the number of frames of a Lambda file from the shape of its data, without opening the files of the other
+    modules.
+    :param filename: path to the file of any module
+    :return: number of frames or None if the file is not a Lambda file
+    """
+    try:
+        with h5py.File(filename, "r") as nx_file:
+            if not is_lambda_file(nx_file):
+                return None
+            return nx_file[DATA_PATH].shape[0]
+    except (OSError, KeyError):
+        return None
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['ImageLoader', 'LoaderRegistry', 'register_loader', 'unregister_loader',
+           'HDF5_MAGIC', 'TIFF_MAGIC', 'PIL_MAGIC', 'HDF5_EXTENSIONS']
+
+HDF5_MAGIC = [b'\x89HDF\r\n\x1a\n']
+TIFF_MAGIC = [b'II*\x00', b'MM\x00*']
+PIL_MAGIC = TIFF_MAGIC + [b'\x89PNG', b'\xff\xd8', b'BM', b'GIF8', b'P1', b'P2', b'P3', b'P4', b'P5', b'P6']
+HDF5_EXTENSIONS = ['.h5', '.hdf5', '.hdf', '.nxs', '.nx5', '.cxi']
+
+HEADER_SIZE = 8
+
+# errors by which a loader signals, that it can not handle a file (e.g. an hdf5 file without the expected datasets).
+# All other errors (e.g. MemoryError) and permission errors are raised.
+FORMAT_ERRORS = (OSError, ValueError, KeyError, IndexError)
+
+
+class ImageLoader(object):
+    def __init__(self, name, load_fn, extensions=None, magic=None, priority=0, count_fn=None):
+        """
+        Describes an image loader, which can be registered in a LoaderRegistry.
+        :param name: unique name of the loader
+        :param load_fn: function with the signature load_fn(filename, frame_index) returning a dictionary with the
+                        loaded data (see ImgModel.loadable_data for possible keys) or None if the file can not be
+                        handled by this loader
+        :param extensions: list of lower case file extensions (including the dot) handled by the loader, None if the
+                           loader does not depend on the extension
+        :param magic: list of byte strings, one of which the file has to start with, None if unknown
+        :param priority: loaders with lower priority values are tried first
+        :param count_fn: function with the signature count_fn(filename) returning the number of frames in the file
+                         from its metadata only, or None if the file can not be handled by this loader. None to count
+                         the frames by loading the first one with load_fn
+        """
+        self.name = name
+        self.load_fn = load_fn
+        self.extensions = extensions
+        self.magic = magic
+        self.priority = priority
+        self.count_fn = count_fn
+
+    def accepts(self, extension, header):
+        """
+        Checks whether the loader can possibly handle a file with the given extension and header bytes.
+        :param extension: lower case file extension including the dot
+        :param header: first bytes of the file
+        """
+        if self.extensions is None and self.magic is None:
+            return True
+        if self.extensions is not None and extension in self.extensions:
+            return True
+        if self.magic is not None and any(header.startswith(m) for m in self.magic):
+            return True
+        return False
+
+
+# loaders registered by third party code, they are available in all registries
+_external_loaders = []
+
+
+def register_loader(name, load_fn, extensions=None, magic=None, priority=0, count_fn=None):
+    """
+    Registers an additional image loader for all ImgModels. See ImageLoader for a description of the parameters.
+    With the default priority of 0 it will be tried before the builtin loaders.
+    """
+    unregister_loader(name)
+    _external_loaders.append(ImageLoader(name, load_fn, extensions, magic, priority, count_fn))
+
+
+def unregister_loader(name):
+    """Removes a loader previously added with register_loader."""
+    _external_loaders[:] = [loader for loader in _external_loaders if loader.name != name]
+
+
+class LoaderRegistry(object):
+    """
+    Selects the image loaders for a file based on its extension and magic bytes, instead of trying every available
+    loader. The loader which was successful for a file is remembered for its directory and extension and is tried first
+    for all following files with the same directory and extension.
+    """
+
+    def __init__(self):
+        self._loaders = []
+        self._winners = {}
+
+    def register(self, name, load_fn, extensions=None, magic=None, priority=0, count_fn=None):
+        """Registers a loader only in this registry. See ImageLoader for a description of the parameters."""
+        self.unregister(name)
+        self._loaders.append(ImageLoader(name, load_fn, extensions, magic, priority, count_fn))
+
+    def unregister(self, name):
+        self._loaders = [loader for loader in self._loaders if loader.name != name]
+        for key in [key for key, winner in self._winners.items() if winner == name]:
+            del self._winners[key]
+
+    @property
+    def loaders(self):
+        """All available loaders sorted by priority, the sorting is stable, so equal priorities keep their order."""
+        return sorted(self._loaders + _external_loaders, key=lambda loader: loader.priority)
+
+    def get_winner(self, filename):
+        """
+        :return: name of the loader which was successful for the last file with the same directory and extension
+        """
+        return self._winners.get(_winner_key(filename))
+
+    def get_candidates(self, filename):
+        """
+        Gets the loaders, which can possibly handle the file. The previously successful loader for the same directory
+        and extension comes first. The file header is only read when there was no successful loader yet.
+        :param filename: path of the image file
+        :return: list of ImageLoader
+        """
+        loaders = self.loaders
+        winner = self.get_winner(filename)
+        if winner is not None:
+            winner_loaders = [loader for loader in loaders if loader.name == winner]
+            other_loaders = [loader for loader in loaders if loader.name != winner]
+            if winner_loaders:
+                return winner_loaders + self._filter_loaders(other_loaders, filename)
+        return self._filter_loaders(loaders, filename)
+
+    def load(self, filename, frame_index=0):
+        """
+        Loads a file with the first matching loader which succeeds.
+        :param filename: path of the image file
+        :param frame_index: index of the frame in multi-frame files
+        :return: dictionary with the loaded data
+        """
+        failure = None
+        for loader in self.get_candidates(filename):
+            try:
+                data = loader.load_fn(filename, frame_index)
+            except FORMAT_ERRORS as e:
+                if isinstance(e, PermissionError):
+                    raise
+                failure = _log_failure(loader, filename, e, failure)
+                continue
+            if data:
+                self._winners[_winner_key(filename)] = loader.name
+                return data
+        _raise_no_handler(filename, failure)
+
+    def count_frames(self, filename):
+        """
+        Counts the frames of a file with the first matching loader which succeeds. Only the metadata of the file is
+        read by loaders with a count_fn, the others load the first frame.
+        :param filename: path of the image file
+        :return: number of frames in the file
+        """
+        failure = None
+        for loader in self.get_candidates(filename):
+            try:
+                if loader.count_fn is not None:
+                    num_frames = loader.count_fn(filename)
+                else:
+                    data = loader.load_fn(filename, 0)
+                    num_frames = data.get("series_max", 1) if data else None
+            except FORMAT_ERRORS as e:
+                if isinstance(e, PermissionError):
+                    raise
+                failure = _log_failure(loader, filename, e, failure)
+                continue
+            if num_frames:
+                self._winners[_winner_key(filename)] = loader.name
+                return num_frames
+        _raise_no_handler(filename, failure)
+
+    @staticmethod
+    def _filter_loaders(loaders, filename):
+        extension = os.path.splitext(filename)[1].lower()
+        header = None
+        result = []
+        for loader in loaders:
+            if header is None and loader.magic is not None:
+                header = _read_header(filename)
+            if loader.accepts(extension, header or b''):
+                result.append(loader)
+        return result
+
+
+def _log_failure(loader, filename, error, failure):
+    """
+    Logs the failure of a loader. Failures of loaders, which matched the file by its extension or magic bytes, are
+    logged as warning, since the file is most likely broken.
+    :param failure: (loader, error) of the first failure of a matching loader, None if there was none
+    :return: (loader, error) of the first failure of a matching loader
+    """
+    if loader.extensions is None and loader.magic is None:
+        logger.debug("Loader {0} failed for {1}: {2}".format(loader.name, filename, error))
+        return failure
+    logger.warning("Loader {0} failed for {1}: {2}".format(loader.name, filename, error))
+    return failure if failure is not None else (loader, error)
+
+
+def _raise_no_handler(filename, failure):
+    if failure is None:
+        raise IOError("No handler found for given image with filename: " + filename)
+    loader, error = failure
+    raise IOError("The {0} loader could not read {1}: {2}".format(loader.name, filename, error)) from error
+
+
+def _winner_key(filename):
+    directory, basename = os.path.split(os.path.abspath(filename))
+    return directory, os.path.splitext(basename)[1].lower()
+
+
+def _read_header(filename):
+    try:
+        with open(filename, 'rb') as f:
+            return f.read(HEADER_SIZE)
+    except OSError:
+        return b''
@@ -18,9 +18,33 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import h5py
 import hdf5plugin
 
+from ..util.cache import PersistentFileIndex
+
+try:
+    import bitshuffle
+    bitshuffle_installed = True
+except ImportError:
+    bitshuffle_installed = False
+
+H5Z_FILTER_DEFLATE = 1
+H5Z_FILTER_SHUFFLE = 2
+H5Z_FILTER_BITSHUFFLE = 32008
+BSHUF_LZ4_COMPRESSION = 2
+
+# limits of the chunk cache, which is sized from the chunk layout of the image dataset
+MIN_CHUNK_CACHE_NBYTES = 1024 ** 2
+MAX_CHUNK_CACHE_NBYTES = 256 * 1024 ** 2
+
+_decompression_executor = None
+
 
 class Hdf5Image:
     def __init__(self, filename):
@@ -30,30 +54,290 @@ class Hdf5Image:
         """
 
         self.f = h5py.File(filename, 'r')
-        self.image_sources = find_image_sources(self.f)
+        self.image_sources = source_index.get(filename)
+        if self.image_sources is None:
+            self.image_sources = find_image_sources(self.f)
+            source_index.put(filename, list(self.image_sources))
+        else:
+            self.image_sources = list(self.image_sources)
 
-        self.dataset = self.f[self.image_sources[0]]
-        self.series_max = self.dataset.shape[0]
+        try:
+            self.select_source(self.image_sources[0])
+        except KeyError:  # the index is outdated, e.g. an externally linked file was changed
+            self.image_sources = find_image_sources(self.f)
+            source_index.put(filename, list(self.image_sources))
+            self.select_source(self.image_sources[0])
 
     def get_image(self, ind):
         return self.dataset[ind][::-1]
 
+    def get_images(self, start, stop, region=None):
+        """
+        Reads a block of consecutive images in one go. Chunks are read directly from the file and decompressed on a
+        thread pool if the compression filter allows it, otherwise a single hyperslab read is performed.
+        :param start: index of the first image
+        :param stop: index after the last image
+        :param region: (row_start, row_stop, column_start, column_stop) in the orientation of the returned images, only
+                       this sub-array of the images is read (as hyperslab, if the chunks are not decompressed directly)
+        :return: 3d array with the images (flipped upside down, as get_image)
+        """
+        start = max(start, 0)
+        stop = min(stop, self.series_max)
+        rows, columns = self.dataset.shape[1:]
+        if region is None:
+            region = (0, rows, 0, columns)
+        row_start, row_stop, column_start, column_stop = region
+        # rows of the file, the images are flipped upside down
+        row_slice = slice(rows - row_stop, rows - row_start)
+        column_slice = slice(column_start, column_stop)
+        if stop <= start:
+            return np.zeros((0, row_stop - row_start, column_stop - column_start), dtype=self.dataset.dtype)
+
+        if self._chunk_decoder is not None:
+            images = self._read_chunks_parallel(start, stop)[:, row_slice, column_slice]
+        else:
+            images = self.dataset[start:stop, row_slice, column_slice]
+        return images[:, ::-1]
+
     def select_source(self, source):
-        self.dataset = self.f[source]
+        self.dataset = open_dataset_with_tuned_cache(self.f, source)
         self.series_max = self.dataset.shape[0]
+        self._chunk_decoder = get_chunk_decoder(self.dataset)
 
+    def _read_chunks_parallel(self, start, stop):
+        frames_per_chunk = self.dataset.chunks[0]
+        chunk_shape = self.dataset.chunks
+        dtype = self.dataset.dtype
+
+        first_chunk = start // frames_per_chunk
+        last_chunk = (stop - 1) // frames_per_chunk
+        offsets = [(ind * frames_per_chunk, 0, 0) for ind in range(first_chunk, last_chunk + 1)]
+
+        # reading raw chunks is serialized by h5py, decompressing them is not
+        raw_chunks = []
+        for offset in offsets:
+            filter_mask, chunk = self.dataset.id.read_direct_chunk(offset)
+            raw_chunks.append((filter_mask, chunk))
+
+        def decode(args):
+            offset, (filter_mask, chunk) = args
+            if filter_mask != 0:  # some filters were skipped for this chunk, let hdf5 decide
+                end = min(offset[0] + frames_per_chunk, self.series_max)
+                return self.dataset[offset[0]:end]
+            data = self._chunk_decoder(chunk, chunk_shape, dtype)
+            return data[:self.series_max - offset[0]]
+
+        decoded = list(_get_decompression_executor().map(decode, zip(offsets, raw_chunks)))
+        images = np.concatenate(decoded) if len(decoded) > 1 else decoded[0]
+        skip = start - first_chunk * frames_per_chunk
+        return images[skip:skip + stop - start]
+
+
+def open_dataset_with_tuned_cache(hdf5_file, source):
+    """
+    Opens a dataset with a chunk cache, which is large enough to hold all chunks covering at least two complete frames.
+    The default chunk cache of hdf5 is 1 MB, which is smaller than a single chunk for most modern detectors and results
+    in repeated decompression of the same chunks.
+    :param hdf5_file: h5py File
+    :param source: path of the dataset inside the file
+    :return: h5py Dataset
+    """
+    dataset = hdf5_file[source]
+    if dataset.chunks is None or len(dataset.shape) < 3:
+        return dataset
+
+    chunks = dataset.chunks
+    chunk_nbytes = int(np.prod(chunks)) * dataset.dtype.itemsize
+    chunks_per_frame = int(np.prod([np.ceil(s / c) for s, c in zip(dataset.shape[1:], chunks[1:])]))
+    nbytes = 2 * chunks_per_frame * chunk_nbytes
+    nbytes = int(min(max(nbytes, MIN_CHUNK_CACHE_NBYTES), MAX_CHUNK_CACHE_NBYTES))
+    # hdf5 recommends a prime number of slots, about 100 times the number of chunks fitting into the cache
+    nslots = _next_prime(max(100 * nbytes // max(chunk_nbytes, 1), 521))
+
+    try:
+        dapl = h5py.h5p.create(h5py.h5p.DATASET_ACCESS)
+        dapl.set_chunk_cache(nslots, nbytes, 1.0)
+        dataset_id = h5py.h5d.open(hdf5_file.id, source.encode(), dapl=dapl)
+        return h5py.Dataset(dataset_id)
+    except (KeyError, ValueError, RuntimeError):
+        return dataset
+
+
+def get_chunk_decoder(dataset):
+    """
+    Creates a function decoding raw chunks of the dataset, if the chunks can be read directly: Chunks need to cover
+    complete frames and all filters need to be decompressible in python without holding the GIL (deflate with
+    optional shuffle, or bitshuffle/LZ4 if the bitshuffle package is installed).
+    :param dataset: h5py Dataset
+    :return: function decoder(chunk_bytes, chunk_shape, dtype) or None if the chunks can not be decoded
+    """
+    if dataset.chunks is None or len(dataset.shape) != 3 or dataset.chunks[1:] != dataset.shape[1:]:
+        return None
+    if dataset.is_virtual or dataset.external:
+        return None
+
+    plist = dataset.id.get_create_plist()
+    filters = [plist.get_filter(i)[:3] for i in range(plist.get_nfilters())]
+    codes = [f[0] for f in filters]
+
+    if codes == []:
+        return _decode_uncompressed
+    if codes == [H5Z_FILTER_DEFLATE]:
+        return _decode_deflate
+    if codes == [H5Z_FILTER_SHUFFLE, H5Z_FILTER_DEFLATE]:
+        return _decode_shuffle_deflate
+    if codes == [H5Z_FILTER_BITSHUFFLE] and bitshuffle_installed:
+        values = filters[0][2]
+        if len(values) > 4 and values[4] == BSHUF_LZ4_COMPRESSION:
+            return _decode_bitshuffle_lz4
+    return None
+
+
+def _decode_uncompressed(chunk, chunk_shape, dtype):
+    return np.frombuffer(chunk, dtype=dtype).reshape(chunk_shape)
 
-def find_image_sources(hd5_file):
-    image_paths = []
 
-    def traverse_groups(group, parent_path=''):
-        if isinstance(group, h5py.Dataset):
-            if len(group.shape) >= 3:
-                image_paths.append(parent_path)
-        else:  # node is a group
-            for key in group.keys():
-                traverse_groups(group[key], parent_path + '/' + key)
+def _decode_deflate(chunk, chunk_shape, dtype):
+    return np.frombuffer(zlib.decompress(chunk), dtype=dtype).reshape(chunk_shape)
 
-    traverse_groups(hd5_file)
 
+def _decode_shuffle_deflate(chunk, chunk_shape, dtype):
+    itemsize = np.dtype(dtype).itemsize
+    shuffled = np.frombuffer(zlib.decompress(chunk), dtype=np.uint8)
+    data = shuffled.reshape(itemsize, -1).T.copy()
+    return data.view(dtype).reshape(chunk_shape)
+
+
+def _decode_bitshuffle_lz4(chunk, chunk_shape, dtype):
+    # hdf5 bitshuffle chunks start with the uncompressed size (uint64) and the block size in bytes (uint32), both
+    # big endian
+    block_size = int.from_bytes(chunk[8:12], 'big') // np.dtype(dtype).itemsize
+    data = np.frombuffer(chunk, dtype=np.uint8, offset=12)
+    return bitshuffle.decompress_lz4(data, chunk_shape, np.dtype(dtype), block_size)
+
+
+def _get_decompression_executor():
+    global _decompression_executor
+    if _decompression_executor is None:
+        _decompression_executor = ThreadPoolExecutor(
+            max_workers=os.cpu_count() or 1, thread_name_prefix="Hdf5Decompression"
+        )
+    return _decompression_executor
+
+
+def _next_prime(n):
+    def is_prime(k):
+        if k < 2:
+            return False
+        for d in range(2, int(k ** 0.5) + 1):
+            if k % d == 0:
+                return False
+        return True
+
+    while not is_prime(n):
+        n += 1
+    return n
+
+
+source_index = PersistentFileIndex(os.path.join(os.path.expanduser("~"), ".Dioptas", "hdf5_source_index.json"))
+
+
+def count_hdf5_frames(filename):
+    """
+    Reads the number of frames of the first image source (the one selected when loading the file) from the shape of
+    its dataset, without reading any image data. The sources are taken from the source index if possible, otherwise
+    the traversal stops at the first source. Only complete source lists are put into the index.
+    :param filename: path to the hdf5 file
+    :return: number of frames or None if the file contains no image source
+    """
+    with h5py.File(filename, 'r') as f:
+        image_sources = source_index.get(filename)
+        if image_sources:
+            try:
+                return f[image_sources[0]].shape[0]
+            except KeyError:  # the index is outdated
+                pass
+        image_sources = find_image_sources(f, max_sources=1)
+        if not image_sources:
+            source_index.put(filename, [])
+            return None
+        return f[image_sources[0]].shape[0]
+
+
+def find_image_sources(hd5_file, max_sources=None):
+    """
+    Finds all datasets with 3 or more dimensions in the file. The signals of NeXus entries (following the default and
+    signal attributes) come first, followed by all other datasets in traversal order.
+    :param hd5_file: h5py File
+    :param max_sources: stop the traversal after this number of sources was found, None to find all
+    :return: list of paths of the image datasets
+    """
+    image_paths = []
+    for path in iter_image_sources(hd5_file):
+        image_paths.append(path)
+        if max_sources is not None and len(image_paths) >= max_sources:
+            break
     return image_paths
+
+
+def iter_image_sources(hd5_file):
+    """
+    Lazily yields the paths of all image datasets, see find_image_sources.
+    """
+    found = set()
+    for path in _iter_nexus_signals(hd5_file):
+        if path not in found:
+            found.add(path)
+            yield path
+    for path in _iter_datasets(hd5_file):
+        if path not in found:
+            found.add(path)
+            yield path
+
+
+def _iter_datasets(group, parent_path=''):
+    if isinstance(group, h5py.Dataset):
+        if len(group.shape) >= 3:
+            yield parent_path
+    else:  # node is a group
+        for key in group.keys():
+            yield from _iter_datasets(group[key], parent_path + '/' + key)
+
+
+def _iter_nexus_signals(group, parent_path='', depth=0):
+    """
+    Follows the NXentry, NXsubentry and NXdata groups (default first) and yields their image signals. External links
+    are not followed for groups, so only the signal datasets themselves are opened in external files.
+    """
+    if depth > 4:
+        return
+
+    signal = _read_str_attr(group, 'signal')
+    if signal is not None and signal in group:
+        dataset = group[signal]
+        if isinstance(dataset, h5py.Dataset) and len(dataset.shape) >= 3:
+            yield parent_path + '/' + signal
+
+    keys = list(group.keys())
+    default = _read_str_attr(group, 'default')
+    if default in keys:
+        keys.remove(default)
+        keys.insert(0, default)
+
+    for key in keys:
+        if isinstance(group.get(key, getlink=True), h5py.ExternalLink):
+            continue
+        if group.get(key, getclass=True) is not h5py.Group:
+            continue
+        child = group[key]
+        if _read_str_attr(child, 'NX_class') in ('NXentry', 'NXsubentry', 'NXdata'):
+            yield from _iter_nexus_signals(child, parent_path + '/' + key, depth + 1)
+
+
+def _read_str_attr(node, name):
+    value = node.attrs.get(name)
+    if isinstance(value, np.ndarray):
+        value = value.item() if value.size == 1 else None
+    if isinstance(value, bytes):
+        value = value.decode('utf-8', errors='ignore')
+    return value if isinstance(value, str) else None
@@ -28,6 +28,11 @@ from numpy.polynomial.polynomial import polyval
 from dateutil import parser
 
 
+SPE_DATA_OFFSET = 4100
+# datatypes can be found on page 10 in the SPE 3.0 File format manual
+SPE_DATA_TYPES = {0: np.float32, 1: np.int32, 2: np.int16, 3: np.uint16, 8: np.uint32}
+
+
 class SpeFile(object):
     """Implements the SPE_File class for loading princeton instrument binary SPE files into Python
     works for version 2 and version 3 files.
@@ -40,8 +45,7 @@ class SpeFile(object):
     num_frames - number of frames collected
     exposure_time
 
-    img - 2d data if num_frames==1
-          list of 2d data if num_frames>1
+    img - 2d data of the first frame, all frames can be accessed with get_frame(ind)
 
     x_calibration - wavelength information of x-axis
 
@@ -311,36 +315,23 @@ class SpeFile(object):
         return np.fromfile(self._fid, ntype, size)
 
     def _read_img(self):
-        self.img = self._read_frame(4100)
-        if self.num_frames > 1:
-            img_temp = []
-            img_temp.append(self.img)
-            for n in range(self.num_frames - 1):
-                img_temp.append(self._read_frame())
-            self.img = img_temp
-        if type(self.img) == list:
-            self.img = self.img[0]
-
-    def _read_frame(self, pos=None):
-        """Reads in a frame at a specific binary position. The following parameters have to
-        be predefined before calling this function:
-        datatype - either 0,1,2,3,8 for float32, int32, int16, uint16 or uint32 (datatypes can be found on page 10 in
-        the SPE 3.0 File format manual)
-        _xdim, _ydim - being the dimensions.
+        """Maps the image data of all frames into memory without reading them. Frames are only read from disk, when
+        they are accessed."""
+        dtype = np.dtype(SPE_DATA_TYPES[int(self._data_type)]).newbyteorder('<')
+        frame_size = int(self._xdim * self._ydim * dtype.itemsize)
+        max_frames = (self.get_file_size() - SPE_DATA_OFFSET) // frame_size
+        self.num_frames = int(min(max(self.num_frames, 1), max_frames))
+
+        self._frames = np.memmap(self.filename, dtype=dtype, mode='r', offset=SPE_DATA_OFFSET,
+                                 shape=(self.num_frames, int(self._ydim), int(self._xdim)))
+        self.img = self._frames[0]
+
+    def get_frame(self, ind):
+        """Returns the frame with index ind (starting at 0) as a read-only memory mapped array.
+
+        :param ind: index of the frame
         """
-        if pos == None:
-            pos = self._fid.tell()
-        if self._data_type == 0:
-            img = self._read_at(pos, self._xdim * self._ydim, np.float32)
-        elif self._data_type == 1:
-            img = self._read_at(pos, self._xdim * self._ydim, np.int32)
-        elif self._data_type == 2:
-            img = self._read_at(pos, self._xdim * self._ydim, np.int16)
-        elif self._data_type == 3:
-            img = self._read_at(pos, self._xdim * self._ydim, np.uint16)
-        elif self._data_type == 8:
-            img = self._read_at(pos, self._xdim * self._ydim, np.uint32)
-        return img.reshape((self._ydim, self._xdim))
+        return self._frames[ind]
 
     def get_index_from(self, wavelength):
         """
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import logging
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+
+import h5py
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# maximum number of frames integrated by a worker per task, smaller tasks give a finer progress and cancellation
+MAX_FRAMES_PER_TASK = 16
+# interval in s in which the callback function is called while waiting for the workers
+CALLBACK_INTERVAL = 0.2
+
+_worker_state = None
+
+
+class SharedArray(object):
+    """
+    Numpy array in shared memory, which can be attached to by other processes with its spec.
+    """
+
+    def __init__(self, shape, dtype, name=None):
+        """
+        :param shape: shape of the array
+        :param dtype: dtype of the array
+        :param name: name of an existing shared memory block to attach to, None to create a new one (filled with 0)
+        """
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        size = max(int(np.prod(self.shape)) * self.dtype.itemsize, 1)
+        if name is None:
+            self._memory = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self._memory = shared_memory.SharedMemory(name=name)
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self._memory.buf)
+        if name is None:
+            self.array.fill(0)
+
+    @property
+    def spec(self):
+        return self._memory.name, self.shape, self.dtype.str
+
+    def close(self, unlink=False):
+        self.array = None
+        self._memory.close()
+        if unlink:
+            self._memory.unlink()
+
+
+def create_configuration_snapshot(configuration):
+    """
+    Saves everything a worker process needs to integrate like the configuration (geometry, mask, background, image
+    corrections and integration settings) into a picklable snapshot.
+    :param configuration: Configuration
+    :return: snapshot (see load_configuration_snapshot)
+    """
+    buffer = io.BytesIO()
+    with h5py.File(buffer, "w") as f:
+        configuration.save_in_hdf5(f.create_group("configuration"))
+    settings = {
+        "integration_rad_points": configuration.integration_rad_points,
+        "oned_azimuth_range": configuration.oned_azimuth_range,
+        "trim_trailing_zeros": configuration.trim_trailing_zeros,
+        "supersampling_factor": configuration.calibration_model.supersampling_factor,
+    }
+    return buffer.getvalue(), settings
+
+
+def load_configuration_snapshot(snapshot):
+    """
+    :param snapshot: snapshot created by create_configuration_snapshot
+    :return: Configuration, which only integrates explicitly
+    """
+    from ..Configuration import Configuration
+
+    hdf5_data, settings = snapshot
+    configuration = Configuration()
+    with h5py.File(io.BytesIO(hdf5_data), "r") as f:
+        configuration.load_from_hdf5(f["configuration"])
+    configuration.auto_integrate_pattern = False
+    configuration.auto_integrate_cake = False
+    configuration.auto_save_integrated_pattern = False
+    configuration.integration_worker = None
+    configuration.calibration_model.set_supersampling(settings["supersampling_factor"])
+    configuration.integration_rad_points = settings["integration_rad_points"]
+    configuration.oned_azimuth_range = settings["oned_azimuth_range"]
+    configuration.trim_trailing_zeros = settings["trim_trailing_zeros"]
+    return configuration
+
+
+def group_frames(frames):
+    """
+    Groups frames into consecutive runs of the same file.
+    :param frames: list of (file, position in the file)
+    :return: list of (file, list of positions)
+    """
+    groups = []
+    for file, pos in frames:
+        if groups and groups[-1][0] == file:
+            groups[-1][1].append(int(pos))
+        else:
+            groups.append((file, [int(pos)]))
+    return groups
+
+
+def integrate_frame_blocks(configuration, filename, positions, current_filename=None):
+    """
+    Loads a file into the img_model of the configuration and integrates the frames at the positions in the batch
+    binning (2θ). Consecutive frames are read in blocks with img_model.get_series_images and integrated with a single
+    sparse matrix product per block.
+    :param filename: image file
+    :param positions: increasing positions of the frames in the file, starting at 0
+    :param current_filename: file currently loaded in the img_model, it is only loaded again if filename differs
+    :return: generator of (number of frames, binning, intensities (n x n_points), sectors (binning, intensities of
+             n x n_sectors x n_points) or None) for every block
+    """
+    img_model = configuration.img_model
+    if filename != current_filename:
+        img_model.load(filename)
+    configuration.mask_model.set_dimension(img_model.img_shape)
+
+    region = configuration.integration_region
+    for start, stop in img_model.get_series_blocks(positions):
+        frames = img_model.get_series_images(start, stop, region)
+        binning, intensities = configuration.integrate_image_stack_1d(frames, "2th_deg")
+        sectors = configuration.integrate_image_stack_sectors(frames, "2th_deg")
+        yield len(frames), binning, intensities, sectors
+
+
+def _initialize_worker(snapshot, data_spec, sector_data_spec, num_threads):
+    if num_threads is not None:
+        os.environ.setdefault("OMP_NUM_THREADS", str(num_threads))
+    global _worker_state
+    _worker_state = {
+        "configuration": load_configuration_snapshot(snapshot),
+        "data": SharedArray(data_spec[1], data_spec[2], name=data_spec[0]),
+        "sector_data": None,
+        "filename": None,
+    }
+    if sector_data_spec is not None:
+        _worker_state["sector_data"] = SharedArray(sector_data_spec[1], sector_data_spec[2], name=sector_data_spec[0])
+
+
+def _integrate_frames(task):
+    """
+    Integrates the frames of a task in a worker process and writes the intensities into the shared arrays.
+    :param task: index of the first row in the shared arrays, list of (filename, position in the file)
+    :return: binning of the longest pattern
+    """
+    row, frames = task
+    data = _worker_state["data"].array
+    sector_data = _worker_state["sector_data"]
+    longest_binning = None
+    for filename, positions in group_frames(frames):
+        blocks = integrate_frame_blocks(
+            _worker_state["configuration"], filename, positions, _worker_state["filename"]
+        )
+        for num_frames, binning, intensities, sectors in blocks:
+            if intensities.shape[1] > data.shape[1]:
+                raise ValueError("{} has more radial points than the first frame.".format(filename))
+            data[row:row + num_frames, :intensities.shape[1]] = intensities
+            if sectors is not None and sector_data is not None:
+                sector_data.array[row:row + num_frames] = sectors[1]
+            if longest_binning is None or len(binning) > len(longest_binning):
+                longest_binning = binning
+            row += num_frames
+        _worker_state["filename"] = filename
+    return longest_binning
+
+
+def integrate_frames_in_parallel(configuration, frames, num_workers, callback_fn=None):
+    """
+    Integrates frames with worker processes, each holding a copy of the configuration (geometry, mask, background,
+    image corrections and integration settings) and reading the frames itself with any supported loader. The first
+    frame is integrated in this process to determine the binning, all others are distributed in small tasks to the
+    workers, which write the patterns into arrays in shared memory.
+    :param configuration: Configuration used for the integration
+    :param frames: list of (filename, position in the file) of all frames
+    :param num_workers: number of worker processes
+    :param callback_fn: function called regularly with the number of integrated frames, if it returns False the
+                        integration is aborted
+    :return: number of integrated frames n (consecutive from the first frame), binning (n_points), data (n x
+             n_points), sector binning, sector data (n x n_sectors x n_points) or None, None if no sectors are set
+    """
+    filename, pos = frames[0]
+    _, binning, intensities, sectors = next(integrate_frame_blocks(configuration, filename, [pos]))
+    intensity = intensities[0]
+    # all frames of the same shape are integrated into the same (not trimmed) number of points
+    num_points = max(configuration.calibration_model.num_points, len(intensity))
+    data = SharedArray((len(frames), num_points), intensity.dtype)
+    data.array[0, :len(intensity)] = intensity
+    sector_data = sector_binning = None
+    if sectors is not None:
+        sector_binning = np.copy(sectors[0])
+        sector_data = SharedArray((len(frames),) + sectors[1].shape[1:], sectors[1].dtype)
+        sector_data.array[0] = sectors[1][0]
+
+    num_integrated = 1
+    try:
+        if callback_fn is None or callback_fn(num_integrated):
+            num_integrated, binning = _distribute_frames(
+                configuration, frames, num_workers, data, sector_data, binning, callback_fn
+            )
+        result_data = np.copy(data.array[:num_integrated, :len(binning)])
+        result_sector_data = None
+        if sector_data is not None:
+            result_sector_data = np.copy(sector_data.array[:num_integrated])
+    finally:
+        data.close(unlink=True)
+        if sector_data is not None:
+            sector_data.close(unlink=True)
+    return num_integrated, np.copy(binning), result_data, sector_binning, result_sector_data
+
+
+def _distribute_frames(configuration, frames, num_workers, data, sector_data, binning, callback_fn):
+    """
+    Integrates all but the first frame with a pool of worker processes.
+    :return: number of consecutively integrated frames, binning of the longest pattern
+    """
+    num_workers = max(1, min(num_workers, len(frames) - 1))
+    if len(frames) == 1:
+        return 1, binning
+
+    frames_per_task = max(1, min(MAX_FRAMES_PER_TASK, (len(frames) - 1) // (4 * num_workers)))
+    tasks = [(start, frames[start:start + frames_per_task]) for start in range(1, len(frames), frames_per_task)]
+    snapshot = create_configuration_snapshot(configuration)
+    num_threads = max(1, (os.cpu_count() or 1) // num_workers)
+
+    context = multiprocessing.get_context("spawn")
+    pool = context.Pool(
+        num_workers,
+        initializer=_initialize_worker,
+        initargs=(snapshot, data.spec, None if sector_data is None else sector_data.spec, num_threads),
+    )
+    num_integrated = 1
+    try:
+        results = pool.imap(_integrate_frames, tasks)
+        for row_start, task_frames in tasks:
+            while True:
+                try:
+                    task_binning = results.next(timeout=CALLBACK_INTERVAL)
+                    break
+                except multiprocessing.TimeoutError:
+                    if callback_fn is not None and not callback_fn(num_integrated):
+                        return num_integrated, binning
+            num_integrated += len(task_frames)
+            if len(task_binning) > len(binning):
+                binning = task_binning
+            if callback_fn is not None and not callback_fn(num_integrated):
+                break
+    finally:
+        pool.terminate()
+        pool.join()
+    return num_integrated, binning
@@ -24,20 +24,19 @@ import re
 import time
 
 import numpy as np
-from qtpy import QtCore
 from colorsys import hsv_to_rgb
 
 
-class FileNameIterator(QtCore.QObject):
+class FileNameIterator(object):
     # TODO create an File Index and then just get the next files according to this.
     # Otherwise searching a network is always to slow...
 
     def __init__(self, filename=None):
         super(FileNameIterator, self).__init__()
         self.acceptable_file_endings = []
-        self.directory_watcher = QtCore.QFileSystemWatcher()
-        self.directory_watcher.directoryChanged.connect(self.add_new_files_to_list)
         self.create_timed_file_list = False
+        # modification time of the directory, when its files were listed for the timed file list
+        self._directory_mtime = None
 
         if filename is None:
             self.complete_path = None
@@ -61,6 +60,7 @@ class FileNameIterator(QtCore.QObject):
         paths = [os.path.join(self.directory, file) for file in files]
         file_list = [(os.path.getctime(path), path) for path in paths]
         self.filename_list = paths
+        self._directory_mtime = self._get_directory_mtime()
         print("Time needed  for getting files: {0}s.".format(time.time() - t1))
         return file_list
 
@@ -167,6 +167,7 @@ class FileNameIterator(QtCore.QObject):
             return None
 
         if mode == "time":
+            self._add_new_files_if_directory_changed()
             time_stat = os.path.getctime(self.complete_path)
             cur_ind = self.ordered_file_list.index((time_stat, self.complete_path))
             # cur_ind = self.ordered_file_list.index(self.complete_path)
@@ -199,6 +200,7 @@ class FileNameIterator(QtCore.QObject):
             return None
 
         if mode == "time":
+            self._add_new_files_if_directory_changed()
             time_stat = os.path.getctime(self.complete_path)
             cur_ind = self.ordered_file_list.index((time_stat, self.complete_path))
             # cur_ind = self.ordered_file_list.index(self.complete_path)
@@ -211,6 +213,33 @@ class FileNameIterator(QtCore.QObject):
         elif mode == "number":
             return self._iterate_file_number(self.complete_path, -step, pos)
 
+    def get_next_filenames(self, num, step=1, mode="number", pos=None):
+        """
+        Returns up to num filenames following the current one without changing the position of the iterator. A
+        negative step gives the previous filenames. This is used for prefetching the files which will most likely be
+        loaded next.
+
+        :param num: maximum number of filenames
+        :param step: increment between the filenames, negative values iterate backwards
+        :param mode: 'number' or 'time', see get_next_filename
+        :param pos: position of the number in the filename, see get_next_filename
+        :return: list of existing filenames, might be shorter than num
+        """
+        complete_path = self.complete_path
+        filenames = []
+        try:
+            for _ in range(num):
+                if step > 0:
+                    filename = self.get_next_filename(step, mode=mode, pos=pos)
+                else:
+                    filename = self.get_previous_filename(-step, mode=mode, pos=pos)
+                if filename is None:
+                    break
+                filenames.append(filename)
+        finally:
+            self.complete_path = complete_path
+        return filenames
+
     def get_next_folder(self, filename=None, mec_mode=False):
         if filename is not None:
             self.complete_path = filename
@@ -235,9 +264,6 @@ class FileNameIterator(QtCore.QObject):
         except AttributeError:
             pass
         if self.directory != new_directory:
-            if self.directory is not None and self.directory != "":
-                self.directory_watcher.removePath(self.directory)
-            self.directory_watcher.addPath(new_directory)
             self.directory = new_directory
             if self.create_timed_file_list:
                 self.update_file_list()
@@ -245,6 +271,23 @@ class FileNameIterator(QtCore.QObject):
         if self.create_timed_file_list and self.ordered_file_list == []:
             self.update_file_list()
 
+    def _get_directory_mtime(self):
+        try:
+            return os.stat(self.directory).st_mtime_ns
+        except (OSError, TypeError):
+            return None
+
+    def _add_new_files_if_directory_changed(self):
+        """
+        Files created since the directory was listed are added to the timed file list before navigating in it. The
+        modification time of the directory is checked instead of watching the directory, which would need a Qt
+        event loop.
+        """
+        directory_mtime = self._get_directory_mtime()
+        if directory_mtime is not None and directory_mtime != self._directory_mtime:
+            self._directory_mtime = directory_mtime
+            self.add_new_files_to_list()
+
     def add_new_files_to_list(self):
         """
         checks for new files in folder and adds them to the sorted_file_list
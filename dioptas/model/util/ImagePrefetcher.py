@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+
+from .cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class ImagePrefetcher(object):
+    """
+    Read-ahead layer for image data. Values are read by a background thread and stored in a memory bounded LRU cache.
+    Keys are usually tuples of (filename, source, frame).
+
+    All reads - foreground and background - are serialized by a single lock, since most of the image loaders
+    (fabio, h5py) are not safe to be read concurrently from the same file object.
+    """
+
+    def __init__(self, num_prefetch=3, max_bytes=512 * 1024 ** 2, max_items=None):
+        """
+        :param num_prefetch: number of items which are read ahead in the current navigation direction
+        :param max_bytes: memory budget of the cache in bytes
+        :param max_items: maximum number of cached items, None for no limit
+        """
+        self.num_prefetch = num_prefetch
+        self.enabled = True
+
+        self._cache = LRUCache(max_items=max_items, max_bytes=max_bytes)
+        self._executor = None
+        self._futures = {}
+        self._futures_lock = threading.Lock()
+        self._read_lock = threading.RLock()
+
+        self._last_index = None
+        self._step = 1
+
+    @property
+    def max_bytes(self):
+        return self._cache.max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, value):
+        self._cache.max_bytes = value
+
+    def get(self, key, read_fn):
+        """
+        Returns the value for key, either from the cache, from a running prefetch or by calling read_fn directly.
+        :param key: hashable cache key
+        :param read_fn: function without parameters returning the value for key
+        """
+        if not self.enabled:
+            with self._read_lock:
+                return read_fn()
+
+        value = self._cache.get(key)
+        if value is not None:
+            return value
+
+        with self._futures_lock:
+            future = self._futures.get(key)
+        if future is not None and not future.cancelled():
+            try:
+                return future.result()
+            except Exception:
+                pass  # fall back to a foreground read, which will raise the error again
+
+        with self._read_lock:
+            value = read_fn()
+        self._cache.put(key, value)
+        return value
+
+    def update_direction(self, index):
+        """
+        Guesses the navigation direction and step size from the previously visited index.
+        :param index: currently visited index (frame number or file position)
+        :return: step size (negative for backward navigation)
+        """
+        if self._last_index is not None and index != self._last_index:
+            self._step = index - self._last_index
+        self._last_index = index
+        return self._step
+
+    def reset_direction(self, index=None):
+        """
+        Forgets the navigation history, the next prefetches will go forward with a step of 1.
+        :param index: optional index, which is used as starting point for guessing the next direction
+        """
+        self._last_index = index
+        self._step = 1
+
+    def discard(self, predicate):
+        """
+        Removes all cached values, whose key fulfills the predicate.
+        :param predicate: function taking a key and returning True if the value should be removed
+        """
+        with self._futures_lock:
+            for key in list(self._futures.keys()):
+                if predicate(key) and self._futures[key].cancel():
+                    del self._futures[key]
+        for key in self._cache.keys():
+            if predicate(key):
+                self._cache.pop(key)
+
+    def prefetch(self, items):
+        """
+        Schedules the background reads for the given items. Pending reads which are not in the list anymore are
+        cancelled.
+        :param items: list of (key, read_fn) tuples, ordered by priority
+        """
+        if not self.enabled or self.num_prefetch <= 0:
+            return
+
+        keys = [key for key, _ in items]
+        with self._futures_lock:
+            for key in list(self._futures.keys()):
+                if key not in keys and self._futures[key].cancel():
+                    del self._futures[key]
+
+            for key, read_fn in items:
+                if key in self._cache or key in self._futures:
+                    continue
+                self._futures[key] = self._get_executor().submit(self._read, key, read_fn)
+
+    def wait(self, timeout=None):
+        """Blocks until all scheduled reads are finished."""
+        with self._futures_lock:
+            futures = list(self._futures.values())
+        wait_futures(futures, timeout)
+
+    def clear(self):
+        """Cancels all pending reads and empties the cache."""
+        with self._futures_lock:
+            for future in self._futures.values():
+                future.cancel()
+            self._futures.clear()
+        self._cache.clear()
+        self.reset_direction()
+
+    def __contains__(self, key):
+        return key in self._cache
+
+    def _read(self, key, read_fn):
+        try:
+            with self._read_lock:
+                value = read_fn()
+            self._cache.put(key, value)
+            return value
+        except Exception as e:
+            logger.debug("Prefetching {0} failed: {1}".format(key, e))
+            raise
+        finally:
+            with self._futures_lock:
+                self._futures.pop(key, None)
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ImagePrefetcher")
+        return self._executor
@@ -59,13 +59,25 @@ class ImgCorrectionManager(object):
         self.shape = None
         self._ind = 0
 
-    def get_data(self):
+    def get_data(self, region=None):
+        """
+        :param region: (row_start, row_stop, column_start, column_stop) to only calculate a sub-array of the
+                       corrections, None for the full image
+        :return: product of all corrections or None if there are no corrections
+        """
         if len(self._corrections) == 0:
             return None
 
-        res = np.ones(self.shape)
+        if region is None:
+            res = np.ones(self.shape)
+            for key, correction in self._corrections.items():
+                res *= correction.get_data()
+            return res
+
+        row_start, row_stop, column_start, column_stop = region
+        res = np.ones((row_stop - row_start, column_stop - column_start))
         for key, correction in self._corrections.items():
-            res *= correction.get_data()
+            res *= correction.get_data()[row_start:row_stop, column_start:column_stop]
         return res
 
     def get_correction(self, name):
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import zlib
+
+import numpy as np
+from pyFAI.engines import Engine
+from pyFAI.ext.sparse_utils import CsrIntegrator
+from pyFAI.method_registry import IntegrationMethod
+from pyFAI.units import to_unit
+
+from .cache import LRUCache, replace_file
+
+logger = logging.getLogger(__name__)
+
+
+class RestoredCsrIntegrator(CsrIntegrator):
+    """
+    1D CSR integrator, which is restored from a sparse matrix saved on disk. The attributes are the ones pyFAI checks
+    before reusing an integration engine.
+    """
+
+    def __init__(self, lut, image_size, empty=0.0):
+        super(RestoredCsrIntegrator, self).__init__(lut, image_size, empty)
+        self.unit = None
+        self.size = image_size
+        self.bins = None
+        self.check_mask = False
+        self.cmask = None
+        self.mask_checksum = None
+        self.lut_checksum = None
+        self.pos0_range = None
+        self.pos1_range = None
+        self.bin_centers = None
+
+
+def mask_fingerprint(mask):
+    """
+    :param mask: boolean mask array or None
+    :return: checksum identifying the mask
+    """
+    if mask is None:
+        return None
+    mask = np.ascontiguousarray(mask, dtype=bool)
+    return mask.shape, zlib.crc32(mask.view(np.uint8))
+
+
+def geometry_fingerprint(geometry):
+    """
+    :param geometry: pyFAI geometry (AzimuthalIntegrator)
+    :return: tuple describing the geometry and the detector, which determine the pixel positions
+    """
+    detector = geometry.detector
+    corners_crc = None
+    pixel_corners = getattr(detector, "_pixel_corners", None)
+    if pixel_corners is not None:
+        corners_crc = zlib.crc32(np.ascontiguousarray(pixel_corners).view(np.uint8))
+    spline_stamp = None
+    spline_file = getattr(detector, "splineFile", None)
+    if spline_file:
+        try:
+            spline_stamp = (spline_file, os.stat(spline_file).st_mtime_ns)
+        except OSError:
+            spline_stamp = (spline_file, None)
+
+    params = [geometry.dist, geometry.poni1, geometry.poni2, geometry.rot1, geometry.rot2, geometry.rot3]
+    return (
+        tuple(float(p) for p in params),
+        float(geometry.wavelength or 0),
+        detector.__class__.__name__,
+        float(detector.pixel1),
+        float(detector.pixel2),
+        str(getattr(detector, "orientation", "")),
+        corners_crc,
+        spline_stamp,
+    )
+
+
+class IntegrationEngineCache(object):
+    """
+    Keeps the integration engines (sparse matrices) of pyFAI for recently used integration settings, so that switching
+    back to previous settings does not rebuild them. The keys need to describe everything the matrix depends on
+    (see create_key). When persistent is set, 1D CSR matrices, which are used more than once, are additionally saved
+    to the directory and are reused after a restart.
+    """
+
+    def __init__(self, max_items=8, max_bytes=2 * 1024 ** 3, directory=None, max_disk_bytes=4 * 1024 ** 3,
+                 persistent=False):
+        """
+        :param max_items: maximum number of settings kept in memory
+        :param max_bytes: memory budget for the kept matrices in bytes
+        :param directory: directory in which the matrices are saved
+        :param max_disk_bytes: maximum size of all saved matrices, the least recently used ones are deleted first
+        :param persistent: whether matrices are saved to and loaded from the directory
+        """
+        self._cache = LRUCache(max_items=max_items, max_bytes=max_bytes, size_fn=_engines_nbytes)
+        self.directory = directory
+        self.persistent = persistent
+        self.max_disk_bytes = max_disk_bytes
+        self._use_counts = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def create_key(geometry, shape, mask_checksum, unit, npt, azimuth_range=None, radial_range=None, method="csr",
+                   azimuth_npt=None):
+        """
+        Creates the cache key for an integration. Polarization and solid angle corrections are not part of the key,
+        since they are applied by pyFAI independently of the integration matrix.
+        :param mask_checksum: fingerprint of the integration mask (see mask_fingerprint)
+        """
+        return (
+            geometry_fingerprint(geometry),
+            tuple(shape),
+            mask_checksum,
+            str(unit),
+            int(npt),
+            None if azimuth_npt is None else int(azimuth_npt),
+            None if azimuth_range is None else tuple(float(v) for v in azimuth_range),
+            None if radial_range is None else tuple(float(v) for v in radial_range),
+            str(method),
+        )
+
+    def activate(self, geometry, key, previous_key=None):
+        """
+        Prepares the engines of the geometry for an integration with the given key. When the key changed, engines
+        built for other settings are removed from the geometry (without being destroyed, they are still cached) and
+        the cached engines for key are installed if available.
+        :param geometry: pyFAI AzimuthalIntegrator
+        :param key: key created by create_key
+        :param previous_key: key of the last integration performed with this geometry
+        :return: key
+        """
+        if key != previous_key:
+            with geometry._lock:
+                geometry.engines.clear()
+
+        engines = self._cache.get(key)
+        if engines is None:
+            engines = self._load(key)
+            if engines is not None:
+                self._cache.put(key, engines)
+        if engines is not None:
+            for method, engine in engines.items():
+                current = geometry.engines.get(method)
+                if current is None or current.engine is not engine:
+                    geometry.engines[method] = Engine(engine)
+        return key
+
+    def store(self, geometry, key):
+        """
+        Stores the engines of the geometry after an integration with the given key.
+        """
+        engines = {method: wrapper.engine for method, wrapper in list(geometry.engines.items())
+                   if wrapper.engine is not None}
+        if not engines:
+            return
+        self._cache.put(key, engines)
+
+        with self._lock:
+            self._use_counts[key] = self._use_counts.get(key, 0) + 1
+            use_count = self._use_counts[key]
+        if use_count == 2:  # only settings which are used repeatedly are worth being saved
+            self._save(key, engines)
+
+    def clear(self):
+        self._cache.clear()
+        with self._lock:
+            self._use_counts.clear()
+
+    def clear_disk(self):
+        """
+        Deletes all matrices saved in the directory.
+        """
+        if self.directory is None or not os.path.isdir(self.directory):
+            return
+        for filename in os.listdir(self.directory):
+            if filename.endswith(".npz"):
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except OSError as e:
+                    logger.debug("Could not delete the saved integration matrix {}: {}".format(filename, e))
+
+    def __contains__(self, key):
+        return key in self._cache
+
+    def _get_filename(self, key):
+        if not self.persistent or self.directory is None:
+            return None
+        return os.path.join(self.directory, hashlib.sha1(repr(key).encode()).hexdigest() + ".npz")
+
+    def _save(self, key, engines):
+        filename = self._get_filename(key)
+        if filename is None or os.path.exists(filename):
+            return
+        for method, engine in engines.items():
+            if method.dimension == 1 and method.algo_lower == "csr" and method.impl_lower == "cython":
+                break
+        else:
+            return
+
+        meta = {
+            "method": [method.dimension, method.split_lower, method.algo_lower, method.impl_lower],
+            "unit": str(engine.unit),
+            "bins": int(engine.bins),
+            "size": int(engine.size),
+            "empty": float(engine.empty),
+            "check_mask": bool(engine.check_mask),
+            "mask_checksum": None if engine.mask_checksum is None else int(engine.mask_checksum),
+            "lut_checksum": None if engine.lut_checksum is None else int(engine.lut_checksum),
+            "pos0_range": None if engine.pos0_range is None else list(engine.pos0_range),
+            "pos1_range": None if engine.pos1_range is None else list(engine.pos1_range),
+        }
+        arrays = {
+            "data": np.asarray(engine.data),
+            "indices": np.asarray(engine.indices),
+            "indptr": np.asarray(engine.indptr),
+            "bin_centers": np.asarray(engine.bin_centers),
+        }
+        if engine.cmask is not None:
+            arrays["cmask"] = np.packbits(np.asarray(engine.cmask).astype(bool))
+
+        try:
+            replace_file(filename, lambda temp_filename: np.savez(temp_filename, meta=json.dumps(meta), **arrays),
+                         suffix=".npz")
+        except OSError as e:
+            logger.debug("Could not save the integration matrix: {}".format(e))
+            return
+        self._limit_disk_usage()
+
+    def _load(self, key):
+        filename = self._get_filename(key)
+        if filename is None or not os.path.exists(filename):
+            return None
+        try:
+            with np.load(filename) as f:
+                meta = json.loads(str(f["meta"]))
+                engine = RestoredCsrIntegrator((f["data"], f["indices"], f["indptr"]), meta["size"], meta["empty"])
+                engine.bin_centers = f["bin_centers"]
+                if "cmask" in f:
+                    engine.cmask = np.unpackbits(f["cmask"], count=meta["size"]).astype(np.int8)
+            os.utime(filename)
+        except (OSError, KeyError, ValueError) as e:
+            logger.debug("Could not load the integration matrix {}: {}".format(filename, e))
+            return None
+
+        engine.unit = to_unit(meta["unit"])
+        engine.bins = meta["bins"]
+        engine.check_mask = meta["check_mask"]
+        engine.mask_checksum = meta["mask_checksum"]
+        engine.lut_checksum = meta["lut_checksum"]
+        engine.pos0_range = None if meta["pos0_range"] is None else tuple(meta["pos0_range"])
+        engine.pos1_range = None if meta["pos1_range"] is None else tuple(meta["pos1_range"])
+        method = IntegrationMethod.select_method(*meta["method"])[0]
+        return {method: engine}
+
+    def _limit_disk_usage(self):
+        try:
+            # temporary files of matrices, which are currently saved, are hidden
+            files = [os.path.join(self.directory, f) for f in os.listdir(self.directory)
+                     if f.endswith(".npz") and not f.startswith(".")]
+            files = sorted(files, key=os.path.getmtime, reverse=True)
+            total = 0
+            for filename in files:
+                total += os.path.getsize(filename)
+                if total > self.max_disk_bytes:
+                    os.remove(filename)
+        except OSError as e:
+            logger.debug("Could not clean up the saved integration matrices: {}".format(e))
+
+
+def _engines_nbytes(engines):
+    nbytes = 0
+    for engine in engines.values():
+        lut_nbytes = getattr(engine, "lut_nbytes", None)
+        if lut_nbytes is not None:
+            nbytes += int(lut_nbytes)
+            continue
+        for name in ("data", "indices", "indptr"):
+            try:
+                nbytes += np.asarray(getattr(engine, name)).nbytes
+            except (AttributeError, TypeError):
+                pass
+    return nbytes
+
+
+# saving the matrices to disk needs to be enabled (in the integration options or with the environment variable),
+# spawned batch integration workers only save them when the environment variable is set
+integration_engine_cache = IntegrationEngineCache(
+    directory=os.path.join(os.path.expanduser("~"), ".Dioptas", "integration_engines"),
+    persistent=os.environ.get("DIOPTAS_PERSISTENT_INTEGRATION_ENGINES", "0") == "1",
+)
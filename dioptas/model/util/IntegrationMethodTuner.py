@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from .cache import replace_file
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTEGRATION_METHOD = "csr"
+CANDIDATE_METHODS = ("csr", "lut", "splitbbox", "nosplit_csr", "full_csr")
+
+
+class IntegrationMethodTuner(object):
+    """
+    Remembers the fastest integration method of pyFAI per detector, image shape and number of points. The choices are
+    saved to a json file, so that they are used after a restart and by batch processing.
+    """
+
+    def __init__(self, filename=None):
+        """
+        :param filename: path of the json file the tuned methods are saved to, None to keep them only in memory
+        """
+        self.filename = filename
+        self._methods = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def create_key(detector, img_shape, num_points, azimuth_points=None):
+        """
+        :param detector: pyFAI detector
+        :param img_shape: shape of the integrated image
+        :param num_points: number of radial points
+        :param azimuth_points: number of azimuthal points of a cake, None for a 1D integration
+        :return: string identifying the integration setting
+        """
+        npt = "{}".format(int(num_points))
+        if azimuth_points is not None:
+            npt += "x{}".format(int(azimuth_points))
+        return "{} ({:g}x{:g} um)|{}x{}|{}".format(
+            detector.name, detector.pixel1 * 1e6, detector.pixel2 * 1e6, int(img_shape[0]), int(img_shape[1]), npt
+        )
+
+    def get(self, key, default=DEFAULT_INTEGRATION_METHOD):
+        """
+        :param key: key created by create_key
+        :return: tuned method for the key or default if it was not tuned yet
+        """
+        with self._lock:
+            return self._get_methods().get(key, default)
+
+    def put(self, key, method):
+        with self._lock:
+            self._get_methods()[key] = method
+            self._save()
+
+    def clear(self):
+        with self._lock:
+            self._methods = {}
+            self._save()
+
+    def _get_methods(self):
+        if self._methods is None:
+            self._methods = {}
+            if self.filename is not None and os.path.exists(self.filename):
+                try:
+                    with open(self.filename, "r") as f:
+                        self._methods = json.load(f)
+                except (OSError, ValueError):
+                    logger.debug("Could not read the tuned integration methods {}".format(self.filename))
+        return self._methods
+
+    def _save(self):
+        if self.filename is None:
+            return
+        def write(temp_filename):
+            with open(temp_filename, "w") as f:
+                json.dump(self._methods, f, indent=1)
+
+        try:
+            replace_file(self.filename, write)
+        except OSError:
+            logger.debug("Could not write the tuned integration methods {}".format(self.filename))
+
+
+def benchmark_methods(integrate, candidates=CANDIDATE_METHODS, repeats=3, tolerance=1e-2):
+    """
+    Measures the time of an integration with each candidate method. Every method is used once before the measurement,
+    so that the building of its integration engine is not part of the time. The results are compared to the ones of
+    the first working candidate, methods whose results deviate by more than tolerance are not eligible.
+    :param integrate: function(method) returning x, y of the integration, y is 1D for patterns or 2D (azimuth x
+                      radial) for cakes
+    :param candidates: integration methods to benchmark
+    :param repeats: number of timed integrations per method, the fastest one counts
+    :param tolerance: maximum relative root mean square deviation from the results of the reference method
+    :return: dictionary with the time per integration in s for each candidate, None for methods which failed or deviate
+    """
+    timings = {}
+    reference = reference_method = None
+    for method in candidates:
+        try:
+            x, y = integrate(method)
+            durations = []
+            for _ in range(max(repeats, 1)):
+                t1 = time.perf_counter()
+                integrate(method)
+                durations.append(time.perf_counter() - t1)
+        except Exception as e:
+            logger.info("Integration method {} is not available: {}".format(method, e))
+            timings[method] = None
+            continue
+
+        if reference is None:
+            reference, reference_method = (x, y), method
+        elif relative_deviation(reference, (x, y)) > tolerance:
+            logger.info("Results of integration method {} deviate from the ones of {}.".format(method, reference_method))
+            timings[method] = None
+            continue
+        timings[method] = min(durations)
+    return timings
+
+
+def relative_deviation(reference, result):
+    """
+    Relative root mean square deviation of an integration result from a reference. The result is interpolated onto the
+    radial positions of the reference, since the methods may bin slightly different radial ranges.
+    :param reference: x, y of the reference integration
+    :param result: x, y of the compared integration
+    :return: deviation relative to the root mean square of the reference
+    """
+    x_ref, y_ref = np.asarray(reference[0]), np.atleast_2d(reference[1])
+    x, y = np.asarray(result[0]), np.atleast_2d(result[1])
+    if y.shape[0] != y_ref.shape[0]:
+        return np.inf
+    interpolated = np.array([np.interp(x_ref, x, row) for row in y])
+    norm = np.sqrt(np.mean(y_ref.astype(np.float64) ** 2))
+    if norm == 0:
+        return 0.0 if np.all(interpolated == 0) else np.inf
+    return float(np.sqrt(np.mean((interpolated - y_ref) ** 2)) / norm)
+
+
+integration_method_tuner = IntegrationMethodTuner(
+    os.path.join(os.path.expanduser("~"), ".Dioptas", "integration_methods.json")
+)
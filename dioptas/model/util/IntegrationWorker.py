@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+
+logger = logging.getLogger(__name__)
+
+
+class IntegrationWorker(object):
+    """
+    Integrates images in a background thread, so that the GUI does not freeze on slow integrations. Jobs are coalesced
+    per key with "latest wins": submitting a job cancels the waiting job of the same key and discards the result of the
+    running one, so frames which were already skipped by the user are not integrated (or not shown).
+
+    The results are applied by the dispatch function, which has to call the function it gets in the GUI thread (e.g.
+    through a queued Qt signal). Without a dispatch function the results are applied directly in the worker thread.
+    """
+
+    def __init__(self, dispatch=None):
+        """
+        :param dispatch: function taking a function without parameters, which it calls in the GUI thread
+        """
+        self.dispatch = dispatch if dispatch is not None else _call
+        self._generations = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def submit(self, key, job):
+        """
+        Schedules a job, which supersedes all previously submitted jobs with the same key.
+        :param key: hashable key identifying what is integrated (e.g. a configuration)
+        :param job: function taking a function is_cancelled(), which returns True once the job is superseded, and
+                    returning a function without parameters, which applies the result (or None for no result)
+        """
+        with self._lock:
+            generation = self._cancel(key)
+            self._futures[key] = self._get_executor().submit(self._run, key, generation, job)
+
+    def cancel(self, key):
+        """
+        Cancels the waiting job of the key and discards the result of the running one.
+        """
+        with self._lock:
+            self._cancel(key)
+
+    def wait(self, timeout=None):
+        """Blocks until all submitted jobs are finished."""
+        with self._lock:
+            futures = list(self._futures.values())
+        wait_futures(futures, timeout)
+
+    def _cancel(self, key):
+        generation = self._generations.get(key, 0) + 1
+        self._generations[key] = generation
+        future = self._futures.pop(key, None)
+        if future is not None:
+            future.cancel()
+        return generation
+
+    def _is_current(self, key, generation):
+        with self._lock:
+            return self._generations.get(key) == generation
+
+    def _run(self, key, generation, job):
+        def is_cancelled():
+            return not self._is_current(key, generation)
+
+        try:
+            if is_cancelled():
+                return
+            try:
+                apply_result = job(is_cancelled)
+            except Exception as e:
+                if is_cancelled():
+                    logger.debug("Superseded integration failed: {}".format(e))
+                    return
+                # the error is raised again in the GUI thread, where it is handled like any other error
+                apply_result = functools.partial(_raise, e)
+
+            if apply_result is not None and not is_cancelled():
+                self.dispatch(functools.partial(self._apply, key, generation, apply_result))
+        finally:
+            with self._lock:
+                if self._generations.get(key) == generation:
+                    self._futures.pop(key, None)
+
+    def _apply(self, key, generation, apply_result):
+        # a newer job might have been submitted while the result was dispatched
+        if self._is_current(key, generation):
+            apply_result()
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="IntegrationWorker")
+        return self._executor
+
+
+def _call(fn):
+    fn()
+
+
+def _raise(error):
+    raise error
@@ -19,20 +19,19 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import sys
 import time
 import threading
 
 import queue
 
-from qtpy import QtCore
-
 from watchdog.observers import Observer
 from watchdog.events import PatternMatchingEventHandler
 
 from . import Signal
 
 
-class NewFileInDirectoryWatcher(QtCore.QObject):
+class NewFileInDirectoryWatcher(object):
     """
     This class watches a given filepath for any new files with a given file extension added to it.
 
@@ -43,12 +42,10 @@ class NewFileInDirectoryWatcher(QtCore.QObject):
         watcher = NewFileInDirectoryWatcher(example_path, file_types = ['.tif', '.tiff'])
         watcher.file_added.connect(callback_fcn)
 
+    Inside of a Qt application the file_added signal is emitted in the Qt main thread, otherwise in the thread of the
+    watcher.
     """
 
-    _file_added_qt = QtCore.Signal(
-        str
-    )  # used internally for inside of an qt application to avoid thread problems
-
     def __init__(self, path=None, file_types=None, activate=False):
         """
         :param path: path to folder which will be watched
@@ -76,7 +73,8 @@ class NewFileInDirectoryWatcher(QtCore.QObject):
             self.activate()
 
         self.file_added = Signal(str)  # to be used signal from outside
-        self._file_added_qt.connect(self.file_added.emit)
+        # used internally for inside of an qt application to avoid thread problems
+        self._qt_bridge = _create_qt_bridge(self.file_added.emit)
         self.filepath_queue = queue.Queue()
 
     def on_file_created(self, event):
@@ -140,8 +138,8 @@ class NewFileInDirectoryWatcher(QtCore.QObject):
                 time.sleep(0.05)
                 continue
 
-            if QtCore.QCoreApplication.instance() is not None:
-                self._file_added_qt.emit(file_path)
+            if self._qt_bridge is not None and self._qt_bridge.application_is_running():
+                self._qt_bridge.file_added.emit(file_path)
             else:
                 self.file_added.emit(file_path)
 
@@ -149,3 +147,33 @@ class NewFileInDirectoryWatcher(QtCore.QObject):
         """Stop the observer thread when the object is deleted."""
         self.deactivate()
         self.file_added.clear()
+
+
+_QtBridge = None
+
+
+def _create_qt_bridge(callback):
+    """
+    Creates a QObject, whose file_added Qt signal calls the callback in the Qt main thread. Qt is not imported here:
+    the bridge is only created when Qt was already imported (by the GUI), so the watcher also works without Qt.
+    :return: the bridge or None
+    """
+    global _QtBridge
+    QtCore = sys.modules.get("qtpy.QtCore")
+    if QtCore is None:
+        return None
+
+    if _QtBridge is None:
+
+        class QtBridge(QtCore.QObject):
+            file_added = QtCore.Signal(str)
+
+            @staticmethod
+            def application_is_running():
+                return QtCore.QCoreApplication.instance() is not None
+
+        _QtBridge = QtBridge
+
+    bridge = _QtBridge()
+    bridge.file_added.connect(callback)
+    return bridge
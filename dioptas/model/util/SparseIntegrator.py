@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+import scipy.sparse
+
+# maximum number of pixels of all frames, which are integrated in one sparse matrix product (256 MB in float32)
+STACK_BLOCK_PIXELS = 2 ** 26
+
+
+class SparseIntegrator(object):
+    """
+    CSR integration matrix of pyFAI applied directly with scipy. The matrix of a supersampled geometry is folded onto
+    the pixels of the original image (the contributions of all sub-pixels are summed), so supersampling only costs
+    building the matrix once and images are integrated in their original resolution. The normalization (solid angle
+    and polarization) is integrated only once.
+    """
+
+    def __init__(self, engine, img_shape, factor=1, normalization=None):
+        """
+        :param engine: CSR integration engine of pyFAI (with data, indices and indptr) built for the supersampled image,
+                       masked pixels are already excluded from its matrix
+        :param img_shape: shape of the original image
+        :param factor: supersampling factor of the geometry the engine was built for
+        :param normalization: array in the supersampled shape, by which the intensities are divided (e.g. solid angle
+                              times polarization), None for no normalization
+        """
+        self.img_shape = tuple(img_shape)
+        self.num_pixels = self.img_shape[0] * self.img_shape[1]
+        data = np.asarray(engine.data)
+        indices = np.asarray(engine.indices)
+        indptr = np.asarray(engine.indptr)
+        self.num_bins = len(indptr) - 1
+        shape = (self.num_bins, self.num_pixels)
+
+        if normalization is None:
+            normalization_data = data
+        else:
+            normalization_data = data * np.asarray(normalization, dtype=np.float32).ravel()[indices]
+        normalization_matrix = scipy.sparse.csr_matrix(
+            (normalization_data, indices, indptr), shape=(self.num_bins, self.num_pixels * factor ** 2)
+        )
+        self._set_normalization_sum(np.asarray(normalization_matrix.sum(axis=1), dtype=np.float64).ravel())
+
+        if factor > 1:
+            # the sub-pixels of a pixel become duplicate entries of a row, which are summed. The data is copied, since
+            # it is shared with the engine of pyFAI and summing the duplicates sorts it in place
+            indices = fold_supersampled_indices(indices, self.img_shape, factor)
+            self.matrix = scipy.sparse.csr_matrix((data, indices, indptr), shape=shape, copy=True)
+            self.matrix.sum_duplicates()
+        else:
+            # the arrays are shared with the engine of pyFAI
+            self.matrix = scipy.sparse.csr_matrix((data, indices, indptr), shape=shape)
+
+    def _set_normalization_sum(self, normalization_sum):
+        self.normalization_sum = normalization_sum
+        self.scale = np.zeros(self.num_bins, dtype=np.float32)
+        valid = self.normalization_sum != 0
+        self.scale[valid] = 1.0 / self.normalization_sum[valid]
+
+    @property
+    def nbytes(self):
+        return self.matrix.data.nbytes + self.matrix.indices.nbytes + self.matrix.indptr.nbytes
+
+    def integrate(self, img_data):
+        """
+        :param img_data: image in the original shape
+        :return: normalized intensity of every bin
+        """
+        return (self.matrix @ np.asarray(img_data).ravel()) * self.scale
+
+    def integrate_cake_and_pattern(self, img_data, azimuth_points):
+        """
+        Integrates an image into the bins of a 2D (cake) matrix and derives the 1D pattern from the summed signal and
+        normalization of all azimuthal bins of each radial bin, both in a single pass over the image.
+        :param img_data: image in the original shape
+        :param azimuth_points: number of azimuthal bins per radial bin (the bins are ordered radial major)
+        :return: normalized intensity of every cake bin, normalized intensity of every radial bin
+        """
+        signal = self.matrix @ np.asarray(img_data).ravel()
+        radial_signal = signal.reshape(-1, azimuth_points).sum(axis=1, dtype=np.float64)
+        radial_normalization = self.normalization_sum.reshape(-1, azimuth_points).sum(axis=1)
+
+        pattern = np.zeros(len(radial_signal), dtype=np.float32)
+        valid = radial_normalization != 0
+        pattern[valid] = radial_signal[valid] / radial_normalization[valid]
+        return signal * self.scale, pattern
+
+    def sum_azimuthal_bins(self, azimuth_points, sector_bins):
+        """
+        Creates an integrator for azimuthal sectors from this integrator of a cake. Signal and normalization of the
+        azimuthal bins of every sector are summed, so the sectors are integrated with a single sparse matrix product.
+        :param azimuth_points: number of azimuthal bins per radial bin of the cake (the bins are ordered radial major)
+        :param sector_bins: (n_sectors x 2) array with the first and last + 1 azimuthal bin of every sector
+        :return: SparseIntegrator, whose bins are ordered sector major (n_sectors x radial bins)
+        """
+        radial_points = self.num_bins // azimuth_points
+        rows, columns = [], []
+        for sector, (start, stop) in enumerate(sector_bins):
+            radial, azimuthal = np.meshgrid(np.arange(radial_points), np.arange(start, stop), indexing="ij")
+            rows.append((sector * radial_points + radial).ravel())
+            columns.append((radial * azimuth_points + azimuthal).ravel())
+        rows = np.concatenate(rows)
+        columns = np.concatenate(columns)
+        summation = scipy.sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, columns)),
+            shape=(len(sector_bins) * radial_points, self.num_bins),
+        )
+
+        integrator = SparseIntegrator.__new__(SparseIntegrator)
+        integrator.img_shape = self.img_shape
+        integrator.num_pixels = self.num_pixels
+        integrator.num_bins = summation.shape[0]
+        integrator.matrix = (summation @ self.matrix).tocsr()
+        integrator._set_normalization_sum(summation @ self.normalization_sum)
+        return integrator
+
+    def crop(self, region):
+        """
+        Creates an integrator for the sub-array of the image given by region, which integrates the cropped image
+        instead of the full one. All pixels outside of the region need to be excluded from the matrix (masked).
+        :param region: (row_start, row_stop, column_start, column_stop) of the sub-array
+        :return: SparseIntegrator for images in the shape of the region
+        """
+        row_start, row_stop, column_start, column_stop = region
+        shape = (row_stop - row_start, column_stop - column_start)
+        rows, columns = np.divmod(self.matrix.indices, self.img_shape[1])
+        if np.any((rows < row_start) | (rows >= row_stop) | (columns < column_start) | (columns >= column_stop)):
+            raise ValueError("The integration matrix contains pixels outside of the region.")
+
+        integrator = SparseIntegrator.__new__(SparseIntegrator)
+        integrator.img_shape = shape
+        integrator.num_pixels = shape[0] * shape[1]
+        integrator.num_bins = self.num_bins
+        indices = ((rows - row_start) * shape[1] + columns - column_start).astype(np.int32)
+        integrator.matrix = scipy.sparse.csr_matrix(
+            (self.matrix.data, indices, self.matrix.indptr), shape=(self.num_bins, integrator.num_pixels)
+        )
+        integrator.normalization_sum = self.normalization_sum
+        integrator.scale = self.scale
+        return integrator
+
+    def integrate_stack(self, frames, background=None, corrections=None, factor=1):
+        """
+        Integrates a stack of frames in blocks with one sparse matrix product per block.
+        :param frames: 3d array (n_frames, rows, columns)
+        :param background: image (or value) subtracted from every frame
+        :param corrections: image every frame is divided by
+        :param factor: factor every frame is multiplied with
+        :return: 2d array (n_frames, n_bins)
+        """
+        signal_matrix = self.matrix
+        if corrections is not None:
+            weights = 1.0 / np.asarray(corrections, dtype=np.float32).reshape(1, -1)
+            signal_matrix = signal_matrix.multiply(weights)
+        signal_matrix = signal_matrix.T.tocsr()
+
+        offset = None
+        if background is not None:
+            background = np.broadcast_to(np.asarray(background, dtype=np.float32), self.img_shape)
+            offset = background.reshape(1, -1) @ signal_matrix
+
+        scale = self.scale * factor
+        intensities = np.empty((len(frames), self.num_bins), dtype=np.float32)
+        block_size = max(1, STACK_BLOCK_PIXELS // self.num_pixels)
+        for start in range(0, len(frames), block_size):
+            block = np.asarray(frames[start:start + block_size])
+            block = block.reshape(len(block), self.num_pixels).astype(np.float32, copy=False)
+            summed = block @ signal_matrix
+            if offset is not None:
+                summed -= offset
+            intensities[start:start + len(block)] = summed * scale
+        return intensities
+
+
+def fold_supersampled_indices(indices, img_shape, factor):
+    """
+    Maps the pixel indices of a supersampled image onto the indices of the pixels of the original image, which
+    contain the sub-pixels.
+    :param indices: flat pixel indices in the supersampled image
+    :param img_shape: shape of the original image
+    :param factor: supersampling factor
+    :return: flat pixel indices in the original image
+    """
+    supersampled_width = img_shape[1] * factor
+    rows = indices // supersampled_width // factor
+    columns = indices % supersampled_width // factor
+    return (rows * img_shape[1] + columns).astype(np.int32)
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def nbytes_of(value):
+    """
+    Estimates the memory footprint of a cached value in bytes. Numpy arrays report their buffer size, dictionaries
+    and lists are summed up recursively and everything else is counted as 0 bytes.
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(nbytes_of(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(nbytes_of(v) for v in value)
+    return 0
+
+
+class LRUCache(object):
+    """
+    Thread-safe least recently used cache, bounded by the number of items and/or by the total memory size of the
+    stored values (estimated by size_fn). The least recently used items are evicted first.
+    """
+
+    def __init__(self, max_items=None, max_bytes=None, size_fn=nbytes_of):
+        """
+        :param max_items: maximum number of items in the cache, None for no limit
+        :param max_bytes: maximum total size in bytes of the cached values, None for no limit
+        :param size_fn: function returning the size in bytes of a value
+        """
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._size_fn = size_fn
+        self._items = OrderedDict()
+        self._sizes = {}
+        self._total_bytes = 0
+        self._lock = threading.RLock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._items.move_to_end(key)
+                return self._items[key]
+            except KeyError:
+                return default
+
+    def put(self, key, value):
+        size = self._size_fn(value)
+        with self._lock:
+            if key in self._items:
+                self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._items[key] = value
+            self._sizes[key] = size
+            self._total_bytes += size
+            self._evict()
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                return default
+            value = self._items[key]
+            self._remove(key)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._sizes.clear()
+            self._total_bytes = 0
+
+    def keys(self):
+        with self._lock:
+            return list(self._items.keys())
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def _remove(self, key):
+        del self._items[key]
+        self._total_bytes -= self._sizes.pop(key)
+
+    def _evict(self):
+        while len(self._items) and (
+            (self.max_items is not None and len(self._items) > self.max_items)
+            or (self.max_bytes is not None and self._total_bytes > self.max_bytes)
+        ):
+            self._remove(next(iter(self._items)))
+
+
+class PersistentFileIndex(object):
+    """
+    Persistent index of information extracted from files (e.g. the image sources of hdf5 files), which is expensive to
+    obtain. Entries are stored per absolute path together with the size and modification time of the file and are only
+    valid as long as both did not change. Values need to be json serializable.
+
+    Changes are saved at most every save_interval seconds and when the program exits (see flush). The changed entries
+    are merged into the current content of the file, so several processes can share the same index.
+    """
+
+    def __init__(self, filename=None, max_entries=1000, save_interval=10.0):
+        """
+        :param filename: path of the json file the index is saved to, None to keep the index only in memory
+        :param max_entries: maximum number of indexed files, the oldest entries are removed first
+        :param save_interval: minimum time in s between two saves of the index
+        """
+        self.filename = filename
+        self.max_entries = max_entries
+        self.save_interval = save_interval
+        self._entries = None
+        self._changed = {}
+        self._last_save = None
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def get(self, path, stamp=None):
+        """
+        :param path: path of the indexed file
+        :param stamp: current stamp of the file (see file_stamp), None to read it
+        :return: stored value or None if the file is not indexed or has changed since
+        """
+        if stamp is None:
+            stamp = file_stamp(path)
+        if stamp is None:
+            return None
+        with self._lock:
+            entry = self._get_entries().get(os.path.abspath(path))
+        if entry is None or [entry["size"], entry["mtime_ns"]] != list(stamp):
+            return None
+        return entry.get("value")
+
+    def put(self, path, value):
+        stamp = file_stamp(path)
+        if stamp is None:
+            return
+        self.put_many([(path, stamp, value)])
+
+    def put_many(self, entries):
+        """
+        Stores the values of several files.
+        :param entries: list of (path, stamp of the file when the value was obtained (see file_stamp), value)
+        """
+        with self._lock:
+            index_entries = self._get_entries()
+            for path, stamp, value in entries:
+                key = os.path.abspath(path)
+                entry = {"size": stamp[0], "mtime_ns": stamp[1], "value": value}
+                index_entries.pop(key, None)
+                index_entries[key] = entry
+                self._changed[key] = entry
+            self._limit_entries(index_entries)
+            if self._last_save is None or time.monotonic() - self._last_save >= self.save_interval:
+                self._save()
+
+    def flush(self):
+        """Saves the entries changed since the last save."""
+        with self._lock:
+            if self._changed:
+                self._save()
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._changed = {}
+            self._write(self._entries)
+
+    def _get_entries(self):
+        if self._entries is None:
+            self._entries = self._read()
+        return self._entries
+
+    def _limit_entries(self, entries):
+        while len(entries) > self.max_entries:
+            del entries[next(iter(entries))]
+
+    def _read(self):
+        if self.filename is None or not os.path.exists(self.filename):
+            return {}
+        try:
+            with open(self.filename, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            logger.debug("Could not read the file index {}".format(self.filename))
+            return {}
+
+    def _save(self):
+        self._last_save = time.monotonic()
+        entries = self._read() if self.filename is not None else self._get_entries()
+        for key, entry in self._changed.items():
+            entries.pop(key, None)
+            entries[key] = entry
+        self._limit_entries(entries)
+        self._entries = entries
+        self._changed = {}
+        self._write(entries)
+
+    def _write(self, entries):
+        if self.filename is None:
+            return
+
+        def write(temp_filename):
+            with open(temp_filename, "w") as f:
+                json.dump(entries, f)
+
+        try:
+            replace_file(self.filename, write)
+        except OSError:
+            logger.debug("Could not write the file index {}".format(self.filename))
+
+
+def replace_file(filename, write_fn, suffix=".tmp"):
+    """
+    Writes a file through a uniquely named temporary file in the same directory, which then replaces the file. Several
+    processes writing the same file (e.g. sharing the same home directory) therefore never mix their content.
+    :param filename: path of the written file
+    :param write_fn: function writing the content to the path of the temporary file given as parameter
+    :param suffix: suffix of the temporary file (e.g. ".npz" for numpy, which otherwise appends it)
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_filename = tempfile.mkstemp(
+        dir=directory, prefix="." + os.path.basename(filename) + ".", suffix=suffix
+    )
+    os.close(fd)
+    try:
+        write_fn(temp_filename)
+        os.replace(temp_filename, filename)
+    except BaseException:
+        try:
+            os.remove(temp_filename)
+        except OSError:
+            pass
+        raise
+
+
+def file_stamp(path):
+    """
+    :return: tuple of (size, modification time in ns) of the file or None if it does not exist
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
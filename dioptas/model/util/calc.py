@@ -53,16 +53,28 @@ def convert_units(value, wavelength, previous_unit, new_unit):
     return res
 
 
+def get_binning_unit(unit):
+    """
+    Returns the unit in which patterns of the given unit are binned. Patterns in d are integrated with bins in 2θ and
+    converted afterwards, so switching between 2θ and d only transforms the x-axis.
+    :param unit: possible values are '2th_deg', 'q_A^-1', 'd_A'
+    :return: '2th_deg' for d_A, otherwise the unit itself
+    """
+    if unit == 'd_A':
+        return '2th_deg'
+    return unit
+
+
 def supersample_image(img_data, factor):
     """
     Creates a supersampled array from img_data.
     :param img_data: image array
     :param factor: int - supersampling factor
-    :return: supersampled image
+    :return: supersampled image with the same dtype as img_data
     """
     if factor > 1:
-        img_data_supersampled = np.zeros((img_data.shape[0] * factor,
-                                          img_data.shape[1] * factor))
+        img_data_supersampled = np.empty((img_data.shape[0] * factor,
+                                          img_data.shape[1] * factor), dtype=img_data.dtype)
         for row in range(factor):
             for col in range(factor):
                 img_data_supersampled[row::factor, col::factor] = img_data
@@ -84,3 +96,52 @@ def trim_trailing_zeros(x, y):
     x_trim = x[:len(y_trim)]
 
     return x_trim, y_trim
+
+
+def trim_trailing_zero_columns(x, intensities):
+    """
+    Trims the trailing points of a stack of patterns, which are zero in all patterns. Like for trim_trailing_zeros of
+    the single patterns and padding them to the longest one again, nothing is trimmed if one of the patterns sums up
+    to 0.
+    :param x: x-values (n_points)
+    :param intensities: y-values (n_patterns x n_points)
+    :return: trimmed x, intensities as tuple
+    """
+    if len(intensities) == 0 or np.any(np.sum(intensities, axis=1) == 0):
+        return x, intensities
+    non_zero = np.flatnonzero(np.any(intensities != 0, axis=0))
+    num_points = non_zero[-1] + 1
+    return x[:num_points], intensities[:, :num_points]
+
+
+def create_sector_edges(num_sectors, azimuth_range=(-180, 180)):
+    """
+    :param num_sectors: number of azimuthal sectors
+    :param azimuth_range: azimuthal range (in degrees) divided into the sectors
+    :return: num_sectors + 1 equally spaced sector edges
+    """
+    return np.linspace(azimuth_range[0], azimuth_range[1], int(num_sectors) + 1)
+
+
+def get_sector_bins(sector_edges, resolution=1e-3, max_bins=7200):
+    """
+    Finds the coarsest equally spaced azimuthal binning on which all sector edges lie, so that sectors of different
+    widths can be integrated by summing the bins of a single cake.
+    :param sector_edges: increasing sector edges in degrees
+    :param resolution: precision of the sector edges in degrees
+    :param max_bins: maximum number of azimuthal bins
+    :return: number of azimuthal bins, (n_sectors x 2) array with the first and last + 1 bin of every sector
+    """
+    sector_edges = np.asarray(sector_edges, dtype=np.float64)
+    if sector_edges.ndim != 1 or len(sector_edges) < 2 or np.any(np.diff(sector_edges) <= 0):
+        raise ValueError("The sector edges need to be at least two increasing values.")
+    if sector_edges[0] < -180 or sector_edges[-1] > 180:
+        raise ValueError("The sector edges need to be within -180° and 180°.")
+
+    steps = np.round((sector_edges - sector_edges[0]) / resolution).astype(np.int64)
+    bin_steps = np.gcd.reduce(np.diff(steps))
+    edge_bins = steps // bin_steps
+    num_bins = int(edge_bins[-1])
+    if num_bins > max_bins:
+        raise ValueError("The sector edges need {} azimuthal bins, at most {} are possible.".format(num_bins, max_bins))
+    return num_bins, np.stack((edge_bins[:-1], edge_bins[1:]), axis=1)
@@ -18,6 +18,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import importlib
 import weakref
 import pytest
 from qtpy import QtCore, QtWidgets
@@ -36,10 +37,41 @@ from dioptas.controller.integration import (
 from dioptas.controller.integration.ImageController import ImageController
 
 from dioptas.model.DioptasModel import DioptasModel
+from dioptas.model.loader import FabioLoader, hdf5Loader
+from dioptas.model.util.IntegrationEngineCache import integration_engine_cache
+from dioptas.model.util.IntegrationMethodTuner import integration_method_tuner
 from dioptas.widgets.integration import IntegrationWidget
 from dioptas.widgets.CalibrationWidget import CalibrationWidget
 
 
+@pytest.fixture(autouse=True)
+def persistent_caches(tmp_path_factory, monkeypatch):
+    """Points the persistent caches and indexes, which are saved in ~/.Dioptas, to a temporary directory"""
+    home_path = tmp_path_factory.mktemp("home")
+    # e.g. for spawned worker processes
+    monkeypatch.setenv("HOME", str(home_path))
+    monkeypatch.setenv("USERPROFILE", str(home_path))
+    dioptas_path = home_path / ".Dioptas"
+
+    indexes = [
+        (hdf5Loader.source_index, "hdf5_source_index.json"),
+        (FabioLoader.frame_index_cache, "edf_frame_index.json"),
+        (importlib.import_module("dioptas.model.BatchModel").frame_count_index, "frame_count_index.json"),
+    ]
+    for index, filename in indexes:
+        monkeypatch.setattr(index, "filename", str(dioptas_path / filename))
+        monkeypatch.setattr(index, "_entries", None)
+        monkeypatch.setattr(index, "_changed", {})
+    monkeypatch.setattr(integration_engine_cache, "directory", str(dioptas_path / "integration_engines"))
+    monkeypatch.setattr(integration_engine_cache, "persistent", False)
+    monkeypatch.setattr(integration_method_tuner, "filename", str(dioptas_path / "integration_methods.json"))
+    monkeypatch.setattr(integration_method_tuner, "_methods", None)
+    yield dioptas_path
+    # pending changes must not be saved to the original files
+    for index, _ in indexes:
+        index.flush()
+
+
 @pytest.fixture(scope="session")
 def qapp():
     """Fixture ensuring QApplication is instanciated"""
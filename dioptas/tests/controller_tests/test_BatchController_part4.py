@@ -19,7 +19,9 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import sys
 import pytest
+import h5py
 from mock import MagicMock
 import numpy as np
 
@@ -28,6 +30,8 @@ from xypattern import Pattern
 
 from ...controller.integration import BatchController
 
+unittest_data_path = os.path.join(os.path.dirname(__file__), "../data")
+
 
 def test_save_xy_without_background_subtraction(
     batch_controller: BatchController, tmp_path
@@ -82,3 +86,81 @@ def test_save_xy_with_background_subtraction(
     pattern.load(os.path.join(tmp_path, f"test_011.xy"))
     assert len(pattern.x) == 1001
     assert len(pattern.y) == 1001
+
+
+def test_update_integrates_new_files_and_appends_them_to_the_saved_file(
+    batch_controller: BatchController, batch_widget, tmp_path
+):
+    filenames = [str(tmp_path / f"frames_{ind}.h5") for ind in range(2)]
+    with h5py.File(filenames[0], "w") as f:
+        f.create_dataset("entry/data/data", data=np.ones((2, 20, 30)))
+
+    model = batch_controller.model
+    model.calibration_model.load(
+        os.path.join(unittest_data_path, "lambda", "L2.poni")
+    )
+    pattern = Pattern.from_file(os.path.join(unittest_data_path, "CeO2_Pilatus1M.xy"))
+    model.calibration_model.integrate_1d_stack = MagicMock(
+        side_effect=lambda frames, *args, **kwargs: (
+            pattern.x,
+            np.tile(pattern.y, (len(frames), 1)),
+        )
+    )
+    batch_widget.control_widget.workers_sb.setValue(1)
+    model.batch_model.set_image_files(filenames[:1])
+    model.batch_model.integrate_raw_data(0, 2, 1, use_all=True)
+    assert not batch_widget.control_widget.append_proc_btn.isEnabled()
+
+    proc_filename = os.path.join(tmp_path, "proc", "batch.nxs")
+    QtWidgets.QFileDialog.getSaveFileName = MagicMock(return_value=proc_filename)
+    batch_controller.save_data()
+    assert batch_widget.control_widget.append_proc_btn.isEnabled()
+
+    with h5py.File(filenames[1], "w") as f:
+        f.create_dataset("entry/data/data", data=np.ones((3, 20, 30)))
+    batch_widget.control_widget.new_files_btn.setChecked(True)
+    batch_widget.control_widget.append_proc_btn.setChecked(True)
+    batch_controller.integrate_new_frames()
+
+    assert model.batch_model.n_img == 5
+    assert list(model.batch_model.files) == filenames
+    with h5py.File(proc_filename, "r") as f:
+        assert f["processed/result/data"].shape[0] == 5
+        assert list(f["processed/process/files"][()].astype("U")) == filenames
+
+
+def test_integrate_with_workers_can_be_aborted(
+    batch_controller: BatchController, batch_widget, monkeypatch
+):
+    lambda_path = os.path.join(unittest_data_path, "lambda")
+    files = [
+        os.path.join(lambda_path, "testasapo1_1009_00002_m1_part00000.nxs"),
+        os.path.join(lambda_path, "testasapo1_1009_00002_m1_part00001.nxs"),
+    ]
+    model = batch_controller.model
+    model.calibration_model.load(os.path.join(lambda_path, "L2.poni"))
+    model.batch_model.set_image_files(files)
+    batch_widget.mode_widget.view_f_btn.setChecked(True)
+    batch_widget.position_widget.step_raw_widget.start_txt.setRange(0, 19)
+    batch_widget.position_widget.step_raw_widget.stop_txt.setRange(0, 19)
+    batch_widget.position_widget.step_raw_widget.start_txt.setValue(0)
+    batch_widget.position_widget.step_raw_widget.stop_txt.setValue(19)
+    batch_widget.position_widget.step_raw_widget.step_txt.setValue(1)
+    batch_widget.control_widget.workers_sb.setMaximum(2)
+    batch_widget.control_widget.workers_sb.setValue(2)
+
+    # the abort button is pressed after the first frame is integrated
+    progress_dialog = MagicMock()
+    progress_dialog.wasCanceled.side_effect = [False, False] + [True] * 100
+    monkeypatch.setattr(
+        sys.modules[BatchController.__module__],
+        "get_progress_dialog",
+        MagicMock(return_value=progress_dialog),
+    )
+    integrate_raw_data = MagicMock(wraps=model.batch_model.integrate_raw_data)
+    model.batch_model.integrate_raw_data = integrate_raw_data
+    batch_controller.integrate()
+
+    assert integrate_raw_data.call_args[1]["num_workers"] == 2
+    assert 1 <= model.batch_model.n_img < 20
+    assert model.batch_model.data.shape[0] == model.batch_model.n_img
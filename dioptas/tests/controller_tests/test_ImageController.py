@@ -50,7 +50,7 @@ def test_automatic_file_processing(
 
     click_checkbox(integration_widget.autoprocess_cb)
 
-    assert not dioptas_model.img_model._directory_watcher.signalsBlocked()
+    assert not dioptas_model.img_model._directory_watcher.file_added.blocked
     assert integration_widget.autoprocess_cb.isChecked()
     assert dioptas_model.img_model.autoprocess
 
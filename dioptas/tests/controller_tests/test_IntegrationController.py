@@ -48,6 +48,8 @@ class IntegrationControllerTest(QtTest):
         dummy_x = np.linspace(0, 25, 1000)
         dummy_y = np.sin(dummy_x)
         self.model.calibration_model.integrate_1d = mock.Mock(return_value=(dummy_x, dummy_y))
+        self.model.calibration_model.integrate_1d_stack = mock.Mock(
+            side_effect=lambda frames, **kwargs: (dummy_x, np.tile(dummy_y, (len(frames), 1))))
 
         self.widget = IntegrationWidget()
         self.integration_controller = IntegrationController(widget=self.widget,
@@ -89,6 +91,26 @@ class IntegrationControllerTest(QtTest):
         # cleaning up
         os.rmdir(working_dir)
 
+    def test_batch_integration_integrates_images_of_the_same_shape_together(self):
+        _, _, working_dir = self._setup_batch_integration()
+        input_filenames = [os.path.join(data_path, 'map', 'Fe3O4C_M1_map_1_P1_E1_001.tif'),
+                           os.path.join(data_path, 'map', 'Fe3O4C_M1_map_2_P1_E1_001.tif'),
+                           os.path.join(data_path, 'lambda', 'testasapo1_1009_00002_m1_part00000.nxs')]
+
+        QtWidgets.QFileDialog.getOpenFileNames = MagicMock(return_value=input_filenames)
+        self.model.img_model.load = mock.Mock(wraps=self.model.img_model.load)
+        click_button(self.widget.load_img_btn)
+
+        integrate_1d_stack = self.model.calibration_model.integrate_1d_stack
+        self.assertEqual([len(call.args[0]) for call in integrate_1d_stack.call_args_list], [2, 1])
+        # the blocks are integrated with their own shape without loading their files again
+        self.assertEqual([call.args[0] for call in self.model.img_model.load.call_args_list], input_filenames)
+        for filename in input_filenames:
+            filepath = os.path.join(working_dir, os.path.splitext(os.path.basename(filename))[0] + '.xy')
+            self.assertTrue(os.path.exists(filepath))
+            os.remove(filepath)
+        os.rmdir(working_dir)
+
     def test_batch_integration_with_automatic_background_subtraction(self):
         filenames, input_filenames, working_dir = self._setup_batch_integration()
         self.widget.bkg_pattern_gb.setChecked(True)
@@ -29,6 +29,9 @@ from ..utility import enter_value_into_text_field, click_button
 
 from ...controller.integration import OptionsController
 from ...model.DioptasModel import DioptasModel
+from ...model.util.IntegrationEngineCache import integration_engine_cache
+from ...model.util.IntegrationMethodTuner import IntegrationMethodTuner
+from ...model.util.IntegrationWorker import IntegrationWorker
 from ...widgets.integration import IntegrationWidget
 
 unittest_path = os.path.dirname(__file__)
@@ -63,5 +66,55 @@ class OptionsControllerTest(QtTest):
         enter_value_into_text_field(self.options_widget.cake_azimuth_max_txt, 200)
         self.assertEqual(self.model.current_configuration.cake_azimuth_range[1], 200)
 
-
-
+    def test_tune_integration_method(self):
+        self.model.calibration_model.method_tuner = IntegrationMethodTuner()
+        self.model.calibration_model.load(os.path.join(data_path, 'CeO2_Pilatus1M.poni'))
+        self.model.img_model.load(os.path.join(data_path, 'CeO2_Pilatus1M.tif'))
+        self.model.current_configuration.tune_integration_method = MagicMock(return_value={})
+        self.model.calibration_model.method_tuner.get = MagicMock(return_value='splitbbox')
+
+        click_button(self.options_widget.tune_method_btn)
+        self.model.current_configuration.tune_integration_method.assert_called_once_with()
+        self.assertEqual(self.options_widget.integration_method_lbl.text(), 'splitbbox')
+
+    def test_failing_tuning_restores_the_cursor(self):
+        self.model.current_configuration.tune_integration_method = MagicMock(side_effect=RuntimeError("failed"))
+
+        with self.assertRaises(RuntimeError):
+            self.options_controller.tune_method_btn_clicked()
+        self.assertIsNone(QtWidgets.QApplication.overrideCursor())
+        self.assertTrue(self.options_widget.tune_method_btn.isEnabled())
+
+    def test_tune_integration_method_in_the_integration_worker(self):
+        self.model.calibration_model.method_tuner = IntegrationMethodTuner()
+        self.model.current_configuration.tune_integration_method = MagicMock(return_value={})
+        self.model.calibration_model.get_integration_method = MagicMock(return_value='splitbbox')
+        self.model.calibration_model.num_points = 1000
+        dispatched = []
+        self.model.integration_worker = IntegrationWorker(dispatched.append)
+
+        click_button(self.options_widget.tune_method_btn)
+        self.model.integration_worker.wait(5)
+        self.model.current_configuration.tune_integration_method.assert_called_once_with()
+        self.assertFalse(self.options_widget.tune_method_btn.isEnabled())
+
+        for fn in dispatched:
+            fn()
+        self.assertIsNone(QtWidgets.QApplication.overrideCursor())
+        self.assertTrue(self.options_widget.tune_method_btn.isEnabled())
+        self.assertEqual(self.options_widget.integration_method_lbl.text(), 'splitbbox')
+
+    def test_keep_integration_matrices_on_disk(self):
+        self.assertFalse(self.options_widget.persistent_engines_cb.isChecked())
+        self.options_widget.persistent_engines_cb.setChecked(True)
+        self.assertTrue(integration_engine_cache.persistent)
+        self.options_widget.persistent_engines_cb.setChecked(False)
+        self.assertFalse(integration_engine_cache.persistent)
+
+    def test_clear_integration_matrices_on_disk(self):
+        os.makedirs(integration_engine_cache.directory, exist_ok=True)
+        filename = os.path.join(integration_engine_cache.directory, 'matrix.npz')
+        open(filename, 'w').close()
+
+        click_button(self.options_widget.clear_engines_btn)
+        self.assertFalse(os.path.exists(filename))
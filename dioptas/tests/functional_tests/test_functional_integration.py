@@ -574,15 +574,30 @@ class BatchIntegrationFunctionalTest(QtTest):
 
         click_button(self.integration_widget.batch_widget.options_widget.q_btn)
         self.model.calibration_model.integrate_1d.assert_called_with(
-            mask=None, num_points=None, unit="q_A^-1", azi_range=None, trim_zeros=True
+            mask=None,
+            num_points=None,
+            unit="q_A^-1",
+            azi_range=None,
+            trim_zeros=True,
+            img_data=None,
+            radial_range=None,
+            region=None,
         )
 
+        # d patterns are integrated with bins in 2θ
         click_button(self.integration_widget.batch_widget.options_widget.d_btn)
         self.model.calibration_model.integrate_1d.assert_called_with(
-            mask=None, num_points=None, unit="d_A", azi_range=None, trim_zeros=True
-        )
-
+            mask=None,
+            num_points=None,
+            unit="2th_deg",
+            azi_range=None,
+            trim_zeros=True,
+            img_data=None,
+            radial_range=None,
+            region=None,
+        )
+
+        # switching between d and 2θ only converts the last integrated pattern
+        call_count = self.model.calibration_model.integrate_1d.call_count
         click_button(self.integration_widget.batch_widget.options_widget.tth_btn)
-        self.model.calibration_model.integrate_1d.assert_called_with(
-            mask=None, num_points=None, unit="2th_deg", azi_range=None, trim_zeros=True
-        )
+        self.assertEqual(self.model.calibration_model.integrate_1d.call_count, call_count)
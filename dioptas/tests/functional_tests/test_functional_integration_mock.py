@@ -61,6 +61,9 @@ def test_1D_integration_with_azimuth_limits(
         unit="2th_deg",
         azi_range=(-100, 80),
         trim_zeros=True,
+        img_data=None,
+        radial_range=None,
+        region=None,
     )
 
 
@@ -87,13 +90,23 @@ def test_changing_number_of_integration_bins(
         mask=None,
         unit="2th_deg",
         trim_zeros=True,
+        img_data=None,
+        radial_range=None,
+        region=None,
     )
 
     # then she decides that having an automatic estimation may probably be better and changes back to automatic.
     # immediately the number is restored and the image looks like when she started
     integration_widget.automatic_binning_cb.setChecked(True)
     dioptas_model.calibration_model.integrate_1d.assert_called_with(
-        num_points=None, azi_range=None, mask=None, unit="2th_deg", trim_zeros=True
+        num_points=None,
+        azi_range=None,
+        mask=None,
+        unit="2th_deg",
+        trim_zeros=True,
+        img_data=None,
+        radial_range=None,
+        region=None,
     )
 
 
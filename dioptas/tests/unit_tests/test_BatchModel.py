@@ -1,11 +1,14 @@
 import os
+import sys
 import pytest
 
+import h5py
 import numpy as np
 from xypattern import Pattern
 
 from ...model.Configuration import Configuration
 from ...model.BatchModel import BatchModel, iterate_folder
+from ...model.util.cache import PersistentFileIndex
 
 from mock import MagicMock
 
@@ -19,6 +22,18 @@ files = [
 cal_file = os.path.join(data_path, "lambda/L2.poni")
 
 
+def mock_stack_integration(x, y):
+    """
+    :return: mock of an integration of a stack of frames, which returns y for every frame
+    """
+    return MagicMock(
+        side_effect=lambda frames, *args, **kwargs: (
+            x,
+            np.tile(y, (len(frames),) + (1,) * np.ndim(y)),
+        )
+    )
+
+
 @pytest.fixture()
 def configuration():
     configuration = Configuration()
@@ -32,8 +47,8 @@ def batch_model(configuration):
     batch_model.set_image_files(files)
 
     pattern = Pattern.from_file(os.path.join(data_path, "CeO2_Pilatus1M.xy"))
-    configuration.calibration_model.integrate_1d = MagicMock(
-        return_value=(pattern.x, pattern.y)
+    configuration.calibration_model.integrate_1d_stack = mock_stack_integration(
+        pattern.x, pattern.y
     )
     yield batch_model
 
@@ -45,6 +60,55 @@ def test_init_state(batch_model):
     assert batch_model.pos_map_all.shape == (20, 2)
 
 
+@pytest.fixture()
+def frame_count_index(tmp_path, monkeypatch):
+    index = PersistentFileIndex(str(tmp_path / "index" / "frame_counts.json"))
+    monkeypatch.setattr(sys.modules[BatchModel.__module__], "frame_count_index", index)
+    return index
+
+
+def test_set_image_files_counts_frames_from_metadata(
+    configuration, frame_count_index, tmp_path
+):
+    hdf5_filename = str(tmp_path / "frames.h5")
+    with h5py.File(hdf5_filename, "w") as f:
+        f.create_dataset(
+            "entry/data/data", data=np.zeros((3, 20, 30)), maxshape=(None, 20, 30)
+        )
+    tif_filename = os.path.join(data_path, "CeO2_Pilatus1M.tif")
+
+    batch_model = BatchModel(configuration)
+    configuration.img_model.load = MagicMock(
+        side_effect=AssertionError("no image should be loaded")
+    )
+    batch_model.set_image_files(files + [tif_filename, hdf5_filename])
+    assert np.array_equal(batch_model.file_map, [0, 10, 20, 21, 24])
+    assert batch_model.n_img_all == 24
+    assert np.array_equal(
+        batch_model.pos_map_all[19:], [[1, 9], [2, 0], [3, 0], [3, 1], [3, 2]]
+    )
+    assert frame_count_index.get(hdf5_filename) == 3
+
+    # unchanged files are not opened again
+    configuration.img_model.get_frame_count = MagicMock(
+        side_effect=AssertionError("should not be counted")
+    )
+    batch_model.set_image_files(files + [tif_filename, hdf5_filename])
+    assert batch_model.n_img_all == 24
+
+    # growing files are counted again
+    with h5py.File(hdf5_filename, "a") as f:
+        f["entry/data/data"].resize((5, 20, 30))
+    os.utime(hdf5_filename, ns=(0, 0))
+    configuration.img_model.get_frame_count = MagicMock(return_value=5)
+    batch_model.set_image_files([hdf5_filename])
+    assert np.array_equal(batch_model.file_map, [0, 5])
+    configuration.img_model.get_frame_count.assert_called_once_with(hdf5_filename)
+
+    batch_model.set_image_files([hdf5_filename, "does_not_exist.tif"])
+    assert np.array_equal(batch_model.file_map, [0, 5])
+
+
 def test_integrate_raw_data(batch_model):
     start = 2
     stop = 18
@@ -58,6 +122,185 @@ def test_integrate_raw_data(batch_model):
     assert batch_model.pos_map.shape == (8, 2)
 
 
+def test_integrate_raw_data_is_binned_in_tth(batch_model, configuration):
+    configuration.integration_unit = "d_A"
+    batch_model.integrate_raw_data(2, 6, 2, use_all=True)
+
+    pattern = Pattern.from_file(os.path.join(data_path, "CeO2_Pilatus1M.xy"))
+    assert np.array_equal(batch_model.binning, pattern.x)
+    for call in configuration.calibration_model.integrate_1d_stack.call_args_list:
+        assert call.kwargs["unit"] == "2th_deg"
+    assert configuration.pattern_model.unit == "d_A"
+
+
+def test_integrate_raw_data_integrates_every_image_once(batch_model, configuration):
+    configuration.integration_unit = "q_A^-1"
+    configuration.calibration_model.integrate_1d = MagicMock()
+    integrate_1d_stack = configuration.calibration_model.integrate_1d_stack
+    batch_model.integrate_raw_data(2, 6, 2, use_all=True)
+
+    configuration.calibration_model.integrate_1d.assert_not_called()
+    frames = [call.args[0] for call in integrate_1d_stack.call_args_list]
+    assert sum(len(block) for block in frames) == 2
+
+
+def test_integrate_raw_data_in_parallel(configuration):
+    configuration.calibration_model.load(cal_file)
+    configuration.set_integration_sectors(2, (-90, 90))
+    batch_model = BatchModel(configuration)
+    batch_model.set_image_files(files)
+
+    batch_model.integrate_raw_data(8, 13, 1, use_all=True)
+    binning, data = batch_model.binning, batch_model.data
+    sector_data = batch_model.sector_data
+
+    callback_fn = MagicMock(return_value=True)
+    batch_model.integrate_raw_data(
+        8, 13, 1, use_all=True, callback_fn=callback_fn, num_workers=2
+    )
+    assert batch_model.n_img == 5
+    assert np.array_equal(batch_model.pos_map, [[0, 8], [0, 9], [1, 0], [1, 1], [1, 2]])
+    assert np.array_equal(batch_model.binning, binning)
+    assert np.allclose(batch_model.data, data)
+    assert np.allclose(batch_model.sector_data, sector_data)
+    assert callback_fn.call_args.args == (5,)
+
+
+def test_integrate_raw_data_in_parallel_can_be_aborted(configuration):
+    configuration.calibration_model.load(cal_file)
+    batch_model = BatchModel(configuration)
+    batch_model.set_image_files(files)
+
+    batch_model.integrate_raw_data(
+        2, 18, 2, use_all=True, callback_fn=lambda counter: False, num_workers=2
+    )
+    assert batch_model.n_img == 1
+    assert np.array_equal(batch_model.pos_map, [[0, 2]])
+    assert batch_model.data.shape == (1, len(batch_model.binning))
+
+
+def test_integrate_new_raw_data(configuration, frame_count_index, tmp_path):
+    hdf5_filename = str(tmp_path / "frames.h5")
+    with h5py.File(hdf5_filename, "w") as f:
+        f.create_dataset(
+            "entry/data/data", data=np.ones((3, 20, 30)), maxshape=(None, 20, 30)
+        )
+    configuration.calibration_model.load(cal_file)
+    pattern = Pattern.from_file(os.path.join(data_path, "CeO2_Pilatus1M.xy"))
+    configuration.calibration_model.integrate_1d_stack = mock_stack_integration(
+        pattern.x, pattern.y
+    )
+    batch_model = BatchModel(configuration)
+
+    assert batch_model.integrate_new_raw_data([hdf5_filename]) == 3
+    assert batch_model.data.shape[0] == 3
+    batch_model.data[:] = -1
+
+    # the acquisition adds frames to the file (the image model still has it opened)
+    with h5py.File(str(tmp_path / "grown.h5"), "w") as f:
+        f.create_dataset("entry/data/data", data=np.ones((5, 20, 30)))
+    os.replace(str(tmp_path / "grown.h5"), hdf5_filename)
+    assert batch_model.integrate_new_raw_data() == 2
+    assert batch_model.n_img == 5
+    assert np.all(batch_model.data[:3] == -1)
+    assert not np.any(batch_model.data[3:] == -1)
+    assert np.array_equal(batch_model.pos_map[:, 1], range(5))
+
+    # new files are integrated and the integrated images are mapped to the new file list
+    assert batch_model.integrate_new_raw_data([files[0], hdf5_filename]) == 10
+    assert batch_model.n_img == 15
+    assert np.all(batch_model.data[:3] == -1)
+    assert np.array_equal(batch_model.pos_map[:5], [[1, pos] for pos in range(5)])
+    assert np.array_equal(batch_model.pos_map[5:], [[0, pos] for pos in range(10)])
+    assert batch_model.integrate_new_raw_data() == 0
+
+    with pytest.raises(ValueError):
+        batch_model.integrate_new_raw_data([files[0]])
+
+
+def test_append_proc_data(batch_model, tmp_path):
+    filename = str(tmp_path / "test_append_proc.nxs")
+    batch_model.integrate_raw_data(0, 5, 1, use_all=True)
+    assert batch_model.append_proc_data(filename) == 5
+
+    with h5py.File(filename, "a") as f:
+        assert f["processed/result/data"].maxshape == (None, None)
+        f["processed/result/data"][0, 0] = -1
+
+    assert batch_model.integrate_new_raw_data() == 15
+    assert batch_model.append_proc_data(filename) == 15
+
+    with h5py.File(filename, "r") as f:
+        # earlier patterns are not written again
+        assert f["processed/result/data"][0, 0] == -1
+        assert f["processed/result/data"].shape == batch_model.data.shape
+        assert np.array_equal(f["processed/process/pos_map"][()], batch_model.pos_map)
+
+    batch_model.reset_data()
+    batch_model.load_proc_data(filename)
+    assert batch_model.n_img == 20
+    assert np.array_equal(batch_model.pos_map, np.argwhere(np.ones((2, 10))))
+
+    # files not written for appending are saved completely
+    with h5py.File(filename, "a") as f:
+        del f["processed/result/data"]
+        f["processed/result/data"] = batch_model.data
+    assert batch_model.append_proc_data(filename) == 20
+
+
+def test_append_proc_data_saves_changed_data_completely(batch_model, tmp_path):
+    filename = str(tmp_path / "test_append_changed.nxs")
+    batch_model.integrate_raw_data(0, 5, 1, use_all=True)
+    batch_model.save_proc_data(filename)
+
+    batch_model.normalize()
+    batch_model.data[:] = 2
+    assert batch_model.append_proc_data(filename) == 5
+    with h5py.File(filename, "r") as f:
+        assert np.array_equal(f["processed/result/data"][()], batch_model.data)
+
+    batch_model.integrate_raw_data(0, 5, 1, use_all=True)
+    assert batch_model.append_proc_data(filename) == 5
+    with h5py.File(filename, "r") as f:
+        assert np.array_equal(f["processed/result/data"][()], batch_model.data)
+
+    # after saving to another file, the first file is written completely
+    other_filename = str(tmp_path / "test_append_other.nxs")
+    batch_model.save_proc_data(other_filename)
+    assert batch_model.integrate_new_raw_data() == 15
+    assert batch_model.append_proc_data(filename) == 20
+
+
+def test_proc_filename(batch_model, tmp_path):
+    filename = str(tmp_path / "test_proc_filename.nxs")
+    batch_model.configuration.calibration_model.stack_integration_method = "splitbbox"
+    batch_model.integrate_raw_data(0, 5, 1, use_all=True)
+    assert batch_model.proc_filename is None
+    batch_model.save_proc_data(filename)
+    assert batch_model.proc_filename == filename
+    with h5py.File(filename, "r") as f:
+        assert f["processed/process/int_method"][()].decode() == "splitbbox"
+
+    batch_model.reset_data()
+    assert batch_model.proc_filename is None
+    batch_model.load_proc_data(filename)
+    assert batch_model.proc_filename == filename
+    assert batch_model.used_method == "splitbbox"
+
+
+def test_get_updated_filenames(configuration, frame_count_index, tmp_path):
+    filenames = [str(tmp_path / "frames_{}.h5".format(ind)) for ind in range(3)]
+    for filename in filenames:
+        with h5py.File(filename, "w") as f:
+            f.create_dataset("entry/data/data", data=np.ones((2, 20, 30)))
+    (tmp_path / "frames.txt").write_text("")
+    batch_model = BatchModel(configuration)
+    batch_model.set_image_files(filenames[1:2])
+    batch_model.proc_filename = filenames[2]
+
+    assert batch_model.get_updated_filenames() == [filenames[1], filenames[0]]
+
+
 def test_get_image_info(batch_model):
     image = 10
     name, pos = batch_model.get_image_info(image, use_all=True)
@@ -88,6 +331,32 @@ def test_saving_loading(batch_model, tmp_path):
     assert batch_model.pos_map.shape == (8, 2)
 
 
+def test_integrate_and_save_sectors(batch_model, configuration, tmp_path):
+    x = np.linspace(1, 20, 100)
+    configuration.calibration_model.integrate_sectors_stack = mock_stack_integration(
+        x, np.ones((4, 100))
+    )
+    batch_model.integrate_raw_data(2, 18, 2, use_all=True)
+    assert batch_model.sector_data is None
+
+    configuration.set_integration_sectors(4, (-90, 90))
+    batch_model.integrate_raw_data(2, 18, 2, use_all=True)
+    assert batch_model.sector_data.shape == (8, 4, 100)
+    assert np.array_equal(batch_model.sector_edges, [-90, -45, 0, 45, 90])
+    call = configuration.calibration_model.integrate_sectors_stack.call_args
+    assert call.kwargs["unit"] == "2th_deg"
+
+    batch_model.save_proc_data(os.path.join(tmp_path, "test_save_proc.nxs"))
+    batch_model.reset_data()
+    batch_model.load_proc_data(os.path.join(tmp_path, "test_save_proc.nxs"))
+
+    assert batch_model.sector_data.shape == (8, 4, 100)
+    assert np.array_equal(batch_model.sector_edges, [-90, -45, 0, 45, 90])
+    binning, intensities = batch_model.get_sector_data(1)
+    assert np.array_equal(binning, x)
+    assert intensities.shape == (8, 100)
+
+
 def test_save_as_csv(batch_model, tmp_path):
     batch_model.integrate_raw_data(start=5, stop=10, step=2, use_all=True)
     batch_model.save_as_csv(os.path.join(tmp_path, "test_save.csv"))
@@ -20,6 +20,7 @@
 
 import os
 import sys
+import threading
 import pytest
 
 import numpy as np
@@ -34,6 +35,10 @@ from ...model.CalibrationModel import (
     get_available_detectors,
     DetectorModes,
 )
+from ...model.MaskModel import MaskModel
+from ...model.util.IntegrationEngineCache import IntegrationEngineCache
+from ...model.util.IntegrationMethodTuner import IntegrationMethodTuner
+from ...model.util.calc import supersample_image
 from ... import calibrants_path
 
 unittest_path = os.path.dirname(__file__)
@@ -129,6 +134,147 @@ def test_integration_with_supersampling(calibration_model):
     assert np.mean((y2 - y1_2_interp)) == pytest.approx(0, abs=1e-2)
 
 
+@pytest.mark.parametrize("factor", [2, 3])
+def test_supersampling_integrates_the_original_image(calibration_model, img_model, engine_cache, factor):
+    load_small_image_with_calibration(calibration_model, shape=(40, 50))
+    img_model._img_data = np.random.randint(0, 1000, size=(40, 50)).astype(np.uint16)
+    mask = np.zeros((40, 50), dtype=bool)
+    mask[:, :5] = True
+    calibration_model.set_supersampling(factor)
+
+    x, y = calibration_model.integrate_1d(100, mask=mask, trim_zeros=False)
+    cake = calibration_model.integrate_2d(mask=mask, rad_points=100, azimuth_points=36)
+
+    # integration of the supersampled image with pyFAI
+    img_data = supersample_image(img_model.img_data, factor)
+    supersampled_mask = supersample_image(mask, factor)
+    x_ref, y_ref = calibration_model.pattern_geometry.integrate1d(
+        img_data, 100, method="csr", unit="2th_deg", mask=supersampled_mask,
+        polarization_factor=calibration_model.polarization_factor)
+    cake_ref = calibration_model.cake_geometry.integrate2d(
+        img_data, 100, 36, method="csr", unit="2th_deg", mask=supersampled_mask,
+        polarization_factor=calibration_model.polarization_factor)[0]
+
+    assert np.allclose(x, x_ref)
+    assert np.allclose(y, y_ref, rtol=1e-4, atol=1e-3)
+    assert np.allclose(cake, cake_ref, rtol=1e-4, atol=1e-3)
+
+
+@pytest.mark.parametrize("unit", ["2th_deg", "d_A"])
+@pytest.mark.parametrize("factor", [1, 2])
+def test_integrate_1d_and_2d_in_one_pass(calibration_model, img_model, engine_cache, unit, factor):
+    load_small_image_with_calibration(calibration_model, shape=(40, 50))
+    img_model._img_data = np.random.randint(0, 1000, size=(40, 50)).astype(np.uint16)
+    mask = np.zeros((40, 50), dtype=bool)
+    mask[:, :5] = True
+    calibration_model.set_supersampling(factor)
+
+    x_ref, y_ref = [np.copy(a) for a in calibration_model.integrate_1d(100, mask=mask, unit=unit)]
+    cake_ref = np.copy(calibration_model.integrate_2d(mask=mask, rad_points=100, azimuth_points=36))
+
+    x, y = calibration_model.integrate_1d_and_2d(mask=mask, unit=unit, num_points=100, azimuth_points=36)
+    assert np.array_equal(x, x_ref)
+    assert np.allclose(y, y_ref, rtol=1e-4, atol=1e-3)
+    assert np.allclose(calibration_model.cake_img, cake_ref, rtol=1e-4, atol=1e-3)
+    assert calibration_model.cake_img.shape == (36, 100)
+
+
+def test_integrate_1d_and_2d_needs_tth_binning(calibration_model, img_model):
+    load_small_image_with_calibration(calibration_model, shape=(40, 50))
+    with pytest.raises(ValueError):
+        calibration_model.integrate_1d_and_2d(unit="q_A^-1")
+
+
+@pytest.mark.parametrize("factor", [1, 2])
+def test_integrate_radial_range(calibration_model, img_model, engine_cache, factor):
+    load_small_image_with_calibration(calibration_model, shape=(40, 50))
+    img_model._img_data = np.random.randint(0, 1000, size=(40, 50)).astype(np.uint16)
+    calibration_model.set_supersampling(factor)
+    x_full, _ = calibration_model.integrate_1d(trim_zeros=False)
+
+    radial_range = (28.5, 29.5)
+    x, y = calibration_model.integrate_1d(radial_range=radial_range, trim_zeros=False)
+    assert radial_range[0] <= x[0] and x[-1] <= radial_range[1]
+    # the points have the spacing of the integration over the full radial extent
+    assert np.diff(x).mean() == pytest.approx(np.diff(x_full).mean(), rel=0.1)
+
+    x_ref, y_ref = calibration_model.pattern_geometry.integrate1d(
+        supersample_image(img_model.img_data, factor), len(x), method="csr", unit="2th_deg",
+        radial_range=radial_range, polarization_factor=calibration_model.polarization_factor)
+    assert np.allclose(x, x_ref)
+    assert np.allclose(y, y_ref, rtol=1e-4, atol=1e-3)
+
+    cake = calibration_model.integrate_2d(rad_points=20, azimuth_points=36, radial_range=radial_range)
+    assert cake.shape == (36, 20)
+    assert radial_range[0] <= calibration_model.cake_tth[0]
+    assert calibration_model.cake_tth[-1] <= radial_range[1]
+
+
+def test_default_num_points_of_radial_range_beyond_the_detector(calibration_model, img_model):
+    load_small_image_with_calibration(calibration_model, shape=(40, 50))
+    shape = (40, 50)
+    num_points = calibration_model.calculate_number_of_pattern_points(shape, 2)
+    radial = calibration_model.pattern_geometry.array_from_unit(shape, "center", "2th_deg")
+    min_tth, max_tth = np.min(radial), np.max(radial)
+    center_tth = (min_tth + max_tth) / 2
+
+    array_from_unit = MagicMock(wraps=calibration_model.pattern_geometry.array_from_unit)
+    calibration_model.pattern_geometry.array_from_unit = array_from_unit
+    # only the half of the range within the radial extent of the detector is binned
+    assert calibration_model._get_default_num_points(
+        shape, "2th_deg", (center_tth, 2 * max_tth)
+    ) == int(np.ceil(num_points / 2))
+    assert calibration_model._get_default_num_points(shape, "2th_deg", (0, 2 * max_tth)) == num_points
+    assert calibration_model._get_default_num_points(shape, "2th_deg", (2 * max_tth, 3 * max_tth)) == 2
+    assert array_from_unit.call_count == 1
+
+
+@pytest.mark.parametrize("factor", [1, 2])
+def test_integrate_sectors(calibration_model, img_model, engine_cache, factor):
+    load_small_image_with_calibration(calibration_model, shape=(40, 50))
+    img_model._img_data = np.random.randint(0, 1000, size=(40, 50)).astype(np.uint16)
+    mask = np.zeros((40, 50), dtype=bool)
+    mask[:, :5] = True
+    calibration_model.set_supersampling(factor)
+
+    cake_ref = np.copy(calibration_model.integrate_2d(mask=mask, rad_points=100, azimuth_points=36,
+                                                      azimuth_range=(-180, 180)))
+    x, intensities = calibration_model.integrate_sectors(np.linspace(-180, 180, 37), 100, mask=mask)
+
+    assert np.array_equal(x, calibration_model.cake_tth)
+    assert intensities.shape == (36, 100)
+    assert np.allclose(intensities, cake_ref, rtol=1e-4, atol=1e-3)
+
+
+def test_integrate_sectors_with_different_widths(calibration_model, img_model, engine_cache):
+    load_small_image_with_calibration(calibration_model, shape=(40, 50))
+    img_model._img_data = np.random.randint(0, 1000, size=(40, 50)).astype(np.uint16)
+
+    # the image covers azimuths from -136° to -130°, the sectors are integrated on a cake with bins of 1°
+    x, intensities = calibration_model.integrate_sectors([-136, -134, -133, -130], 100)
+    res = calibration_model.cake_geometry.integrate2d(
+        img_model.img_data, 100, 6, azimuth_range=(-136, -130), method="csr", unit="2th_deg",
+        polarization_factor=calibration_model.polarization_factor)
+    signal = np.asarray(res.sum_signal).reshape(6, 100)
+    normalization = np.asarray(res.sum_normalization).reshape(6, 100)
+
+    assert np.allclose(x, res.radial)
+    assert intensities.shape == (3, 100)
+    for sector, (start, stop) in enumerate([(0, 2), (2, 3), (3, 6)]):
+        sector_normalization = normalization[start:stop].sum(axis=0)
+        valid = sector_normalization != 0
+        expected = signal[start:stop].sum(axis=0)[valid] / sector_normalization[valid]
+        assert np.allclose(intensities[sector][valid], expected, rtol=1e-4, atol=1e-3)
+
+
+def test_integrate_sectors_needs_increasing_edges(calibration_model, img_model):
+    load_small_image_with_calibration(calibration_model, shape=(40, 50))
+    with pytest.raises(ValueError):
+        calibration_model.integrate_sectors([0, 0])
+    with pytest.raises(ValueError):
+        calibration_model.integrate_sectors([-200, 0])
+
+
 def test_get_pixel_ind(calibration_model):
     load_small_image_with_calibration(calibration_model, shape=(30, 30))
     calibration_model.integrate_1d(60)
@@ -164,6 +310,247 @@ def test_use_different_image_sizes_for_2d_integration(calibration_model):
     calibration_model.integrate_2d()
 
 
+@pytest.fixture
+def engine_cache(calibration_model, tmp_path):
+    engine_cache = IntegrationEngineCache(directory=str(tmp_path / "engines"), persistent=True)
+    calibration_model.engine_cache = engine_cache
+    return engine_cache
+
+
+def test_integration_engines_are_reused(calibration_model, engine_cache):
+    load_small_image_with_calibration(calibration_model, shape=(30, 30))
+    x1, y1 = calibration_model.integrate_1d(100)
+    engine = list(calibration_model.pattern_geometry.engines.values())[0].engine
+
+    calibration_model.integrate_1d(100, unit="q_A^-1")
+    x2, y2 = calibration_model.integrate_1d(100)
+    assert list(calibration_model.pattern_geometry.engines.values())[0].engine is engine
+    assert np.array_equal(x1, x2)
+    assert np.array_equal(y1, y2)
+
+    # the cache key contains the geometry
+    calibration_model.pattern_geometry.dist *= 1.1
+    calibration_model.integrate_1d(100)
+    assert list(calibration_model.pattern_geometry.engines.values())[0].engine is not engine
+
+
+def test_integration_engines_are_restored_from_disk(calibration_model, engine_cache):
+    load_small_image_with_calibration(calibration_model, shape=(30, 30))
+    mask = np.zeros((30, 30), dtype=bool)
+    mask[:5] = True
+    calibration_model.integrate_1d(100, mask=mask)
+    x1, y1 = calibration_model.integrate_1d(100, mask=mask)
+    assert len(os.listdir(engine_cache.directory)) == 1
+
+    calibration_model.engine_cache = IntegrationEngineCache(directory=engine_cache.directory, persistent=True)
+    calibration_model.pattern_geometry.reset()
+    x2, y2 = calibration_model.integrate_1d(100, mask=mask)
+    engine = list(calibration_model.pattern_geometry.engines.values())[0].engine
+    assert engine.__class__.__name__ == "RestoredCsrIntegrator"
+    assert np.allclose(x1, x2)
+    assert np.allclose(y1, y2)
+
+    engine_cache.clear_disk()
+    assert os.listdir(engine_cache.directory) == []
+
+
+def test_integration_engines_are_only_saved_when_persistent(calibration_model, tmp_path):
+    calibration_model.engine_cache = IntegrationEngineCache(directory=str(tmp_path / "engines"))
+    load_small_image_with_calibration(calibration_model, shape=(30, 30))
+    calibration_model.integrate_1d(100)
+    calibration_model.integrate_1d(100)
+    assert not os.path.exists(calibration_model.engine_cache.directory)
+
+
+def test_cake_engines_are_reused_for_new_cake_geometry(calibration_model, engine_cache):
+    load_small_image_with_calibration(calibration_model, shape=(30, 30))
+    cake1 = calibration_model.integrate_2d(rad_points=50, azimuth_points=36)
+    engine = list(calibration_model.cake_geometry.engines.values())[0].engine
+
+    calibration_model.create_cake_geometry()
+    cake2 = calibration_model.integrate_2d(rad_points=50, azimuth_points=36)
+    assert list(calibration_model.cake_geometry.engines.values())[0].engine is engine
+    assert np.array_equal(cake1, cake2)
+
+
+@pytest.mark.parametrize("unit, supersampling", [("2th_deg", 1), ("q_A^-1", 1), ("d_A", 1), ("2th_deg", 2)])
+def test_integrate_1d_stack(calibration_model, img_model, engine_cache, unit, supersampling):
+    load_small_image_with_calibration(calibration_model, shape=(40, 50))
+    calibration_model.set_supersampling(supersampling)
+    frames = np.random.randint(0, 1000, size=(5, 40, 50)).astype(np.uint16)
+    mask = np.zeros((40, 50), dtype=bool)
+    mask[:, :6] = True
+
+    x, intensities = calibration_model.integrate_1d_stack(frames, 80, mask=mask, unit=unit, azi_range=(-100, 100))
+    assert intensities.shape == (5, 80)
+
+    for frame, y in zip(frames, intensities):
+        img_model._img_data = frame
+        x_ref, y_ref = calibration_model.integrate_1d(80, mask=mask, unit=unit, azi_range=(-100, 100),
+                                                      trim_zeros=False)
+        assert np.allclose(x, x_ref)
+        assert np.allclose(y, y_ref, rtol=1e-4, atol=1e-3)
+
+
+def test_integrate_1d_stack_with_background_and_corrections(calibration_model, img_model, engine_cache):
+    load_small_image_with_calibration(calibration_model, shape=(40, 50))
+    frames = np.random.randint(0, 1000, size=(3, 40, 50)).astype(np.uint16)
+    background = np.random.random((40, 50)) * 100
+    corrections = np.random.random((40, 50)) + 0.5
+
+    x, intensities = calibration_model.integrate_1d_stack(frames, 80, background=0.5 * background + 3,
+                                                          corrections=corrections, factor=2)
+
+    for frame, y in zip(frames, intensities):
+        img_model._img_data = 2 * (frame - 0.5 * background - 3) / corrections
+        _, y_ref = calibration_model.integrate_1d(80, trim_zeros=False)
+        assert np.allclose(y, y_ref, rtol=1e-4, atol=1e-3)
+
+
+def test_integrate_1d_stack_checks_the_frame_shape(calibration_model):
+    load_small_image_with_calibration(calibration_model, shape=(40, 50))
+    with pytest.raises(ValueError):
+        calibration_model.integrate_1d_stack(np.ones((2, 50, 40)))
+
+
+@pytest.fixture
+def method_tuner(calibration_model, tmp_path):
+    method_tuner = IntegrationMethodTuner(str(tmp_path / "integration_methods.json"))
+    calibration_model.method_tuner = method_tuner
+    return method_tuner
+
+
+@pytest.mark.parametrize("azimuth_points", [None, 36])
+def test_tune_integration_method(calibration_model, img_model, engine_cache, method_tuner, azimuth_points):
+    load_small_image_with_calibration(calibration_model, shape=(40, 50))
+    tth, intensity = calibration_model.integrate_1d(50)
+    cake = calibration_model.integrate_2d(rad_points=50, azimuth_points=24)
+    method, timings = calibration_model.tune_integration_method(
+        80, azimuth_points=azimuth_points, candidates=("csr", "splitbbox"), repeats=1
+    )
+    # the benchmark does not change the integrated pattern and cake
+    assert calibration_model.tth is tth and calibration_model.int is intensity
+    assert calibration_model.num_points == 50
+    assert calibration_model.get_cake()[0] is cake
+    assert method in ("csr", "splitbbox")
+    assert method == min(timings, key=timings.get)
+    assert calibration_model.get_integration_method(80, azimuth_points) == method
+    assert calibration_model.get_integration_method(81, azimuth_points) == "csr"
+
+    # the tuned method is used, when no method is given
+    method_tuner.put(method_tuner.create_key(calibration_model.detector, (40, 50), 80), "splitbbox")
+    calibration_model.pattern_geometry.integrate1d = MagicMock(wraps=calibration_model.pattern_geometry.integrate1d)
+    calibration_model.integrate_1d(80)
+    assert calibration_model.pattern_geometry.integrate1d.call_args[1]["method"] == "splitbbox"
+
+
+def test_integrate_1d_stack_with_tuned_method(calibration_model, img_model, engine_cache, method_tuner):
+    load_small_image_with_calibration(calibration_model, shape=(40, 50))
+    frames = np.random.randint(0, 1000, size=(3, 40, 50)).astype(np.uint16)
+    background = np.random.random((40, 50)) * 100
+    corrections = np.random.random((40, 50)) + 0.5
+    method_tuner.put(method_tuner.create_key(calibration_model.detector, (40, 50), 80), "splitbbox")
+
+    x, intensities = calibration_model.integrate_1d_stack(frames, 80, background=background,
+                                                          corrections=corrections, factor=2)
+    assert calibration_model.stack_integration_method == "splitbbox"
+    assert intensities.shape == (3, 80)
+    for frame, y in zip(frames, intensities):
+        img_model._img_data = 2 * (frame - background) / corrections
+        x_ref, y_ref = calibration_model.integrate_1d(80, method="splitbbox", trim_zeros=False)
+        assert np.allclose(x, x_ref)
+        assert np.allclose(y, y_ref, rtol=1e-4, atol=1e-3)
+
+    calibration_model.integrate_1d_stack(frames, 81)
+    assert calibration_model.stack_integration_method == "csr"
+
+
+def test_tune_integration_method_with_supersampling(calibration_model, img_model, method_tuner):
+    load_small_image_with_calibration(calibration_model, shape=(40, 50))
+    calibration_model.set_supersampling(2)
+    with pytest.raises(ValueError):
+        calibration_model.tune_integration_method(80)
+
+
+def create_region_mask(shape, region):
+    mask = np.ones(shape, dtype=bool)
+    mask[region[0]:region[1], region[2]:region[3]] = False
+    return mask
+
+
+@pytest.mark.parametrize("factor", [1, 2])
+def test_integrate_region(calibration_model, img_model, engine_cache, factor):
+    load_small_image_with_calibration(calibration_model, shape=(40, 50))
+    calibration_model.set_supersampling(factor)
+    region = (5, 30, 10, 45)
+    mask = create_region_mask((40, 50), region)
+
+    x_ref, y_ref = calibration_model.integrate_1d(80, mask=mask, trim_zeros=False)
+    x, y = calibration_model.integrate_1d(80, mask=mask, trim_zeros=False, region=region)
+    assert np.allclose(x, x_ref)
+    assert np.allclose(y, y_ref, rtol=1e-4, atol=1e-3)
+
+    cropped_img_data = img_model.img_data[5:30, 10:45]
+    _, y_cropped = calibration_model.integrate_1d(80, mask=mask, trim_zeros=False, img_data=cropped_img_data,
+                                                  region=region)
+    assert np.array_equal(y, y_cropped)
+
+    cake_ref = calibration_model.integrate_2d(mask=mask, rad_points=50, azimuth_points=36)
+    cake = calibration_model.integrate_2d(mask=mask, rad_points=50, azimuth_points=36, img_data=cropped_img_data,
+                                          region=region)
+    assert np.allclose(cake, cake_ref, rtol=1e-4, atol=1e-3)
+
+
+def test_integrate_region_needs_everything_outside_to_be_masked(calibration_model, img_model, engine_cache):
+    load_small_image_with_calibration(calibration_model, shape=(40, 50))
+    with pytest.raises(ValueError):
+        calibration_model.integrate_1d(80, region=(5, 30, 10, 45))
+
+
+def test_integrate_1d_stack_of_region(calibration_model, img_model, engine_cache):
+    load_small_image_with_calibration(calibration_model, shape=(40, 50))
+    region = (5, 30, 10, 45)
+    mask = create_region_mask((40, 50), region)
+    frames = np.random.randint(0, 1000, size=(3, 40, 50)).astype(np.uint16)
+    corrections = np.random.random((40, 50)) + 0.5
+
+    x_ref, y_ref = calibration_model.integrate_1d_stack(frames, 80, mask=mask, corrections=corrections)
+    x, y = calibration_model.integrate_1d_stack(frames[:, 5:30, 10:45], 80, mask=mask,
+                                                corrections=corrections[5:30, 10:45], region=region)
+    assert np.allclose(x, x_ref)
+    assert np.allclose(y, y_ref, rtol=1e-4, atol=1e-3)
+    _, y_full = calibration_model.integrate_1d_stack(frames, 80, mask=mask, corrections=corrections, region=region)
+    assert np.allclose(y_full, y_ref, rtol=1e-4, atol=1e-3)
+
+
+def test_integration_mask_is_prepared_once_for_read_only_masks(calibration_model, engine_cache):
+    load_small_image_with_calibration(calibration_model, shape=(30, 30))
+    mask_model = MaskModel((30, 30))
+    mask_model.mask_rect(0, 0, 5, 5)
+
+    mask = mask_model.get_mask()
+    integration_mask, checksum, fully_masked = calibration_model._get_integration_mask(mask)
+    assert calibration_model._get_integration_mask(mask)[0] is integration_mask
+    assert not fully_masked
+
+    mask_model.mask_rect(10, 10, 5, 5)
+    new_integration_mask, new_checksum, _ = calibration_model._get_integration_mask(mask_model.get_mask())
+    assert new_integration_mask is not integration_mask
+    assert new_checksum != checksum
+
+    # writable masks might be changed in place and are prepared every time
+    writable_mask = np.zeros((30, 30), dtype=bool)
+    calibration_model._get_integration_mask(writable_mask)
+    assert calibration_model._integration_mask_cache[0] is not writable_mask
+
+
+def test_fully_masked_image_is_not_integrated(calibration_model, engine_cache):
+    load_small_image_with_calibration(calibration_model, shape=(30, 30))
+    x1, y1 = calibration_model.integrate_1d(50)
+    x2, y2 = calibration_model.integrate_1d(50, mask=np.ones((30, 30), dtype=bool))
+    assert x2 is x1 and y2 is y1
+
+
 def test_correct_solid_angle(calibration_model, img_model):
     load_small_image_with_calibration(calibration_model, shape=(10, 10))
     _, y1 = calibration_model.integrate_1d()
@@ -226,6 +613,25 @@ def test_integration_with_predefined_detector(calibration_model, img_model):
     assert len(calibration_model.tth) > 0
 
 
+def test_detector_mask_fingerprint_is_calculated_once_per_detector_mask(calibration_model, monkeypatch):
+    calibration_model.load_detector("Pilatus CdTe 1M")
+    calibration_model_module = sys.modules[calibration_model.__class__.__module__]
+    fingerprint_fn = MagicMock(wraps=calibration_model_module.mask_fingerprint)
+    monkeypatch.setattr(calibration_model_module, "mask_fingerprint", fingerprint_fn)
+
+    fingerprint = calibration_model.get_detector_mask_fingerprint()
+    assert fingerprint is not None
+    assert calibration_model.get_detector_mask_fingerprint() == fingerprint
+    assert fingerprint_fn.call_count == 1
+
+    calibration_model.rotate_detector_m90()
+    assert calibration_model.get_detector_mask_fingerprint() != fingerprint
+    assert fingerprint_fn.call_count == 2
+
+    calibration_model.reset_detector()
+    assert calibration_model.get_detector_mask_fingerprint() is None
+
+
 def test_integration_with_rotated_predefined_detector(calibration_model, img_model):
     load_pilatus_1M_with_calibration(calibration_model)
     calibration_model.load_detector("Pilatus CdTe 1M")
@@ -626,3 +1032,62 @@ def test_calibrate_without_points(calibration_model):
 def test_refine_without_points(calibration_model):
     with pytest.raises(NoPointsError):
         calibration_model.refine()
+
+
+def test_integration_of_corrected_float32_image(calibration_model, img_model):
+    load_small_image_with_calibration(calibration_model, shape=(30, 30))
+    img_model.factor = 2
+    assert img_model.img_data.dtype == np.float32
+    calibration_model.integrate_1d(50)
+    calibration_model.create_cake_geometry()
+    calibration_model.integrate_2d(rad_points=50, azimuth_points=36)
+
+
+def test_integrate_snapshot_uses_shape_of_the_snapshot(calibration_model, img_model):
+    load_small_image_with_calibration(calibration_model, shape=(30, 30))
+    img_data = img_model.img_data
+    x_ref, y_ref = calibration_model.integrate_1d(num_points=50)
+
+    load_small_image(img_model, shape=(40, 50))
+    with calibration_model.integrate_snapshot((30, 30), img_model.filename):
+        x, y = calibration_model.integrate_1d(num_points=50, img_data=img_data)
+    assert calibration_model.detector.shape == (30, 30)
+    assert np.array_equal(x, x_ref)
+    assert np.array_equal(y, y_ref)
+
+    calibration_model.integrate_1d(num_points=50)
+    assert calibration_model.detector.shape == (40, 50)
+    with calibration_model.integrate_snapshot((30, 30), img_model.filename):
+        with pytest.raises(ValueError):
+            calibration_model.integrate_1d(num_points=50, img_data=img_data)
+
+    # synchronous integrations of a snapshot can reset the detector
+    with calibration_model.integrate_snapshot((30, 30), img_model.filename, reset_detector=True):
+        x, y = calibration_model.integrate_1d(num_points=50, img_data=img_data)
+    assert calibration_model.detector.shape == (30, 30)
+    assert np.array_equal(x, x_ref)
+    assert np.array_equal(y, y_ref)
+
+
+def test_geometry_changes_wait_for_the_integration_lock(calibration_model, img_model):
+    load_small_image_with_calibration(calibration_model, shape=(30, 30))
+    integrating = threading.Event()
+    finish_integration = threading.Event()
+
+    def integrate():
+        with calibration_model.integration_lock:
+            integrating.set()
+            finish_integration.wait(5)
+
+    integration_thread = threading.Thread(target=integrate)
+    integration_thread.start()
+    integrating.wait(5)
+    supersampling_thread = threading.Thread(target=calibration_model.set_supersampling, args=(2,))
+    supersampling_thread.start()
+    supersampling_thread.join(0.2)
+    assert calibration_model.supersampling_factor == 1
+
+    finish_integration.set()
+    integration_thread.join(5)
+    supersampling_thread.join(5)
+    assert calibration_model.supersampling_factor == 2
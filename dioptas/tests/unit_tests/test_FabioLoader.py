@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import zlib
+
+import pytest
+import numpy as np
+import fabio
+
+from ...model.loader import FabioLoader as fabio_loader_module
+from ...model.loader.FabioLoader import FabioLoader, scan_edf_frames
+from ...model.util.cache import PersistentFileIndex
+
+unittest_path = os.path.dirname(__file__)
+data_path = os.path.join(unittest_path, "../data")
+
+EDF_HEADER_LENGTH = 1024
+
+
+def write_edf(filename, frames, compression=None, byte_order="LowByteFirst"):
+    dtype = np.dtype("<u2" if byte_order == "LowByteFirst" else ">u2")
+    with open(filename, "wb") as f:
+        for ind, frame in enumerate(frames):
+            blob = frame.astype(dtype).tobytes()
+            if compression == "Z":
+                blob = zlib.compress(blob)
+            header = "{{\nHeaderID = EH:{0:06d}:000000:000000 ;\nImage = {1} ;\nByteOrder = {2} ;\n" \
+                     "DataType = UnsignedShort ;\nDim_1 = {3} ;\nDim_2 = {4} ;\nSize = {5} ;\n".format(
+                         ind + 1, ind + 1, byte_order, frame.shape[1], frame.shape[0], len(blob))
+            if compression is not None:
+                header += "Compression = {} ;\n".format(compression)
+            header = header.ljust(EDF_HEADER_LENGTH - 2) + "}\n"
+            f.write(header.encode("ascii"))
+            f.write(blob)
+
+
+@pytest.fixture
+def frames():
+    return np.random.randint(0, 60000, size=(6, 15, 20)).astype(np.uint16)
+
+
+@pytest.fixture
+def frame_index_cache(tmp_path, monkeypatch):
+    cache = PersistentFileIndex(str(tmp_path / "cache" / "edf_frame_index.json"))
+    monkeypatch.setattr(fabio_loader_module, "frame_index_cache", cache)
+    return cache
+
+
+@pytest.mark.parametrize("compression, byte_order", [
+    (None, "LowByteFirst"),
+    (None, "HighByteFirst"),
+    ("Z", "LowByteFirst"),
+])
+def test_multi_frame_edf_is_indexed(tmp_path, frames, frame_index_cache, compression, byte_order):
+    filename = str(tmp_path / "series.edf")
+    write_edf(filename, frames, compression, byte_order)
+
+    loader = FabioLoader(filename)
+    assert loader.frame_index is not None
+    assert loader._fabio_image is None
+    assert loader.series_max == 6
+
+    for ind in [5, 0, 3]:
+        assert np.array_equal(loader.get_image(ind), frames[ind][::-1])
+    assert np.array_equal(loader.get_image(2), fabio.open(filename).get_frame(2).data[::-1])
+
+
+def test_edf_frame_index_is_cached_on_disk(tmp_path, frames, frame_index_cache, monkeypatch):
+    filename = str(tmp_path / "series.edf")
+    write_edf(filename, frames)
+    FabioLoader(filename)
+    assert frame_index_cache.get(filename)["offsets"][0] == EDF_HEADER_LENGTH
+
+    def fail(*args):
+        raise AssertionError("the file should not be scanned again")
+
+    monkeypatch.setattr(fabio_loader_module, "scan_edf_frames", fail)
+    loader = FabioLoader(filename)
+    assert np.array_equal(loader.get_image(4), frames[4][::-1])
+
+
+def test_single_frame_edf_is_read_by_fabio(tmp_path, frames, frame_index_cache):
+    filename = str(tmp_path / "single.edf")
+    write_edf(filename, frames[:1])
+    assert scan_edf_frames(filename) is None
+
+    loader = FabioLoader(filename)
+    assert loader.frame_index is None
+    assert loader.series_max == 1
+    assert np.array_equal(loader.get_image(0), frames[0][::-1])
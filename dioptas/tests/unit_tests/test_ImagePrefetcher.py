@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+import numpy as np
+from mock import MagicMock
+
+from ...model.util.cache import LRUCache, PersistentFileIndex
+from ...model.util.ImagePrefetcher import ImagePrefetcher
+
+
+def test_lru_cache_evicts_least_recently_used_item():
+    cache = LRUCache(max_items=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+
+
+def test_lru_cache_respects_memory_budget():
+    cache = LRUCache(max_bytes=3 * 800)
+    for ind in range(5):
+        cache.put(ind, np.zeros(100))
+
+    assert len(cache) == 3
+    assert cache.total_bytes == 3 * 800
+    assert cache.keys() == [2, 3, 4]
+
+    cache.put("too_large", np.zeros(1000))
+    assert "too_large" not in cache
+
+
+def test_persistent_file_index_merges_the_entries_of_several_processes(tmp_path):
+    filenames = [str(tmp_path / "file{}.txt".format(i)) for i in range(2)]
+    for filename in filenames:
+        with open(filename, "w") as f:
+            f.write(filename)
+    index_filename = str(tmp_path / "index" / "index.json")
+    index1 = PersistentFileIndex(index_filename, save_interval=3600)
+    index2 = PersistentFileIndex(index_filename, save_interval=3600)
+
+    index1.put(filenames[0], 1)
+    index2.put(filenames[1], 2)
+    assert PersistentFileIndex(index_filename).get(filenames[0]) == 1
+    assert PersistentFileIndex(index_filename).get(filenames[1]) == 2
+
+    # later changes are saved by flush
+    index1.put(filenames[0], 3)
+    assert PersistentFileIndex(index_filename).get(filenames[0]) == 1
+    index1.flush()
+    assert PersistentFileIndex(index_filename).get(filenames[0]) == 3
+    assert PersistentFileIndex(index_filename).get(filenames[1]) == 2
+    assert os.listdir(os.path.dirname(index_filename)) == ["index.json"]
+
+
+def test_prefetcher_reads_only_once():
+    prefetcher = ImagePrefetcher()
+    read_fn = MagicMock(return_value=np.ones(10))
+
+    prefetcher.prefetch([(("file", None, 1), read_fn)])
+    prefetcher.wait()
+    assert ("file", None, 1) in prefetcher
+
+    data = prefetcher.get(("file", None, 1), read_fn)
+    assert np.array_equal(data, np.ones(10))
+    read_fn.assert_called_once_with()
+
+
+def test_prefetcher_guesses_direction():
+    prefetcher = ImagePrefetcher()
+    prefetcher.reset_direction(10)
+    assert prefetcher.update_direction(8) == -2
+    assert prefetcher.update_direction(6) == -2
+    assert prefetcher.update_direction(7) == 1
+
+
+def test_prefetcher_discard():
+    prefetcher = ImagePrefetcher()
+    prefetcher.get(("file1", None, 0), lambda: np.ones(2))
+    prefetcher.get(("file2", None, 0), lambda: np.ones(2))
+    prefetcher.discard(lambda key: key[0] == "file1")
+
+    assert ("file1", None, 0) not in prefetcher
+    assert ("file2", None, 0) in prefetcher
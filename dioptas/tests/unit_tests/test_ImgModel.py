@@ -21,12 +21,16 @@
 import pytest
 from mock import MagicMock, patch
 import os
+import sys
 
+import h5py
 import numpy as np
 
 from ...model.ImgModel import ImgModel, BackgroundDimensionWrongException
 from ...model.util.ImgCorrection import DummyCorrection
 from ...model.loader.KaraboLoader import extra_data_installed
+from ...model.loader.LambdaLoader import LambdaImage
+from ...model.loader.LoaderRegistry import register_loader, unregister_loader
 
 unittest_path = os.path.dirname(__file__)
 data_path = os.path.join(unittest_path, "../data")
@@ -127,6 +131,7 @@ def test_background_subtraction_with_transformation(img_model):
 
 
 def test_background_scaling_and_offset(img_model):
+    img_model.corrected_dtype = np.float64
     img_model.load_background(os.path.join(data_path, "image_002.tif"))
 
     # assure that everything is correct before
@@ -288,6 +293,31 @@ def test_loading_spe_file(img_model):
     assert img_model.img_data.shape == (1042, 1042)
 
 
+def create_spe_file(filename, frames):
+    header = np.zeros(4100, dtype=np.uint8)
+    header[42:44] = np.frombuffer(np.int16(frames.shape[2]).tobytes(), np.uint8)
+    header[656:658] = np.frombuffer(np.int16(frames.shape[1]).tobytes(), np.uint8)
+    header[108:110] = np.frombuffer(np.uint16(3).tobytes(), np.uint8)
+    header[1446:1450] = np.frombuffer(np.int32(frames.shape[0]).tobytes(), np.uint8)
+    with open(filename, "wb") as f:
+        f.write(header.tobytes())
+        f.write(frames.astype("<u2").tobytes())
+
+
+def test_loading_multi_frame_spe_file(img_model, tmp_path):
+    frames = np.random.randint(0, 1000, size=(4, 30, 20)).astype(np.uint16)
+    filename = str(tmp_path / "series.spe")
+    create_spe_file(filename, frames)
+
+    img_model.load(filename)
+    assert img_model.series_max == 4
+    assert np.array_equal(img_model.raw_img_data, frames[0])
+
+    img_model.load_series_img(3)
+    assert np.array_equal(img_model.raw_img_data, frames[2])
+    assert isinstance(img_model.series_get_image(1), np.memmap)
+
+
 def test_loading_ESRF_hdf5_file(img_model):
     img_model.load(os.path.join(data_path, "hdf5_dataset", "ma4500_demoh5.h5"))
     assert img_model.img_data.shape == (2048, 2048)
@@ -318,6 +348,20 @@ def test_loading_karabo_file(img_model):
     assert img_model.img_data.shape == (356, 384)
 
 
+def test_karabo_file_is_opened_only_once(img_model):
+    filename = os.path.join(data_path, "karabo_epix.h5")
+    img_model.load(filename)
+    karabo_file = img_model.loader
+
+    img_model.load(filename)
+    assert img_model.loader is karabo_file
+
+    images = karabo_file.get_images(0, 2)
+    assert images.shape[0] == min(2, karabo_file.series_max)
+    assert np.array_equal(images[0], karabo_file.get_image(0))
+    assert len(karabo_file._selections) == 1
+
+
 def test_loading_karabo_file_without_extra_data(img_model):
     """Test that loading a karabo file when extra_data is not installed returns None"""
     with patch("dioptas.model.loader.KaraboLoader.extra_data_installed", False):
@@ -328,3 +372,254 @@ def test_loading_karabo_file_without_extra_data(img_model):
         # Verify that other file types still work
         img_model.load(os.path.join(data_path, "image_001.tif"))
         assert img_model.img_data is not None
+
+
+def test_series_images_are_prefetched(img_model):
+    img_model.load(
+        os.path.join(data_path, "lambda", "testasapo1_1009_00002_m1_part00000.nxs")
+    )
+    img_model.load_series_img(2)
+    img_model.frame_prefetcher.wait()
+
+    for ind in range(2, 2 + img_model.frame_prefetcher.num_prefetch):
+        assert img_model._series_cache_key(ind) in img_model.frame_prefetcher
+
+    img_model.load_series_img(3)
+    assert np.array_equal(
+        img_model.raw_img_data, img_model.series_get_image(2)
+    )
+
+
+@pytest.mark.parametrize("transformed", [False, True])
+def test_get_series_images_of_hdf5_file(img_model, tmp_path, transformed):
+    filename = str(tmp_path / "frames.h5")
+    frames = np.random.randint(0, 1000, size=(5, 20, 30)).astype(np.uint16)
+    with h5py.File(filename, "w") as f:
+        f.create_dataset("entry/data/data", data=frames)
+    img_model.load(filename)
+    if transformed:
+        img_model.rotate_img_m90()
+        img_model.flip_img_horizontally()
+
+    images = img_model.get_series_images(1, 4, region=(3, 12, 5, 18))
+    assert images.shape == (3, 9, 13)
+    for pos, image in enumerate(images, 2):
+        img_model.load_series_img(pos)
+        assert np.array_equal(image, img_model.raw_img_data[3:12, 5:18])
+
+
+def test_get_series_images_of_lambda_and_single_image_files(img_model):
+    img_model.load(os.path.join(data_path, "lambda", "testasapo1_1009_00002_m1_part00000.nxs"))
+    img_model.rotate_img_p90()
+    images = img_model.get_series_images(2, 5)
+    assert len(images) == 3
+    for pos, image in enumerate(images, 3):
+        img_model.load_series_img(pos)
+        assert np.array_equal(image, img_model.raw_img_data)
+
+    img_model.load(os.path.join(data_path, "CeO2_Pilatus1M.tif"))
+    images = img_model.get_series_images(0, 1)
+    assert len(images) == 1
+    assert np.array_equal(images[0], img_model.raw_img_data)
+
+
+def test_get_series_blocks(img_model, monkeypatch):
+    img_model.load(os.path.join(data_path, "lambda", "testasapo1_1009_00002_m1_part00000.nxs"))
+    assert img_model.get_series_blocks() == [(0, 10)]
+    assert img_model.get_series_blocks([0, 1, 2, 5, 6, 9]) == [(0, 3), (5, 7), (9, 10)]
+
+    monkeypatch.setattr(sys.modules[ImgModel.__module__], "MAX_FRAMES_PER_BLOCK", 4)
+    assert img_model.get_series_blocks() == [(0, 4), (4, 8), (8, 10)]
+    monkeypatch.setattr(sys.modules[ImgModel.__module__], "MAX_BLOCK_BYTES", img_model.raw_img_data.nbytes * 3)
+    assert img_model.get_series_blocks([1, 2, 3, 4]) == [(1, 4), (4, 5)]
+
+
+def test_prefetching_follows_backward_navigation(img_model):
+    img_model.load(
+        os.path.join(data_path, "lambda", "testasapo1_1009_00002_m1_part00000.nxs"),
+        8,
+    )
+    img_model.load_series_img(8)
+    img_model.frame_prefetcher.wait()
+
+    for ind in range(4, 7):
+        assert img_model._series_cache_key(ind) in img_model.frame_prefetcher
+    assert img_model._series_cache_key(9) not in img_model.frame_prefetcher
+
+
+def test_disabled_prefetching_does_not_cache(img_model):
+    img_model.frame_prefetcher.enabled = False
+    img_model.load(
+        os.path.join(data_path, "lambda", "testasapo1_1009_00002_m1_part00000.nxs")
+    )
+    img_model.load_series_img(2)
+    assert img_model._series_cache_key(1) not in img_model.frame_prefetcher
+    assert img_model.frame_prefetcher._executor is None
+
+
+def test_img_data_is_cached_until_input_changes(img_model):
+    img_model._img_data = np.ones((100, 100))
+    img_data = img_model.img_data
+    assert img_model.img_data is img_data
+    assert not img_data.flags.writeable
+    version = img_model.img_data_version
+
+    img_model.factor = 2
+    assert img_model.img_data_version > version
+    assert img_model.img_data is not img_data
+    assert np.array_equal(img_model.img_data, 2 * np.ones((100, 100)))
+
+
+def test_img_data_composition_with_background_and_correction(img_model):
+    img_model._img_data = np.ones((100, 100)) * 10
+    img_model.background_data = np.ones((100, 100)) * 2
+    img_model.add_img_correction(DummyCorrection((100, 100), 2))
+    img_model.factor = 3
+
+    assert np.array_equal(img_model.img_data, (10 - 2) / 2 * 3 * np.ones((100, 100)))
+    assert img_model.img_shape == (100, 100)
+
+
+def test_img_data_region_is_composed_alone(img_model):
+    raw_data = np.arange(100 * 100, dtype=np.float64).reshape((100, 100))
+    img_model._img_data = raw_data
+    img_model.background_data = np.ones((100, 100)) * 2
+    img_model.add_img_correction(DummyCorrection((100, 100), 2))
+    img_model.factor = 3
+
+    region = img_model.get_img_data_region((10, 20, 30, 60))
+    assert img_model._composed_img_data is None
+    assert region.shape == (10, 30)
+    assert np.allclose(region, (raw_data[10:20, 30:60] - 2) / 2 * 3)
+    assert np.array_equal(region, img_model.img_data[10:20, 30:60])
+    assert np.array_equal(img_model.get_img_data_region((10, 20, 30, 60)), region)
+
+
+def test_corrected_img_data_uses_corrected_dtype(img_model):
+    raw_data = np.arange(100 * 100, dtype=np.uint16).reshape((100, 100))
+    img_model._img_data = raw_data
+    assert img_model.img_data.dtype == np.uint16
+
+    img_model.background_data = np.ones((100, 100), dtype=np.uint16)
+    img_model.background_scaling = 2.4
+    assert img_model.corrected_dtype == np.float32
+    assert img_model.img_data.dtype == np.float32
+    assert img_model.raw_img_data.dtype == np.uint16
+    assert np.allclose(img_model.img_data, raw_data - 2.4)
+
+    img_model.corrected_dtype = np.float64
+    assert img_model.img_data.dtype == np.float64
+    assert np.array_equal(img_model.img_data, raw_data - 2.4 * np.ones((100, 100)))
+
+    with pytest.raises(ValueError):
+        img_model.corrected_dtype = np.int32
+
+
+def test_loader_candidates_are_selected_by_file_type(img_model):
+    tif_candidates = img_model.loader_registry.get_candidates(
+        os.path.join(data_path, "CeO2_Pilatus1M.tif")
+    )
+    assert [loader.name for loader in tif_candidates] == ["PIL", "fabio"]
+
+    h5_candidates = img_model.loader_registry.get_candidates(
+        os.path.join(data_path, "hdf5_dataset", "ma4500_demoh5.h5")
+    )
+    assert "PIL" not in [loader.name for loader in h5_candidates]
+    assert "hdf5" in [loader.name for loader in h5_candidates]
+
+
+def test_successful_loader_is_tried_first(img_model):
+    filename = os.path.join(
+        data_path, "lambda", "testasapo1_1009_00002_m1_part00000.nxs"
+    )
+    img_model.load(filename)
+    assert img_model.loader_registry.get_winner(filename) == "lambda"
+
+    candidates = img_model.loader_registry.get_candidates(
+        filename.replace("part00000", "part00001")
+    )
+    assert candidates[0].name == "lambda"
+
+
+def test_register_third_party_loader(img_model):
+    def load_dummy(filename, frame_index):
+        return {"img_data": np.ones((10, 20)) * (frame_index + 1)}
+
+    register_loader("dummy", load_dummy, extensions=[".dummy"])
+    try:
+        img_model.load("test.dummy")
+        assert img_model.img_shape == (10, 20)
+        assert np.sum(img_model.img_data) == 200
+    finally:
+        unregister_loader("dummy")
+
+    with pytest.raises(IOError):
+        img_model.load("test.dummy")
+
+
+def test_errors_of_matching_loaders_are_reported():
+    img_model = ImgModel()
+
+    def load_broken(filename, frame_index):
+        raise ValueError("broken file")
+
+    def load_out_of_memory(filename, frame_index):
+        raise MemoryError()
+
+    register_loader("broken", load_broken, extensions=[".broken"])
+    try:
+        with pytest.raises(IOError, match="broken file"):
+            img_model.load("test.broken")
+        register_loader("broken", load_out_of_memory, extensions=[".broken"])
+        with pytest.raises(MemoryError):
+            img_model.load("test.broken")
+        with pytest.raises(MemoryError):
+            img_model.get_frame_count("test.broken")
+    finally:
+        unregister_loader("broken")
+
+
+def test_frames_are_counted_without_loading_images():
+    img_model = ImgModel()
+    img_model.load = MagicMock(side_effect=AssertionError("no image should be loaded"))
+    assert img_model.get_frame_count(os.path.join(data_path, "CeO2_Pilatus1M.tif")) == 1
+    lambda_filename = os.path.join(data_path, "lambda", "testasapo1_1009_00002_m1_part00000.nxs")
+    assert img_model.get_frame_count(lambda_filename) == LambdaImage(lambda_filename).series_max
+    with pytest.raises(IOError):
+        img_model.get_frame_count(os.path.join(data_path, "wrong_file_format.txt"))
+
+    # loaders without a count function are counted by loading the first frame
+    def load_dummy(filename, frame_index):
+        return {"img_data": np.ones((10, 20)), "series_max": 5}
+
+    register_loader("dummy", load_dummy, extensions=[".dummy"])
+    try:
+        assert img_model.get_frame_count("test.dummy") == 5
+    finally:
+        unregister_loader("dummy")
+
+
+def test_lambda_images_are_stitched_in_native_dtype():
+    lambda_image = LambdaImage(
+        os.path.join(data_path, "lambda", "testasapo1_1009_00002_m1_part00000.nxs")
+    )
+    assert lambda_image.dtype == lambda_image.full_img_data[0].dtype
+
+    # reference stitching into a float canvas
+    reference = np.zeros(lambda_image.shape)
+    for module_nr, module_data in enumerate(lambda_image.full_img_data):
+        row, col = lambda_image._module_pos[module_nr, 1], lambda_image._module_pos[module_nr, 0]
+        height, width = lambda_image.shapes[module_nr]
+        reference[row:row + height, col:col + width] = module_data[3]
+
+    image = lambda_image.get_image(3)
+    assert image.dtype == lambda_image.dtype
+    assert np.array_equal(image, reference[::-1])
+
+    images = lambda_image.get_images(2, 5)
+    assert images.shape == (3,) + lambda_image.shape
+    assert np.array_equal(images[1], image)
+
+    out = np.ones((3,) + lambda_image.shape, dtype=lambda_image.dtype)
+    assert np.array_equal(lambda_image.get_images(2, 5, out=out), images)
+    assert np.array_equal(lambda_image.get_image(3, out=out[0]), image)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+import numpy as np
+from pyFAI.detectors import Pilatus1M
+
+from ...model.util.IntegrationMethodTuner import IntegrationMethodTuner, benchmark_methods, relative_deviation
+
+
+def test_tuned_methods_are_saved(tmp_path):
+    filename = str(tmp_path / "settings" / "integration_methods.json")
+    tuner = IntegrationMethodTuner(filename)
+    key = tuner.create_key(Pilatus1M(), (1043, 981), 1000)
+    assert key != tuner.create_key(Pilatus1M(), (1043, 981), 1000, azimuth_points=360)
+    assert tuner.get(key) == "csr"
+
+    tuner.put(key, "splitbbox")
+    assert os.path.exists(filename)
+    assert IntegrationMethodTuner(filename).get(key) == "splitbbox"
+
+    tuner.clear()
+    assert IntegrationMethodTuner(filename).get(key) == "csr"
+
+
+def test_benchmark_excludes_failing_and_deviating_methods():
+    x = np.linspace(0, 10, 100)
+    results = {"a": np.sin(x) + 2, "b": np.sin(x) + 2.001, "c": np.cos(x) + 2}
+
+    def integrate(method):
+        if method == "d":
+            raise ValueError("not available")
+        return x, results[method]
+
+    timings = benchmark_methods(integrate, ["a", "b", "c", "d"], repeats=2, tolerance=1e-2)
+    assert timings["a"] is not None
+    assert timings["b"] is not None
+    assert timings["c"] is None
+    assert timings["d"] is None
+
+
+def test_relative_deviation_interpolates_the_radial_positions():
+    x = np.linspace(0, 10, 100)
+    cake = np.vstack([x, 2 * x])
+    assert relative_deviation((x, cake), (x + 0.05, cake + 0.05 * np.array([[1], [2]]))) < 1e-3
+    assert relative_deviation((x, x), (x, 1.1 * x)) > 0.05
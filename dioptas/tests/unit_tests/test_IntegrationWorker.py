@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+
+import pytest
+
+from ...model.util.IntegrationWorker import IntegrationWorker
+
+
+def create_job(name, executed, applied, started=None, release=None):
+    def job(is_cancelled):
+        executed.append(name)
+        if started is not None:
+            started.set()
+            release.wait(5)
+        return lambda: applied.append(name)
+
+    return job
+
+
+def test_latest_job_wins():
+    worker = IntegrationWorker()
+    executed, applied = [], []
+    started, release = threading.Event(), threading.Event()
+
+    worker.submit("config", create_job(1, executed, applied, started, release))
+    started.wait(5)
+    for name in [2, 3, 4]:
+        worker.submit("config", create_job(name, executed, applied))
+    release.set()
+    worker.wait(5)
+
+    assert executed == [1, 4]
+    assert applied == [4]
+
+
+def test_jobs_with_different_keys_are_not_coalesced():
+    worker = IntegrationWorker()
+    executed, applied = [], []
+    started, release = threading.Event(), threading.Event()
+
+    worker.submit("config 1", create_job(1, executed, applied, started, release))
+    started.wait(5)
+    worker.submit("config 2", create_job(2, executed, applied))
+    release.set()
+    worker.wait(5)
+
+    assert applied == [1, 2]
+
+
+def test_cancel_discards_result():
+    worker = IntegrationWorker()
+    executed, applied = [], []
+    started, release = threading.Event(), threading.Event()
+
+    worker.submit("config", create_job(1, executed, applied, started, release))
+    started.wait(5)
+    worker.cancel("config")
+    release.set()
+    worker.wait(5)
+
+    assert executed == [1]
+    assert applied == []
+
+
+def test_results_are_dispatched():
+    dispatched = []
+    worker = IntegrationWorker(dispatched.append)
+    executed, applied = [], []
+
+    worker.submit("config", create_job(1, executed, applied))
+    worker.wait(5)
+    assert applied == []
+
+    dispatched[0]()
+    assert applied == [1]
+
+
+def test_superseded_dispatched_result_is_not_applied():
+    dispatched = []
+    worker = IntegrationWorker(dispatched.append)
+    executed, applied = [], []
+
+    worker.submit("config", create_job(1, executed, applied))
+    worker.wait(5)
+    worker.submit("config", create_job(2, executed, applied))
+    worker.wait(5)
+
+    for fn in dispatched:
+        fn()
+    assert applied == [2]
+
+
+def test_errors_are_raised_when_applying_the_result():
+    dispatched = []
+    worker = IntegrationWorker(dispatched.append)
+
+    def failing_job(is_cancelled):
+        raise ValueError("integration failed")
+
+    worker.submit("config", failing_job)
+    worker.wait(5)
+
+    with pytest.raises(ValueError):
+        dispatched[0]()
@@ -22,6 +22,12 @@ multi_file_img_path = os.path.join(
 )
 
 
+def mock_integrate_1d_stack(x, y):
+    return MagicMock(
+        side_effect=lambda frames, *args, **kwargs: (x, np.tile(y, (len(frames), 1)))
+    )
+
+
 @pytest.fixture
 def configuration() -> Configuration:
     return Configuration()
@@ -148,12 +154,12 @@ def test_integrates_each_image_only_once(
     )
     x = np.linspace(0, 10, 100)
     y = np.sin(x)
-    configuration.calibration_model.integrate_1d = MagicMock(return_value=(x, y))
+    integrate_1d_stack = mock_integrate_1d_stack(x, y)
+    configuration.calibration_model.integrate_1d_stack = integrate_1d_stack
     map_model.load(map_img_file_paths)
 
-    assert configuration.calibration_model.integrate_1d.call_count == len(
-        map_img_file_paths
-    )
+    frames = [call.args[0] for call in integrate_1d_stack.call_args_list]
+    assert sum(len(block) for block in frames) == len(map_img_file_paths)
 
 
 def test_emits_point_integrated_signal(
@@ -162,10 +168,10 @@ def test_emits_point_integrated_signal(
     configuration.calibration_model.load(
         os.path.join(unittest_data_path, "CeO2_Pilatus1M.poni")
     )
-    # mock the integrate_1d method
+    # mock the integration of the frames
     x = np.linspace(0, 10, 100)
     y = np.sin(x)
-    configuration.calibration_model.integrate_1d = MagicMock(return_value=(x, y))
+    configuration.calibration_model.integrate_1d_stack = mock_integrate_1d_stack(x, y)
 
     listener = MagicMock()
     map_model.point_integrated.connect(listener)
@@ -181,13 +187,14 @@ def test_emits_point_integrated_signal_with_multiimage_file(
     configuration.calibration_model.load(
         os.path.join(unittest_data_path, "CeO2_Pilatus1M.poni")
     )
-    # mock the integrate_1d method
+    # mock the integration of the frames
     x = np.linspace(0, 10, 100)
     y = np.sin(x)
-    configuration.calibration_model.integrate_1d = MagicMock(return_value=(x, y))
+    configuration.calibration_model.integrate_1d_stack = mock_integrate_1d_stack(x, y)
 
     listener = MagicMock()
     map_model.point_integrated.connect(listener)
 
     map_model.load([multi_file_img_path])
     assert listener.call_count == 10
+    assert listener.call_args_list[-1].args == (1,)
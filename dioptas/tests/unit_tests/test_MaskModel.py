@@ -129,6 +129,36 @@ def test_use_roi(mask_model):
                                     [1, 1, 1]]))
 
 
+def test_composite_mask_is_cached_until_the_next_edit(mask_model):
+    mask_model.roi = [0, 5, 0, 5]
+    mask = mask_model.get_mask()
+    fingerprint = mask_model.get_mask_fingerprint()
+    version = mask_model.mask_version
+
+    assert mask_model.get_mask() is mask
+    assert not mask.flags.writeable
+    assert mask_model.roi_mask.dtype == bool
+
+    # setting the same roi again is not an edit
+    mask_model.roi = (0, 5, 0, 5)
+    assert mask_model.mask_version == version
+    assert mask_model.get_mask() is mask
+
+    mask_model.mask_rect(0, 0, 2, 2)
+    assert mask_model.mask_version > version
+    assert mask_model.get_mask() is not mask
+    assert mask_model.get_mask()[1, 1]
+    assert mask_model.get_mask_fingerprint() != fingerprint
+
+    version = mask_model.mask_version
+    mask_model.undo()
+    assert mask_model.mask_version > version
+    assert mask_model.get_mask_fingerprint() == fingerprint
+
+    mask_model.roi = None
+    assert np.array_equal(mask_model.get_mask(), mask_model.get_img())
+
+
 @pytest.mark.parametrize("extension", [".mask", ".npy", ".edf"])
 def test_save_mask(mask_model, tmp_path, extension):
     mask_model.mask_below_threshold(np.zeros(shape=(10, 10)), 1)
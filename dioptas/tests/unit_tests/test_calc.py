@@ -1,6 +1,6 @@
 import numpy as np
 
-from ...model.util.calc import trim_trailing_zeros
+from ...model.util.calc import trim_trailing_zeros, trim_trailing_zero_columns, supersample_image
 
 
 def test_trim_trailing_zeros():
@@ -12,3 +12,28 @@ def test_trim_trailing_zeros():
 
     assert len(y_trim) == len(y) - 10
     assert len(x_trim) == len(y) - 10
+
+
+def test_trim_trailing_zero_columns():
+    x = np.linspace(0, 20)
+    intensities = np.ones((3, len(x)))
+    intensities[:, -10:] = 0
+    intensities[1, -10:-5] = 2
+
+    x_trim, intensities_trim = trim_trailing_zero_columns(x, intensities)
+    assert len(x_trim) == len(x) - 5
+    assert intensities_trim.shape == (3, len(x) - 5)
+
+    # like trim_trailing_zeros patterns, which are completely 0, are not trimmed
+    intensities[2] = 0
+    x_trim, intensities_trim = trim_trailing_zero_columns(x, intensities)
+    assert len(x_trim) == len(x)
+
+
+def test_supersample_image_keeps_dtype():
+    img_data = np.arange(6, dtype=np.uint16).reshape((2, 3))
+    supersampled = supersample_image(img_data, 2)
+    assert supersampled.dtype == np.uint16
+    assert supersampled.shape == (4, 6)
+    assert np.array_equal(supersampled[::2, ::2], img_data)
+    assert np.array_equal(supersampled[1::2, 1::2], img_data)
@@ -1,5 +1,10 @@
 import os
+
+import numpy as np
+from mock import MagicMock
+
 from dioptas.model.Configuration import Configuration
+from dioptas.model.util.IntegrationWorker import IntegrationWorker
 from ..utility import unittest_data_path
 
 
@@ -26,3 +31,346 @@ def test_auto_save_background_subtracted_pattern(tmp_path):
     assert os.path.exists(os.path.join(tmp_path, "image_001.xy"))
     assert os.path.exists(os.path.join(tmp_path, "bkg_subtracted", "image_001.xy"))
 
+
+
+def test_integrate_image_stack_1d():
+    config = Configuration()
+    config.calibration_model.load(os.path.join(unittest_data_path, "CeO2_Pilatus1M.poni"))
+    frames = np.random.randint(0, 1000, size=(3, 40, 50)).astype(np.uint16)
+    config.img_model._img_data = frames[0]
+    config.integration_rad_points = 60
+    config.img_model.factor = 3
+
+    x, intensities = config.integrate_image_stack_1d(frames)
+    assert intensities.shape == (3, 60)
+
+    for frame, y in zip(frames, intensities):
+        config.img_model._img_data = frame
+        _, y_ref = config.calibration_model.integrate_1d(60, trim_zeros=False)
+        assert np.allclose(y, y_ref, rtol=1e-4, atol=1e-3)
+
+
+def test_integrate_image_stack_1d_with_background_in_unit():
+    config = Configuration()
+    config.calibration_model.load(os.path.join(unittest_data_path, "CeO2_Pilatus1M.poni"))
+    frames = np.random.randint(0, 1000, size=(3, 40, 50)).astype(np.uint16)
+    config.img_model._img_data = frames[0]
+    config.img_model._background_data = np.random.random((40, 50)) * 100
+    config.img_model.background_scaling = 0.5
+    config.integration_rad_points = 60
+
+    x, intensities = config.integrate_image_stack_1d(frames, "q_A^-1")
+    for frame, y in zip(frames, intensities):
+        config.img_model._img_data = frame
+        x_ref, y_ref = config.get_integrated_pattern("q_A^-1")
+        assert np.allclose(x[:len(x_ref)], x_ref)
+        assert np.allclose(y[:len(y_ref)], y_ref, rtol=1e-4, atol=1e-3)
+
+
+def test_integrate_image_stack_sectors():
+    config = Configuration()
+    config.calibration_model.load(os.path.join(unittest_data_path, "CeO2_Pilatus1M.poni"))
+    frames = np.random.randint(0, 1000, size=(3, 40, 50)).astype(np.uint16)
+    config.img_model._img_data = frames[0]
+    config.integration_rad_points = 60
+    assert config.integrate_image_stack_sectors(frames) is None
+
+    config.set_integration_sectors(3, (-136, -130))
+    x, intensities = config.integrate_image_stack_sectors(frames, "d_A")
+    assert intensities.shape == (3, 3, 60)
+    for frame, y in zip(frames, intensities):
+        config.img_model._img_data = frame
+        x_ref, y_ref = config.integrate_image_sectors("d_A")
+        assert np.allclose(x, x_ref)
+        assert np.allclose(y, y_ref, rtol=1e-4, atol=1e-3)
+
+
+def test_unit_change_between_tth_and_d_does_not_integrate_again():
+    config = Configuration()
+    config.calibration_model.load(os.path.join(unittest_data_path, "CeO2_Pilatus1M.poni"))
+    config.img_model._img_data = np.random.randint(0, 1000, size=(40, 50)).astype(np.uint16)
+    config.integrate_image_1d()
+    tth, y = config.pattern_model.pattern.data
+
+    integrate_1d = config.calibration_model.integrate_1d
+    calls = []
+
+    def counting_integrate_1d(*args, **kwargs):
+        calls.append(kwargs.get("unit"))
+        return integrate_1d(*args, **kwargs)
+
+    config.calibration_model.integrate_1d = counting_integrate_1d
+
+    config.integration_unit = "d_A"
+    assert calls == []
+    d, y_d = config.pattern_model.pattern.data
+    assert config.pattern_model.unit == "d_A"
+    wavelength = config.calibration_model.wavelength
+    assert np.array_equal(d, wavelength / (2 * np.sin(tth / 360 * np.pi)) * 1e10)
+    assert np.array_equal(y_d, y)
+
+    config.integration_unit = "2th_deg"
+    assert calls == []
+    assert np.array_equal(config.pattern_model.pattern.x, tth)
+
+    config.integration_unit = "q_A^-1"
+    assert calls == ["q_A^-1"]
+
+    config.mask_model.set_dimension((40, 50))
+    config.mask_model.mask_rect(0, 0, 10, 10)
+    config.use_mask = True
+    config.integration_unit = "2th_deg"
+    assert calls == ["q_A^-1", "2th_deg"]
+
+
+def test_save_pattern_in_other_unit(tmp_path):
+    config = Configuration()
+    config.calibration_model.load(os.path.join(unittest_data_path, "CeO2_Pilatus1M.poni"))
+    config.img_model._img_data = np.random.randint(0, 1000, size=(40, 50)).astype(np.uint16)
+    config.integrate_image_1d()
+    tth, y = config.pattern_model.pattern.data
+
+    filename = os.path.join(tmp_path, "pattern_d.xy")
+    config.save_pattern(filename, unit="d_A")
+    assert "d_A" in open(filename).read()
+    d_saved, y_saved = np.loadtxt(filename).T
+    wavelength = config.calibration_model.wavelength
+    assert np.allclose(d_saved, wavelength / (2 * np.sin(tth / 360 * np.pi)) * 1e10)
+    assert np.allclose(y_saved, y)
+    assert config.integration_unit == "2th_deg"
+    assert np.array_equal(config.pattern_model.pattern.x, tth)
+
+    filename = os.path.join(tmp_path, "pattern_q.xy")
+    config.save_pattern(filename, unit="q_A^-1")
+    q_saved, _ = np.loadtxt(filename).T
+    x_q, _ = config.calibration_model.integrate_1d(unit="q_A^-1")
+    assert np.allclose(q_saved, x_q)
+
+
+def test_pattern_and_cake_are_integrated_in_one_pass():
+    config = Configuration()
+    config.calibration_model.load(os.path.join(unittest_data_path, "CeO2_Pilatus1M.poni"))
+    config.img_model._img_data = np.random.randint(0, 1000, size=(40, 50)).astype(np.uint16)
+    config.auto_integrate_cake = True
+
+    calls = []
+    calibration_model = config.calibration_model
+    for name in ["integrate_1d", "integrate_2d", "integrate_1d_and_2d"]:
+        def counting(*args, _name=name, _function=getattr(calibration_model, name), **kwargs):
+            calls.append(_name)
+            return _function(*args, **kwargs)
+
+        setattr(calibration_model, name, counting)
+
+    config.img_model.img_changed.emit()
+    assert calls == ["integrate_1d_and_2d"]
+    x, y = config.pattern_model.pattern.data
+    cake = config.cake_img
+
+    config.integration_unit = "d_A"
+    assert calls == ["integrate_1d_and_2d"]
+
+    config.integration_unit = "q_A^-1"
+    config.img_model.img_changed.emit()
+    assert calls == ["integrate_1d_and_2d", "integrate_1d", "integrate_1d", "integrate_2d"]
+
+    config.integration_unit = "2th_deg"
+    del calls[:]
+    config.auto_integrate_cake = False
+    config.img_model.img_changed.emit()
+    assert calls == ["integrate_1d"]
+    x_ref, y_ref = config.pattern_model.pattern.data
+    assert np.array_equal(x, x_ref)
+    assert np.allclose(y, y_ref, rtol=1e-4, atol=1e-3)
+    assert np.allclose(cake, calibration_model.integrate_2d(), rtol=1e-4, atol=1e-3)
+
+
+def test_asynchronous_integration_sets_result_of_latest_image():
+    config = Configuration()
+    config.calibration_model.load(os.path.join(unittest_data_path, "CeO2_Pilatus1M.poni"))
+    config.auto_integrate_cake = True
+    config.integration_unit = "q_A^-1"
+    images = [np.random.randint(0, 1000, size=(40, 50)).astype(np.uint16) for _ in range(3)]
+
+    pattern_changed = MagicMock()
+    config.pattern_model.pattern_changed.connect(pattern_changed)
+    dispatched = []
+    config.integration_worker = IntegrationWorker(dispatched.append)
+    for img_data in images:
+        config.img_model._img_data = img_data
+        config.img_model.img_changed.emit()
+    config.integration_worker.wait(5)
+    pattern_changed.assert_not_called()
+
+    cake_changed = MagicMock()
+    config.cake_changed.connect(cake_changed)
+    for fn in dispatched:
+        fn()
+    pattern_changed.assert_called_once()
+    cake_changed.assert_called_once()
+    x, y = config.pattern_model.pattern.data
+    cake = config.cake_img
+
+    config.integration_worker = None
+    config.img_model.img_changed.emit()
+    x_ref, y_ref = config.pattern_model.pattern.data
+    assert np.array_equal(x, x_ref)
+    assert np.array_equal(y, y_ref)
+    assert np.array_equal(cake, config.cake_img)
+
+
+def test_asynchronous_integration_uses_shape_of_the_submitted_image():
+    config = Configuration()
+    config.calibration_model.load(os.path.join(unittest_data_path, "CeO2_Pilatus1M.poni"))
+    img_data = np.random.randint(0, 1000, size=(40, 50)).astype(np.uint16)
+    config.img_model._img_data = img_data
+    config.img_model.img_changed.emit()
+    x_ref, y_ref = config.pattern_model.pattern.data
+
+    dispatched = []
+    config.integration_worker = IntegrationWorker(dispatched.append)
+    with config.calibration_model.integration_lock:
+        config.img_model.img_changed.emit()
+        # the next image is loading while the integration of the submitted one waits for the lock
+        config.img_model._img_data = np.ones((60, 70))
+    config.integration_worker.wait(5)
+    config.img_model._img_data = img_data
+    for fn in dispatched:
+        fn()
+    config.integration_worker = None
+
+    x, y = config.pattern_model.pattern.data
+    assert np.array_equal(x, x_ref)
+    assert np.array_equal(y, y_ref)
+
+
+def test_asynchronous_integration_is_submitted_again_for_changed_settings():
+    config = Configuration()
+    config.calibration_model.load(os.path.join(unittest_data_path, "CeO2_Pilatus1M.poni"))
+    config.img_model._img_data = np.random.randint(0, 1000, size=(40, 50)).astype(np.uint16)
+    pattern_changed = MagicMock()
+    config.pattern_model.pattern_changed.connect(pattern_changed)
+
+    dispatched = []
+    config.integration_worker = IntegrationWorker(dispatched.append)
+    config.img_model.img_changed.emit()
+    config.integration_worker.wait(5)
+    config.trim_trailing_zeros = False
+    config.calibration_model.integrate_1d = MagicMock(wraps=config.calibration_model.integrate_1d)
+    dispatched.pop()()
+    # the result is outdated, the current settings are integrated in the worker and not in the calling thread
+    pattern_changed.assert_not_called()
+    config.integration_worker.wait(5)
+    config.calibration_model.integrate_1d.assert_called_once()
+    dispatched.pop()()
+    pattern_changed.assert_called_once()
+    config.integration_worker = None
+
+    x, y = config.pattern_model.pattern.data
+    x_ref, y_ref = config.integrate_image_1d()
+    assert np.array_equal(x, x_ref)
+    assert np.array_equal(y, y_ref)
+
+
+def test_integration_is_restricted_to_the_roi():
+    config = Configuration()
+    config.calibration_model.load(os.path.join(unittest_data_path, "CeO2_Pilatus1M.poni"))
+    config.img_model._img_data = np.random.randint(0, 1000, size=(40, 50)).astype(np.uint16)
+    config.mask_model.set_dimension((40, 50))
+    config.integration_rad_points = 60
+    assert config.integration_region is None
+
+    config.mask_model.roi = (5, 30, -3, 45)
+    assert config.integration_region == (5, 30, 0, 45)
+    config.integrate_image_1d()
+    x, y = config.pattern_model.pattern.data
+    x_ref, y_ref = config.calibration_model.integrate_1d(60, mask=config.mask_model.roi_mask)
+    assert np.allclose(x, x_ref)
+    assert np.allclose(y, y_ref, rtol=1e-4, atol=1e-3)
+
+    frames = np.random.randint(0, 1000, size=(2, 25, 45)).astype(np.uint16)
+    _, intensities = config.integrate_image_stack_1d(frames)
+    assert intensities.shape == (2, 60)
+
+
+def test_integrate_image_sectors(tmp_path):
+    import h5py
+
+    config = Configuration()
+    assert config.integrate_image_sectors() is None
+    config.calibration_model.load(os.path.join(unittest_data_path, "CeO2_Pilatus1M.poni"))
+    config.img_model._img_data = np.random.randint(0, 1000, size=(40, 50)).astype(np.uint16)
+    config.integration_rad_points = 60
+    assert config.integrate_image_sectors() is None
+
+    config.set_integration_sectors(3, (-136, -130))
+    assert np.array_equal(config.integration_sector_edges, [-136, -134, -132, -130])
+    x, intensities = config.integrate_image_sectors()
+    assert len(x) == 60
+    assert intensities.shape == (3, 60)
+
+    with h5py.File(os.path.join(tmp_path, "config.hdf5"), "w") as f:
+        config.save_in_hdf5(f.create_group("configuration"))
+    loaded_config = Configuration()
+    with h5py.File(os.path.join(tmp_path, "config.hdf5"), "r") as f:
+        loaded_config.load_from_hdf5(f["configuration"])
+    assert np.array_equal(loaded_config.integration_sector_edges, config.integration_sector_edges)
+
+
+def test_integration_radial_range(tmp_path):
+    import h5py
+
+    config = Configuration()
+    config.calibration_model.load(os.path.join(unittest_data_path, "CeO2_Pilatus1M.poni"))
+    config.img_model._img_data = np.random.randint(0, 1000, size=(40, 50)).astype(np.uint16)
+    config.integrate_image_1d()
+    num_points = len(config.pattern_model.pattern.x)
+
+    config.integration_radial_range = (28.5, 29.5)
+    x, _ = config.pattern_model.pattern.data
+    assert 28.5 <= x[0] and x[-1] <= 29.5
+    assert len(x) < num_points
+
+    # the range is kept when the unit changes
+    config.integration_unit = "d_A"
+    d_range = config.integration_radial_range
+    assert d_range[0] < d_range[1]
+    x, _ = config.pattern_model.pattern.data
+    assert np.all((x >= d_range[0]) & (x <= d_range[1]))
+    config.integration_radial_range = d_range
+    config.integration_unit = "2th_deg"
+    assert np.allclose(config.integration_radial_range, (28.5, 29.5))
+
+    with h5py.File(os.path.join(tmp_path, "config.hdf5"), "w") as f:
+        config.save_in_hdf5(f.create_group("configuration"))
+    loaded_config = Configuration()
+    with h5py.File(os.path.join(tmp_path, "config.hdf5"), "r") as f:
+        loaded_config.load_from_hdf5(f["configuration"])
+    assert np.allclose(loaded_config.integration_radial_range, (28.5, 29.5))
+
+    config.integration_radial_range = None
+    assert len(config.pattern_model.pattern.x) == num_points
+
+
+def test_loaded_configuration_integrates_like_the_saved_one(tmp_path):
+    import h5py
+
+    config = Configuration()
+    config.calibration_model.load(os.path.join(unittest_data_path, "CeO2_Pilatus1M.poni"))
+    config.img_model._img_data = np.random.randint(0, 1000, size=(40, 50)).astype(np.uint16)
+    config.integration_rad_points = 60
+    config.set_integration_sectors(2, (-136, -130))
+
+    with h5py.File(os.path.join(tmp_path, "config.hdf5"), "w") as f:
+        config.save_in_hdf5(f.create_group("configuration"))
+    loaded_config = Configuration()
+    with h5py.File(os.path.join(tmp_path, "config.hdf5"), "r") as f:
+        loaded_config.load_from_hdf5(f["configuration"])
+    loaded_config.integration_rad_points = 60
+    assert loaded_config.correct_solid_angle is True
+
+    x, y = config.get_integrated_pattern("2th_deg")
+    loaded_x, loaded_y = loaded_config.get_integrated_pattern("2th_deg")
+    assert np.array_equal(x, loaded_x)
+    assert np.array_equal(y, loaded_y)
+    assert np.array_equal(config.integrate_image_sectors()[1], loaded_config.integrate_image_sectors()[1])
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+import pytest
+import numpy as np
+import h5py
+
+from ...model.loader import hdf5Loader
+from ...model.loader.hdf5Loader import Hdf5Image, count_hdf5_frames, find_image_sources
+from ...model.util.cache import PersistentFileIndex
+
+unittest_path = os.path.dirname(__file__)
+data_path = os.path.join(unittest_path, "../data")
+
+
+@pytest.fixture
+def frames():
+    return np.random.randint(0, 60000, size=(7, 20, 30)).astype(np.uint16)
+
+
+def create_hdf5_file(path, frames, **kwargs):
+    with h5py.File(path, "w") as f:
+        f.create_dataset("entry/data/data", data=frames, **kwargs)
+    return path
+
+
+@pytest.mark.parametrize("kwargs, direct", [
+    ({}, False),
+    ({"chunks": (1, 20, 30)}, True),
+    ({"chunks": (3, 20, 30)}, True),
+    ({"chunks": (1, 20, 30), "compression": "gzip"}, True),
+    ({"chunks": (2, 20, 30), "compression": "gzip", "shuffle": True}, True),
+    ({"chunks": (1, 10, 10), "compression": "gzip"}, False),
+    ({"chunks": (1, 20, 30), "compression": "lzf"}, False),
+])
+def test_get_images(tmp_path, frames, kwargs, direct):
+    hdf5_image = Hdf5Image(create_hdf5_file(str(tmp_path / "test.h5"), frames, **kwargs))
+    assert (hdf5_image._chunk_decoder is not None) == direct
+
+    for start, stop in [(0, 7), (0, 1), (2, 5), (5, 7), (4, 20)]:
+        images = hdf5_image.get_images(start, stop)
+        assert images.dtype == frames.dtype
+        assert np.array_equal(images, frames[start:stop, ::-1])
+        for ind in range(start, min(stop, 7)):
+            assert np.array_equal(images[ind - start], hdf5_image.get_image(ind))
+
+    assert hdf5_image.get_images(7, 9).shape == (0, 20, 30)
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"chunks": (2, 20, 30), "compression": "gzip"}])
+def test_get_images_of_region(tmp_path, frames, kwargs):
+    hdf5_image = Hdf5Image(create_hdf5_file(str(tmp_path / "test.h5"), frames, **kwargs))
+    images = hdf5_image.get_images(1, 4, region=(3, 12, 5, 25))
+    assert np.array_equal(images, frames[1:4, ::-1][:, 3:12, 5:25])
+    assert hdf5_image.get_images(7, 9, region=(3, 12, 5, 25)).shape == (0, 9, 20)
+
+
+def test_chunk_cache_is_sized_for_frames(tmp_path):
+    frames = np.zeros((2, 1000, 1000), dtype=np.uint32)
+    hdf5_image = Hdf5Image(create_hdf5_file(str(tmp_path / "test.h5"), frames, chunks=(1, 1000, 1000)))
+    nslots, nbytes, w0 = hdf5_image.dataset.id.get_access_plist().get_chunk_cache()
+    assert nbytes >= 2 * 1000 * 1000 * 4
+
+
+def test_get_images_of_esrf_file():
+    hdf5_image = Hdf5Image(os.path.join(data_path, "hdf5_dataset", "ma4500_demoh5.h5"))
+    images = hdf5_image.get_images(0, 2)
+    assert images.shape[0] == min(2, hdf5_image.series_max)
+    assert np.array_equal(images[0], hdf5_image.get_image(0))
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    index = PersistentFileIndex(str(tmp_path / "index" / "sources.json"))
+    monkeypatch.setattr(hdf5Loader, "source_index", index)
+    return index
+
+
+def test_image_sources_are_indexed(tmp_path, frames, index, monkeypatch):
+    filename = create_hdf5_file(str(tmp_path / "test.h5"), frames)
+    sources = Hdf5Image(filename).image_sources
+    assert sources == ["/entry/data/data"]
+    assert index.get(filename) == sources
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the file should not be traversed again")
+
+    monkeypatch.setattr(hdf5Loader, "find_image_sources", fail)
+    assert Hdf5Image(filename).image_sources == sources
+
+    # the index is persistent
+    assert PersistentFileIndex(index.filename).get(filename) == sources
+
+
+def test_image_source_index_detects_changed_files(tmp_path, frames, index):
+    filename = create_hdf5_file(str(tmp_path / "test.h5"), frames)
+    Hdf5Image(filename)
+
+    with h5py.File(filename, "a") as f:
+        f.create_dataset("entry/data2", data=frames)
+    os.utime(filename, ns=(0, 0))
+    assert index.get(filename) is None
+    assert Hdf5Image(filename).image_sources == ["/entry/data/data", "/entry/data2"]
+
+
+def test_count_hdf5_frames(tmp_path, frames, index, monkeypatch):
+    filename = create_hdf5_file(str(tmp_path / "test.h5"), frames)
+    with h5py.File(filename, "a") as f:
+        f.create_dataset("entry/data2", data=frames[:3])
+    find_image_sources = hdf5Loader.find_image_sources
+    found_sources = []
+
+    def find_sources(*args, **kwargs):
+        found_sources.append(find_image_sources(*args, **kwargs))
+        return found_sources[-1]
+
+    monkeypatch.setattr(hdf5Loader, "find_image_sources", find_sources)
+    assert count_hdf5_frames(filename) == 7
+    # only the first source is searched and the incomplete list is not indexed
+    assert found_sources == [["/entry/data/data"]]
+    assert index.get(filename) is None
+
+    Hdf5Image(filename)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the file should not be traversed again")
+
+    monkeypatch.setattr(hdf5Loader, "find_image_sources", fail)
+    assert count_hdf5_frames(filename) == 7
+
+
+def test_nexus_signals_come_first(tmp_path, frames):
+    filename = str(tmp_path / "test.nxs")
+    with h5py.File(filename, "w") as f:
+        f.create_dataset("aaa/data", data=frames)
+        entry = f.create_group("entry")
+        entry.attrs["NX_class"] = "NXentry"
+        entry.attrs["default"] = "plot"
+        plot = entry.create_group("plot")
+        plot.attrs["NX_class"] = "NXdata"
+        plot.attrs["signal"] = "images"
+        plot.create_dataset("images", data=frames)
+
+    with h5py.File(filename, "r") as f:
+        assert find_image_sources(f) == ["/entry/plot/images", "/aaa/data"]
+        assert find_image_sources(f, max_sources=1) == ["/entry/plot/images"]
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import subprocess
+import sys
+
+import h5py
+import numpy as np
+import pytest
+
+from ..utility import unittest_data_path
+from ...core import create_configuration
+from ...core.process import main, prepare_configuration, process_files, read_file_list, tune_integration_method
+from ...model.util.IntegrationMethodTuner import IntegrationMethodTuner
+
+poni_filename = os.path.join(unittest_data_path, "CeO2_Pilatus1M.poni")
+img_filename = os.path.join(unittest_data_path, "CeO2_Pilatus1M.tif")
+
+
+def test_import_core_without_qt():
+    code = "\n".join([
+        "import sys",
+        "for name in ['qtpy', 'PyQt5', 'PyQt6', 'PySide2', 'PySide6']:",
+        "    sys.modules[name] = None",
+        "import dioptas.core",
+        "assert 'dioptas.controller.MainController' not in sys.modules",
+    ])
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    subprocess.check_call([sys.executable, "-c", code], cwd=root)
+
+
+def test_process_files(tmp_path):
+    configuration = create_configuration(poni_filename)
+    prepare_configuration(configuration, unit="q_A^-1", num_points=500)
+
+    saved = []
+    filenames = process_files(configuration, [img_filename], str(tmp_path), [".xy", ".chi"], callback_fn=saved.append)
+
+    assert filenames == saved
+    assert [os.path.basename(f) for f in filenames] == ["CeO2_Pilatus1M.xy", "CeO2_Pilatus1M.chi"]
+    x, y = np.loadtxt(filenames[0], unpack=True)
+    assert len(x) == 500
+    assert np.nanmax(y) > 0
+
+
+def test_tune_integration_method(tmp_path):
+    configuration = create_configuration(poni_filename)
+    configuration.calibration_model.method_tuner = IntegrationMethodTuner(str(tmp_path / "integration_methods.json"))
+    prepare_configuration(configuration, num_points=500)
+
+    method = tune_integration_method(configuration, img_filename)
+    assert method in ("csr", "lut", "splitbbox")
+    assert configuration.calibration_model.get_integration_method(500) == method
+
+
+def test_process_files_with_wrong_mask_shape(tmp_path):
+    mask_filename = str(tmp_path / "small.npy")
+    np.save(mask_filename, np.zeros((10, 10), dtype=bool))
+    configuration = create_configuration(poni_filename, mask_filename)
+    prepare_configuration(configuration)
+
+    with pytest.raises(ValueError, match="shape"):
+        process_files(configuration, [img_filename], str(tmp_path / "out"))
+
+
+def test_read_file_list(tmp_path):
+    file_list = tmp_path / "files.txt"
+    file_list.write_text("# images\nimage_001.tif\n\n  image_002.tif  \n")
+    assert read_file_list(str(file_list)) == ["image_001.tif", "image_002.tif"]
+
+
+def test_main(tmp_path):
+    output_directory = str(tmp_path / "patterns")
+    assert main(["--poni", poni_filename, "--output", output_directory, "--quiet", img_filename]) == 0
+    assert os.listdir(output_directory) == ["CeO2_Pilatus1M.xy"]
+
+    assert main(["--poni", poni_filename, "--output", output_directory, "--quiet", "does_not_exist.tif"]) == 1
+
+
+def test_main_batch_with_workers(tmp_path):
+    batch_filename = str(tmp_path / "batch.nxs")
+    assert main(["--poni", poni_filename, "--batch", batch_filename, "--workers", "2", "--quiet",
+                 img_filename, img_filename]) == 0
+    assert os.path.exists(batch_filename)
+
+
+def test_main_batch_append(tmp_path):
+    batch_filename = str(tmp_path / "batch.nxs")
+    second_img_filename = str(tmp_path / "second.tif")
+    shutil.copy(img_filename, second_img_filename)
+    assert main(["--poni", poni_filename, "--batch", batch_filename, "--quiet", img_filename]) == 0
+    assert main(["--poni", poni_filename, "--batch", batch_filename, "--append", "--quiet",
+                 img_filename, second_img_filename]) == 0
+    with h5py.File(batch_filename, "r") as f:
+        assert f["processed/result/data"].shape[0] == 2
+        assert np.array_equal(f["processed/process/pos_map"][()], [[0, 0], [1, 0]])
@@ -540,6 +540,14 @@ class BatchControlWidget(QtWidgets.QWidget):
     def __init__(self):
         super(BatchControlWidget, self).__init__()
         self.integrate_btn = FlatButton("Integrate")
+        self.integrate_new_btn = FlatButton("Update")
+        self.new_files_btn = CheckableFlatButton("New files")
+        self.append_proc_btn = CheckableFlatButton("Append")
+        self.append_proc_btn.setEnabled(False)
+        # number of worker processes integrating the images in parallel
+        self.workers_sb = QtWidgets.QSpinBox()
+        self.workers_sb.setRange(1, max(os.cpu_count() or 1, 1))
+        self.workers_sb.setValue(os.cpu_count() or 1)
         self.load_proc_btn = FlatButton("Load proc data")
 
         self.waterfall_btn = CheckableFlatButton("Waterfall")
@@ -558,6 +566,11 @@ class BatchControlWidget(QtWidgets.QWidget):
 
     def create_layout(self):
         self._layout.addWidget(self.integrate_btn)
+        self._layout.addWidget(self.integrate_new_btn)
+        self._layout.addWidget(self.new_files_btn)
+        self._layout.addWidget(self.append_proc_btn)
+        self._layout.addWidget(LabelAlignRight("Workers:"))
+        self._layout.addWidget(self.workers_sb)
         self._layout.addWidget(self.calc_bkg_btn)
         self._layout.addWidget(self.waterfall_btn)
         self._layout.addWidget(self.phases_btn)
@@ -571,6 +584,18 @@ class BatchControlWidget(QtWidgets.QWidget):
     def set_tooltips(self):
         self.waterfall_btn.setToolTip("Create waterfall plot")
         self.calc_bkg_btn.setToolTip("Extract background")
+        self.integrate_new_btn.setToolTip(
+            "Integrate only new images of the files (e.g. of a running acquisition)"
+        )
+        self.new_files_btn.setToolTip(
+            "Update also adds the files, which were added to the folder of the files"
+        )
+        self.append_proc_btn.setToolTip(
+            "Update appends the new patterns to the loaded or saved processed data file"
+        )
+        self.workers_sb.setToolTip(
+            "Number of processes integrating the images in parallel"
+        )
 
     def style_widgets(self):
         self._layout.setContentsMargins(6, 6, 6, 6)
@@ -28,6 +28,7 @@ from ...CustomWidgets import (
     SpinBoxAlignRight,
     ConservativeSpinBox,
     CheckableFlatButton,
+    FlatButton,
     SaveIconButton,
 )
 
@@ -70,6 +71,10 @@ class OptionsWidget(QtWidgets.QWidget):
         self.supersampling_sb = SpinBoxAlignRight()
         self.correct_solid_angle_cb = QtWidgets.QCheckBox("correct Solid Angle")
         self.correct_solid_angle_cb.setChecked(True)
+        self.integration_method_lbl = QtWidgets.QLabel("csr")
+        self.tune_method_btn = FlatButton("Auto-tune")
+        self.persistent_engines_cb = QtWidgets.QCheckBox("keep matrices on disk")
+        self.clear_engines_btn = FlatButton("Clear")
 
         self._integration_gb_layout.addWidget(LabelAlignRight("Radial bins:"), 0, 0)
 
@@ -87,11 +92,16 @@ class OptionsWidget(QtWidgets.QWidget):
         self._integration_gb_layout.addWidget(self.correct_solid_angle_cb, 2, 1)
         self._integration_gb_layout.addWidget(LabelAlignRight("Supersampling:"), 3, 0)
         self._integration_gb_layout.addWidget(self.supersampling_sb, 3, 1)
+        self._integration_gb_layout.addWidget(LabelAlignRight("Method:"), 4, 0)
+        self._integration_gb_layout.addWidget(self.integration_method_lbl, 4, 1)
+        self._integration_gb_layout.addWidget(self.tune_method_btn, 4, 2, 1, 2)
+        self._integration_gb_layout.addWidget(self.persistent_engines_cb, 5, 1, 1, 2)
+        self._integration_gb_layout.addWidget(self.clear_engines_btn, 5, 3)
 
         self._integration_gb_layout.setRowStretch(0, 0)
         self._integration_gb_layout.setRowStretch(1, 0)
         self._integration_gb_layout.setRowStretch(2, 0)
-        self._integration_gb_layout.setRowStretch(5, 1)
+        self._integration_gb_layout.setRowStretch(6, 1)
         self._integration_gb_layout.setColumnStretch(0, 0)
         self._integration_gb_layout.setColumnStretch(1, 0)
         self._integration_gb_layout.setColumnStretch(2, 0)
@@ -173,6 +183,15 @@ class OptionsWidget(QtWidgets.QWidget):
     def set_tooltips(self):
         self.cake_full_toggle_btn.setToolTip("Set to full available range")
         self.oned_full_toggle_btn.setToolTip("Set to full available range")
+        self.tune_method_btn.setToolTip(
+            "Benchmarks the integration methods with the current image and\n"
+            "settings and uses the fastest one for this detector and image size."
+        )
+        self.persistent_engines_cb.setToolTip(
+            "Saves the integration matrices of repeatedly used settings in\n"
+            "~/.Dioptas/integration_engines (up to 4 GB) and reuses them after a restart."
+        )
+        self.clear_engines_btn.setToolTip("Deletes the integration matrices saved on disk")
         self.cake_save_integral_btn.setToolTip(
             "Save the tth integral next to the cake image"
         )